@@ -0,0 +1,23 @@
+import time
+from typing import Callable
+from fastapi import Request
+from app.utils.metrics import http_request_duration, http_requests_in_flight
+
+async def metrics_middleware(request: Request, call_next: Callable):
+    """Record request latency per route template (not raw path, to bound label cardinality)."""
+    http_requests_in_flight.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        http_requests_in_flight.dec()
+        route = request.scope.get("route")
+        http_request_duration.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status
+        )
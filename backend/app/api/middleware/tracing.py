@@ -0,0 +1,27 @@
+import time
+from typing import Callable
+from fastapi import Request
+from app.config.settings import settings
+from app.utils.tracing import current_trace, end_trace, start_trace, trace_buffer
+
+UNTRACED_PREFIXES = ("/debug", "/metrics")
+
+async def tracing_middleware(request: Request, call_next: Callable):
+    """Trace each request and report its phase breakdown in a Server-Timing header."""
+    if not settings.TRACING_ENABLED or request.url.path.startswith(UNTRACED_PREFIXES):
+        return await call_next(request)
+
+    token = start_trace(request.method)
+    trace = current_trace()
+    try:
+        response = await call_next(request)
+        trace.status = response.status_code
+        response.headers["Server-Timing"] = trace.server_timing()
+        return response
+    finally:
+        trace.duration = time.perf_counter() - trace.start
+        # Route templates keep patient identifiers out of the buffer
+        route = request.scope.get("route")
+        trace.name = f"{request.method} {getattr(route, 'path', 'unmatched')}"
+        trace_buffer.add(trace)
+        end_trace(token)
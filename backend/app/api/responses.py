@@ -0,0 +1,23 @@
+from typing import Any
+import orjson
+from fastapi.responses import ORJSONResponse, Response
+from app.utils.tracing import span
+
+class FastJSONResponse(ORJSONResponse):
+    """
+    Default response class: encodes with orjson. Routes returning large,
+    already JSON-shaped payloads can also return it directly to skip
+    FastAPI's jsonable_encoder pass.
+    """
+
+    def render(self, content: Any) -> bytes:
+        with span("serialize") as current:
+            body = orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+            if current:
+                current.set(bytes=len(body))
+        return body
+
+
+class RawFHIRResponse(Response):
+    """Upstream FHIR JSON bytes returned as-is, never parsed or re-encoded."""
+    media_type = "application/fhir+json"
@@ -1,30 +1,67 @@
 import secrets
+import time
 from urllib.parse import urlencode
 from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from fastapi.responses import RedirectResponse
-from app.auth.oauth import SMARTAuth
-from typing import Dict
+from app.auth.oauth import LATEST, SESSIONS, SMARTAuth
+from app.auth.session_store import SessionStoreError, session_store
+from app.config.settings import settings
+from app.services.prefetch import prefetcher
 import logging
 
 router = APIRouter()
 smart_auth = SMARTAuth()
 logger = logging.getLogger(__name__)
-states = {}
+
+OAUTH_STATES = "oauth_state"
+
+async def _new_state() -> str:
+    state = secrets.token_urlsafe(16)
+    try:
+        await session_store.set(OAUTH_STATES, state, {"created_at": time.time()}, settings.OAUTH_STATE_TTL)
+    except SessionStoreError as e:
+        logger.error(f"Could not store OAuth state: {e}")
+        raise HTTPException(status_code=503, detail="Session store unavailable")
+    return state
+
+def _session_id(request: Request) -> str:
+    return request.headers.get("X-Session-Id") or request.cookies.get(settings.SESSION_COOKIE_NAME)
+
+async def get_session(request: Request) -> dict:
+    """
+    Dependency resolving the caller's session: X-Session-Id header, then the
+    session cookie, then (if SESSION_LATEST_FALLBACK) the most recent login.
+    An explicit but unknown session id never falls back to another session.
+    A session whose access token has already expired is refreshed first.
+    """
+    session_id = _session_id(request)
+    try:
+        if not session_id and settings.SESSION_LATEST_FALLBACK:
+            latest = await session_store.get(*LATEST)
+            session_id = latest and latest.get("session_id")
+        session = await session_store.get(SESSIONS, session_id) if session_id else None
+        if session:
+            smart_auth.track(session_id, session)
+            if smart_auth.is_expired(session):
+                session = await smart_auth.refresh_session(session_id, session.get("access_token"))
+    except SessionStoreError as e:
+        logger.error(f"Session lookup failed: {e}")
+        raise HTTPException(status_code=503, detail="Session store unavailable")
+    if not session or not session.get("access_token"):
+        raise HTTPException(status_code=401, detail="No valid access token available. Please authenticate.")
+    return {**session, "id": session_id}
 
 @router.get("/login")
 async def login():
     """Initiate SMART on FHIR authorization"""
-    state = secrets.token_urlsafe(16)
-    states[state] = True
+    state = await _new_state()
     
     auth_url = smart_auth.get_authorization_url(state)
     
     return RedirectResponse(auth_url)
 
-token_store: Dict[str, dict] = {}
-
 @router.get("/callback")
-async def callback(code: str = None, state: str = None, error: str = None):
+async def callback(response: Response, code: str = None, state: str = None, error: str = None):
     """Handle OAuth2 callback from FHIR server"""
     if error:
         raise HTTPException(status_code=400, detail=f"Authorization error: {error}")
@@ -32,15 +69,30 @@ async def callback(code: str = None, state: str = None, error: str = None):
     if not code:
         raise HTTPException(status_code=400, detail="Authorization code missing")
         
-    if state not in states:
+    try:
+        # pop() is atomic, so a state is accepted by exactly one worker once
+        valid_state = state and await session_store.pop(OAUTH_STATES, state)
+    except SessionStoreError as e:
+        logger.error(f"OAuth state lookup failed: {e}")
+        raise HTTPException(status_code=503, detail="Session store unavailable")
+    if not valid_state:
         raise HTTPException(status_code=400, detail="Invalid state parameter")
     
-    del states[state]
-    
     token_response = await smart_auth.exchange_code_for_token(code)
-    token_store["access_token"] = token_response.get("access_token")
-    token_store["expires_in"] = token_response.get("expires_in")
-    token_store["refresh_token"] = token_response.get("refresh_token")
+    session_id = secrets.token_urlsafe(32)
+    try:
+        await smart_auth.save_session(session_id, token_response)
+    except SessionStoreError as e:
+        logger.error(f"Could not store session: {e}")
+        raise HTTPException(status_code=503, detail="Session store unavailable")
+
+    response.set_cookie(
+        settings.SESSION_COOKIE_NAME, session_id,
+        max_age=int(settings.SESSION_TTL),
+        httponly=True,
+        samesite="lax",
+        secure=settings.SESSION_COOKIE_SECURE
+    )
         
     return {
         "access_token": token_response.get("access_token"),
@@ -49,17 +101,33 @@ async def callback(code: str = None, state: str = None, error: str = None):
         "scope": token_response.get("scope"),
         "patient": token_response.get("patient", ""),
         "id_token": token_response.get("id_token", ""),
-        "refresh_token": token_response.get("refresh_token", "")
+        "refresh_token": token_response.get("refresh_token", ""),
+        "session_id": session_id
     }
 
+@router.post("/logout")
+async def logout(response: Response, session: dict = Depends(get_session)):
+    """End the caller's session"""
+    smart_auth.untrack(session["id"])
+    prefetcher.cancel_session(session["id"])
+    try:
+        await session_store.delete(SESSIONS, session["id"])
+        latest = await session_store.get(*LATEST)
+        if latest and latest.get("session_id") == session["id"]:
+            await session_store.delete(*LATEST)
+    except SessionStoreError as e:
+        logger.error(f"Logout failed: {e}")
+        raise HTTPException(status_code=503, detail="Session store unavailable")
+    response.delete_cookie(settings.SESSION_COOKIE_NAME)
+    return {"status": "logged_out"}
+
 @router.get("/launch")
 async def launch(iss: str = None, launch: str = None):
     """Handle launch context for SMART on FHIR"""
     if not iss or not launch:
         raise HTTPException(status_code=400, detail="Missing iss or launch parameters")
     
-    state = secrets.token_urlsafe(16)
-    states[state] = True
+    state = await _new_state()
     
     params = {
         'response_type': 'code',
@@ -0,0 +1,30 @@
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from app.config.settings import settings
+from app.utils.tracing import trace_buffer
+
+router = APIRouter()
+
+def _require_enabled():
+    if not settings.TRACES_ENDPOINT:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+
+@router.get("/traces")
+async def list_traces(
+    limit: int = Query(50, ge=1, le=1000),
+    min_ms: float = Query(0, ge=0, description="Only traces at least this slow"),
+    name: Optional[str] = Query(None, description="Substring of 'METHOD /route/template'")
+):
+    """Most recent request traces, newest first"""
+    _require_enabled()
+    return {"traces": trace_buffer.recent(limit, min_ms, name)}
+
+@router.get("/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    """Full span tree of one trace"""
+    _require_enabled()
+    trace = trace_buffer.get(trace_id)
+    if not trace:
+        raise HTTPException(status_code=404, detail="Trace not found (it may have been evicted)")
+    return trace.to_dict()
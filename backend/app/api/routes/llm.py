@@ -1,27 +1,74 @@
 # api/routes/llm.py
 
 from fastapi import APIRouter, HTTPException
-from app.schemas.triage import LLMRequest, LLMResponse
-from app.logic.scorer import TriageScorer
+from fastapi.responses import StreamingResponse
+from app.schemas.triage import LLMRequest, LLMResponse, LLMBatchRequest, LLMBatchResponse
+from app.logic.scorer import get_scorer
+from app.logic.llm_client import LLMUnavailableError
 from app.config.settings import settings  
+import json
 import logging
-import openai
 
 router = APIRouter()
 
-if settings.OPENAI_API_KEY:
-    openai.api_key = settings.OPENAI_API_KEY
-else:
-    print("⚠️ OPENAI_API_KEY is not set")
-    
 logger = logging.getLogger(__name__)
 
 @router.post("/predict", response_model=LLMResponse)
 async def predict_with_llm(request: LLMRequest):
     try:
-        scorer = TriageScorer(strategy="llm")  # change to "rule" to test rule-based
+        scorer = get_scorer(settings.TRIAGE_STRATEGY)
         result = await scorer.predict(request)
         return LLMResponse(**result)
+    except LLMUnavailableError as e:
+        logger.error(f"LLM unavailable: {str(e)}")
+        raise HTTPException(status_code=503, detail=f"Scoring unavailable: {str(e)}")
     except Exception as e:
         logger.exception("Scoring failed.")
         raise HTTPException(status_code=500, detail=f"Scoring failed: {str(e)}")
+
+@router.post("/predict/stream")
+async def predict_stream(request: LLMRequest):
+    """
+    Server-Sent Events variant of /predict: "token" events carry the raw
+    completion, an "esi_score" event is sent as soon as the score is known
+    and the final "result" event carries the validated LLMResponse.
+    """
+    scorer = get_scorer(settings.TRIAGE_STRATEGY)
+
+    async def events():
+        try:
+            async for event, payload in scorer.stream(request):
+                if event == "result":
+                    payload = LLMResponse(**payload).model_dump()
+                yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+        except Exception as e:
+            logger.exception("Streaming scoring failed.")
+            error = {"detail": f"Scoring failed: {str(e)}"}
+            yield f"event: error\ndata: {json.dumps(error)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/predict/batch", response_model=LLMBatchResponse)
+async def predict_batch(request: LLMBatchRequest):
+    """Score many patients at once; results keep input order and carry per-item errors."""
+    try:
+        scorer = get_scorer(request.strategy)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    results = []
+    for index, outcome in enumerate(await scorer.predict_batch(request.items)):
+        if isinstance(outcome, Exception):
+            results.append({"index": index, "error": str(outcome)})
+            continue
+        try:
+            results.append({"index": index, "result": LLMResponse(**outcome)})
+        except Exception as e:
+            results.append({"index": index, "error": f"Invalid scoring result: {str(e)}"})
+
+    failed = sum(1 for result in results if "error" in result)
+    return {"results": results, "succeeded": len(results) - failed, "failed": failed}
@@ -0,0 +1,97 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.logic.llm_client import llm_client
+from app.logic.scoring_cache import scoring_cache
+from app.services.fhir_cache import fhir_cache
+from app.services.patient_identity import patient_identity_cache
+from app.services.singleflight import fhir_flights
+from app.utils.logging_config import logging_stats
+from app.utils.metrics import metrics
+
+router = APIRouter()
+
+# Component gauges and counters, read from each component's stats() at scrape time
+
+def _cache_lookups():
+    llm = scoring_cache.stats()
+    return {
+        ("fhir", "hit"): fhir_cache.hits,
+        ("fhir", "revalidated"): fhir_cache.revalidated,
+        ("fhir", "miss"): fhir_cache.misses,
+        ("llm_scores", "memory"): llm["hits"]["memory"],
+        ("llm_scores", "disk"): llm["hits"]["disk"],
+        ("llm_scores", "miss"): llm["misses"],
+        ("patient_identity", "hit"): patient_identity_cache.hits,
+        ("patient_identity", "miss"): patient_identity_cache.misses,
+    }
+
+
+def _cache_hit_ratio():
+    ratios = {}
+    for cache, lookups in (
+        ("fhir", (fhir_cache.hits + fhir_cache.revalidated, fhir_cache.misses)),
+        ("llm_scores", (sum(scoring_cache.hits.values()), scoring_cache.misses)),
+        ("patient_identity", (patient_identity_cache.hits, patient_identity_cache.misses)),
+    ):
+        hits, misses = lookups
+        ratios[(cache,)] = hits / (hits + misses) if hits + misses else 0.0
+    return ratios
+
+
+metrics.counter(
+    "triage_cache_lookups_total", "Cache lookups by cache and result", ("cache", "result"),
+    callback=_cache_lookups
+)
+metrics.gauge(
+    "triage_cache_hit_ratio", "Lifetime hit ratio per cache", ("cache",),
+    callback=_cache_hit_ratio
+)
+metrics.gauge(
+    "triage_cache_entries", "Entries held per cache", ("cache",),
+    callback=lambda: {
+        ("fhir",): fhir_cache.stats()["entries"],
+        ("llm_scores",): scoring_cache.stats()["entries"],
+        ("patient_identity",): patient_identity_cache.stats()["entries"],
+    }
+)
+metrics.gauge(
+    "triage_fhir_cache_bytes", "Approximate bytes held by the FHIR response cache",
+    callback=lambda: {(): fhir_cache.total_bytes}
+)
+metrics.counter(
+    "triage_fhir_cache_evictions_total", "FHIR response cache evictions",
+    callback=lambda: {(): fhir_cache.evictions}
+)
+metrics.gauge(
+    "triage_in_flight", "Operations in flight per component", ("component",),
+    callback=lambda: {
+        ("fhir_single_flight",): fhir_flights.in_flight,
+        ("llm",): llm_client.in_flight,
+        ("llm_waiting",): llm_client.waiting,
+    }
+)
+metrics.counter(
+    "triage_fhir_single_flight_shared_total", "FHIR GETs answered by joining an identical in-flight call",
+    callback=lambda: {(): fhir_flights.shared}
+)
+metrics.gauge(
+    "triage_llm_circuit_open", "1 while the LLM circuit breaker is open or half-open",
+    callback=lambda: {(): 0 if llm_client.breaker.state == "closed" else 1}
+)
+metrics.counter(
+    "triage_log_records_dropped_total", "Log records dropped because the logging queue was full",
+    callback=lambda: {(): logging_stats()["dropped"]}
+)
+metrics.counter(
+    "triage_log_records_sampled_out_total", "DEBUG/INFO log records skipped by LOG_SAMPLING",
+    callback=lambda: {(): logging_stats()["sampled_out"]}
+)
+metrics.gauge(
+    "triage_log_queue_depth", "Log records waiting for the writer thread",
+    callback=lambda: {(): logging_stats()["queued"]}
+)
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    """Prometheus text exposition of the in-process metrics"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
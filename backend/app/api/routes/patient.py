@@ -1,24 +1,63 @@
-from fastapi import APIRouter, Depends, HTTPException, Header, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
 from app.services.fhir_service import FHIRService
+from app.services.fanout import fan_out
+from app.services.prefetch import prefetcher
+from app.api.responses import FastJSONResponse, RawFHIRResponse
 from app.config.settings import settings
-from typing import Optional
+from typing import Awaitable, Callable, Dict, Optional
 import logging
 import os
 from dotenv import load_dotenv
-from app.api.routes.auth import token_store
+from app.api.routes.auth import get_session, smart_auth
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-async def get_fhir_service(authorization: Optional[str] = Header(None)):
-    """Dependency to inject FHIR service with authentication"""
-    # token = os.getenv("TEST_ACCESS_TOKEN")
-    token = token_store.get("access_token")
-    if not token:
-        raise HTTPException(status_code=401, detail="No valid access token available. Please authenticate.")
-    return FHIRService(settings.FHIR_SERVER_URL, token)
+async def get_fhir_service(session: dict = Depends(get_session)):
+    """Dependency to inject FHIR service with the caller's session token"""
+    async def renew_token(rejected_token: str) -> Optional[str]:
+        refreshed = await smart_auth.refresh_session(session["id"], rejected_token)
+        return refreshed and refreshed.get("access_token")
+
+    cache_context = f"{session.get('scope') or ''}|{session.get('patient') or ''}"
+    service = FHIRService(
+        settings.FHIR_SERVER_URL, session["access_token"],
+        cache_context=cache_context,
+        renew_token=renew_token,
+        on_patient_resolved=lambda patient_id: prefetcher.schedule(session["id"], patient_id, service)
+    )
+    return service
+
+def read_section(session: dict, patient_id: str, section: str,
+                 fetch: Callable[[], Awaitable]) -> Awaitable:
+    """A section from the session's prefetch snapshot of the patient, or `fetch()` live"""
+    return prefetcher.read(session["id"], patient_id, section, fetch)
+
+async def fan_out_sections(session: dict, fhir_service: FHIRService, patient_id: str,
+                           sections: Dict[str, Callable[[], Awaitable]]):
+    """
+    Fan out over composite-endpoint sections. With prefetching on, opening a
+    composite view counts as resolving the patient and starts (or reuses)
+    the snapshot; otherwise the sections are fetched in one batch Bundle.
+    """
+    if prefetcher.enabled:
+        prefetcher.schedule(session["id"], patient_id, fhir_service)
+    else:
+        # Only an optimisation: on any failure the sections are fetched one by one
+        try:
+            await fhir_service.prefetch_sections(patient_id, sections)
+        except Exception as e:
+            logger.warning(f"Batch prefetch failed ({type(e).__name__}: {e}); fetching sections individually")
+    return await fan_out(
+        {
+            name: (lambda name=name, fetch=fetch: read_section(session, patient_id, name, fetch))
+            for name, fetch in sections.items()
+        },
+        timeout=settings.FHIR_SECTION_TIMEOUT,
+        concurrency=settings.FHIR_FANOUT_CONCURRENCY
+    )
 
 @router.get("/{patient_id}")
 async def get_patient(
@@ -33,108 +72,171 @@ async def get_medical_history(
     firstName: str, 
     lastName: str, 
     dob: str, 
+    session: dict = Depends(get_session),
     fhir_service: FHIRService = Depends(get_fhir_service)
 ):
-    """Retrieve structured medical history for a given patient."""
+    """
+    Retrieve structured medical history for a given patient. Resolving the
+    patient starts the background prefetch of every section; this route
+    waits for the ones it needs, and partial results are returned with a
+    per-section status under "sections".
+    """
     patient_id = await fhir_service.find_patient_id(firstName, lastName, dob)
     # TODO: If patient not found, no need to retrieve FHIR data, just send vitals only to LLM
     if not patient_id:
         raise HTTPException(status_code=404, detail="Patient not found with given name and birthdate")
 
-    try:
-        demographics = await fhir_service.get_patient_demographics(patient_id)
-        conditions = await fhir_service.get_conditions(patient_id, clinical_status="active")
-        medications = await fhir_service.get_medications(patient_id)
-        allergies = await fhir_service.get_allergies(patient_id)
-        clinical_notes = await fhir_service.get_clinical_notes(patient_id)
-        encounters = await fhir_service.get_encounters(patient_id)
-
-        return {
-            "name": demographics.get("name"),
-            "birthDate": demographics.get("birthDate"),
-            "age": demographics.get("age"),
-            "gender": demographics.get("gender"),
-            "conditions": conditions,
-            "medications": medications,
-            "allergies": allergies,
-            "clinical_notes": clinical_notes,
-            "encounters": encounters
-        }
-
-    except Exception as e:
-        import traceback
-        logger.error("Error in get_medical_history:\n" + traceback.format_exc())
-        raise HTTPException(status_code=500, detail=f"Error retrieving medical history: {str(e)}")
+    sections = {
+        "demographics": lambda: fhir_service.get_patient_demographics(patient_id),
+        "conditions": lambda: fhir_service.get_conditions(patient_id, clinical_status="active"),
+        "medications": lambda: fhir_service.get_medications(patient_id),
+        "allergies": lambda: fhir_service.get_allergies(patient_id),
+        "clinical_notes": lambda: fhir_service.get_clinical_notes(patient_id),
+        "encounters": lambda: fhir_service.get_encounters(patient_id),
+    }
+    results = await fan_out_sections(session, fhir_service, patient_id, sections)
+
+    if not any(result.ok for result in results.values()):
+        logger.error(f"All medical history sections failed for patient {patient_id}")
+        raise HTTPException(
+            status_code=502,
+            detail={
+                "message": "Error retrieving medical history",
+                "sections": {name: result.summary() for name, result in results.items()}
+            }
+        )
+
+    demographics = results["demographics"].data or {}
+
+    return {
+        "name": demographics.get("name"),
+        "birthDate": demographics.get("birthDate"),
+        "age": demographics.get("age"),
+        "gender": demographics.get("gender"),
+        "conditions": results["conditions"].data,
+        "medications": results["medications"].data,
+        "allergies": results["allergies"].data,
+        "clinical_notes": results["clinical_notes"].data,
+        "encounters": results["encounters"].data,
+        "sections": {name: result.summary() for name, result in results.items()}
+    }
 
 
 @router.get("/{patient_id}/demographics")
 async def get_patient_demographics(
     patient_id: str, 
+    session: dict = Depends(get_session),
     fhir_service: FHIRService = Depends(get_fhir_service)
 ):
     """Get patient demographics"""
-    return await fhir_service.get_patient_demographics(patient_id)
+    return await read_section(session, patient_id, "demographics",
+                              lambda: fhir_service.get_patient_demographics(patient_id))
 
 @router.get("/{patient_id}/vitals")
 async def get_patient_vitals(
     patient_id: str,
     date_from: Optional[str] = Query(None, description="Filter from date (YYYY-MM-DD)"),
     date_to: Optional[str] = Query(None, description="Filter to date (YYYY-MM-DD)"),
+    session: dict = Depends(get_session),
     fhir_service: FHIRService = Depends(get_fhir_service)
 ):
     """Get patient vital signs"""
-    return await fhir_service.get_vital_signs(patient_id, date_from, date_to)
+    if date_from or date_to:
+        return await fhir_service.get_vital_signs(patient_id, date_from, date_to)
+    return await read_section(session, patient_id, "vitals",
+                              lambda: fhir_service.get_vital_signs(patient_id))
+
+@router.get("/{patient_id}/vitals/series")
+async def get_patient_vital_series(
+    patient_id: str,
+    date_from: Optional[str] = Query(None, description="Filter from date (YYYY-MM-DD)"),
+    date_to: Optional[str] = Query(None, description="Filter to date (YYYY-MM-DD)"),
+    code: Optional[str] = Query(None, description="Comma-separated LOINC codes to include"),
+    max_points: int = Query(500, ge=3, le=10000, description="Points per series after LTTB downsampling"),
+    window_hours: float = Query(24, gt=0, description="Trailing window for rolling statistics and trend features"),
+    fhir_service: FHIRService = Depends(get_fhir_service)
+):
+    """Get vital signs as per-code time series with trend features, downsampled for charting"""
+    from app.services.vital_series import series_payload
+    series = await fhir_service.get_vital_series(patient_id, date_from, date_to)
+    if code:
+        wanted = set(code.split(","))
+        series = {c: s for c, s in series.items() if c in wanted}
+    return {
+        "patient_id": patient_id,
+        "series": {c: series_payload(s, max_points, window_hours) for c, s in series.items()}
+    }
 
 @router.get("/{patient_id}/labs")
 async def get_patient_labs(
     patient_id: str,
     date_from: Optional[str] = Query(None, description="Filter from date (YYYY-MM-DD)"),
     date_to: Optional[str] = Query(None, description="Filter to date (YYYY-MM-DD)"),
+    session: dict = Depends(get_session),
     fhir_service: FHIRService = Depends(get_fhir_service)
 ):
     """Get patient lab results"""
-    return await fhir_service.get_lab_results(patient_id, date_from, date_to)
+    if date_from or date_to:
+        return await fhir_service.get_lab_results(patient_id, date_from, date_to)
+    return await read_section(session, patient_id, "labs",
+                              lambda: fhir_service.get_lab_results(patient_id))
 
 @router.get("/{patient_id}/conditions")
 async def get_patient_conditions(
     patient_id: str,
     clinical_status: Optional[str] = Query(None, description="Filter by clinical status (active, resolved, etc.)"),
+    session: dict = Depends(get_session),
     fhir_service: FHIRService = Depends(get_fhir_service)
 ):
     """Get patient conditions/problems"""
-    return await fhir_service.get_conditions(patient_id, clinical_status)
+    section = {None: "all_conditions", "active": "conditions"}.get(clinical_status)
+    if section is None:
+        return await fhir_service.get_conditions(patient_id, clinical_status)
+    return await read_section(session, patient_id, section,
+                              lambda: fhir_service.get_conditions(patient_id, clinical_status))
 
 @router.get("/{patient_id}/medications")
 async def get_patient_medications(
     patient_id: str,
+    session: dict = Depends(get_session),
     fhir_service: FHIRService = Depends(get_fhir_service)
 ):
     """Get patient medications"""
-    return await fhir_service.get_medications(patient_id)
+    return await read_section(session, patient_id, "medications",
+                              lambda: fhir_service.get_medications(patient_id))
 
 @router.get("/{patient_id}/allergies")
 async def get_patient_allergies(
     patient_id: str,
+    session: dict = Depends(get_session),
     fhir_service: FHIRService = Depends(get_fhir_service)
 ):
     """Get patient allergies"""
-    return await fhir_service.get_allergies(patient_id)
+    return await read_section(session, patient_id, "allergies",
+                              lambda: fhir_service.get_allergies(patient_id))
 
 @router.get("/{patient_id}/clinical-notes")
 async def get_patient_clinical_notes(
     patient_id: str,
+    passthrough: bool = Query(False, description="Return the first page of each upstream Bundle unparsed"),
+    session: dict = Depends(get_session),
     fhir_service: FHIRService = Depends(get_fhir_service)
 ):
     """Get patient clinical notes"""
-    return await fhir_service.get_clinical_notes(patient_id)
+    if passthrough:
+        return RawFHIRResponse(await fhir_service.get_clinical_notes_raw(patient_id))
+    return FastJSONResponse(await read_section(session, patient_id, "clinical_notes",
+                                               lambda: fhir_service.get_clinical_notes(patient_id)))
 
 @router.get("/{patient_id}/encounters")
 async def get_patient_encounters(
     patient_id: str,
+    session: dict = Depends(get_session),
     fhir_service: FHIRService = Depends(get_fhir_service)
 ):
     """Get patient encounters"""
-    return await fhir_service.get_encounters(patient_id)
+    return await read_section(session, patient_id, "encounters",
+                              lambda: fhir_service.get_encounters(patient_id))
 
 @router.get("/{patient_id}/observations")
 async def get_patient_observations(
@@ -144,52 +246,57 @@ async def get_patient_observations(
     date_from: Optional[str] = Query(None, description="Filter from date (YYYY-MM-DD)"),
     date_to: Optional[str] = Query(None, description="Filter to date (YYYY-MM-DD)"),
     count: Optional[int] = Query(50, description="Number of results to return"),
+    passthrough: bool = Query(False, description="Return the first upstream page unparsed"),
     fhir_service: FHIRService = Depends(get_fhir_service)
 ):
     """Get patient observations"""
-    return await fhir_service.get_observations(
+    if passthrough:
+        return RawFHIRResponse(await fhir_service.get_observations_raw(
+            patient_id, category=category, code=code, date_from=date_from, date_to=date_to, _count=count
+        ))
+    return FastJSONResponse(await fhir_service.get_observations(
         patient_id, 
         category=category, 
         code=code, 
         date_from=date_from, 
         date_to=date_to, 
-        _count=count
-    )
+        _count=count,
+        max_entries=count
+    ))
 
 @router.get("/{patient_id}/summary")
 async def get_patient_summary(
     patient_id: str,
+    session: dict = Depends(get_session),
     fhir_service: FHIRService = Depends(get_fhir_service)
 ):
     """
     Get a summary of the patient's information, including demographics,
     vital signs, conditions, medications, allergies, and clinical notes.
+    Sections come from the patient's prefetch snapshot (or a batch Bundle
+    when prefetching is off); any that fail or time out are
+    returned as null with their status under "sections".
     """
-    import asyncio
-    
-    tasks = [
-        fhir_service.get_patient_demographics(patient_id),
-        fhir_service.get_vital_signs(patient_id),
-        fhir_service.get_conditions(patient_id, clinical_status="active"),
-        fhir_service.get_medications(patient_id),
-        fhir_service.get_allergies(patient_id),
-        fhir_service.get_clinical_notes(patient_id)
-    ]
-    
-    try:
-        demographics, vitals, conditions, medications, allergies, clinical_notes = await asyncio.gather(*tasks)
-        
-        return {
-            "demographics": demographics,
-            "vitals": vitals,
-            "conditions": conditions,
-            "medications": medications,
-            "allergies": allergies,
-            "clinical_notes": clinical_notes
-        }
-    except Exception as e:
-        logger.error(f"Error fetching patient summary: {str(e)}")
+    sections = {
+        "demographics": lambda: fhir_service.get_patient_demographics(patient_id),
+        "vitals": lambda: fhir_service.get_vital_signs(patient_id),
+        "conditions": lambda: fhir_service.get_conditions(patient_id, clinical_status="active"),
+        "medications": lambda: fhir_service.get_medications(patient_id),
+        "allergies": lambda: fhir_service.get_allergies(patient_id),
+        "clinical_notes": lambda: fhir_service.get_clinical_notes(patient_id),
+    }
+    results = await fan_out_sections(session, fhir_service, patient_id, sections)
+
+    if not any(result.ok for result in results.values()):
+        logger.error(f"Error fetching patient summary for {patient_id}: all sections failed")
         raise HTTPException(
-            status_code=500,
-            detail=f"Failed to fetch complete patient summary: {str(e)}"
-        )
\ No newline at end of file
+            status_code=502,
+            detail={
+                "message": "Failed to fetch patient summary",
+                "sections": {name: result.summary() for name, result in results.items()}
+            }
+        )
+
+    summary = {name: result.data for name, result in results.items()}
+    summary["sections"] = {name: result.summary() for name, result in results.items()}
+    return summary
@@ -1,17 +1,37 @@
 from fastapi import HTTPException
+import asyncio
 import httpx
+import logging
+import time
+from typing import Dict, Optional
 from urllib.parse import urlencode
+from app.auth.session_store import SessionStoreError, session_store
 from app.config.settings import settings
+from app.services.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+SESSIONS = "session"
+LATEST = ("pointer", "latest")
 
 class SMARTAuth:
     def __init__(self):
         self.client_id = settings.CLIENT_ID
         self.redirect_uri = settings.REDIRECT_URI if settings.REDIRECT_URI else f"{settings.BASE_URL}/auth/callback"
         self.fhir_base_url = settings.FHIR_SERVER_URL
-        
+
         self.auth_endpoint = settings.AUTH_SERVER_URL
         self.token_endpoint = settings.TOKEN_SERVER_URL
-    
+
+        self.refresh_margin = settings.TOKEN_REFRESH_MARGIN
+        # Concurrent refreshes of one session share a single token request
+        self._refreshes = SingleFlight()
+        # Sessions this worker has served -> access token expiry, kept fresh in the background
+        self._tracked: Dict[str, float] = {}
+        self._refresher: Optional[asyncio.Task] = None
+        self.refreshed = 0
+        self.refresh_failures = 0
+
     def get_authorization_url(self, state):
         """Generate the SMART app authorization URL"""
         params = {
@@ -23,7 +43,18 @@ class SMARTAuth:
             'aud': self.fhir_base_url
         }
         return f"{self.auth_endpoint}?{urlencode(params)}"
-    
+
+    async def _token_request(self, data, action):
+        async with httpx.AsyncClient() as client:
+            try:
+                response = await client.post(self.token_endpoint, data=data)
+                response.raise_for_status()
+                return response.json()
+            except httpx.HTTPStatusError as e:
+                raise HTTPException(status_code=400, detail=f"{action} failed: HTTP {e.response.status_code}")
+            except httpx.RequestError as e:
+                raise HTTPException(status_code=400, detail=f"{action} failed: {str(e)}")
+
     async def exchange_code_for_token(self, code):
         """Exchange authorization code for access token"""
         data = {
@@ -32,11 +63,116 @@ class SMARTAuth:
             'redirect_uri': self.redirect_uri,
             'client_id': self.client_id
         }
-            
-        async with httpx.AsyncClient() as client:
+        return await self._token_request(data, "Token exchange")
+
+    async def refresh_access_token(self, refresh_token):
+        """Obtain a new access token with the refresh_token grant"""
+        data = {
+            'grant_type': 'refresh_token',
+            'refresh_token': refresh_token,
+            'client_id': self.client_id
+        }
+        return await self._token_request(data, "Token refresh")
+
+    async def save_session(self, session_id: str, token_response: dict, previous: Optional[dict] = None) -> dict:
+        """
+        Store the tokens of a login or a refresh under `session_id`. A refresh
+        response may omit the refresh token, scope or patient; those are
+        carried over from `previous`.
+        """
+        previous = previous or {}
+        expires_in = token_response.get("expires_in")
+        session = {
+            "access_token": token_response.get("access_token"),
+            "token_type": token_response.get("token_type", "Bearer"),
+            "expires_at": time.time() + float(expires_in) if expires_in else None,
+            "refresh_token": token_response.get("refresh_token") or previous.get("refresh_token"),
+            "scope": token_response.get("scope") or previous.get("scope"),
+            "patient": token_response.get("patient") or previous.get("patient"),
+        }
+        await session_store.set(SESSIONS, session_id, session, settings.SESSION_TTL)
+        if settings.SESSION_LATEST_FALLBACK and not previous:
+            await session_store.set(*LATEST, {"session_id": session_id}, settings.SESSION_TTL)
+        self.track(session_id, session)
+        return session
+
+    def track(self, session_id: str, session: dict):
+        if session.get("refresh_token") and session.get("expires_at"):
+            self._tracked[session_id] = session["expires_at"]
+
+    def untrack(self, session_id: str):
+        self._tracked.pop(session_id, None)
+
+    def is_expired(self, session: dict) -> bool:
+        return bool(session.get("expires_at")) and session["expires_at"] <= time.time()
+
+    def _due(self, session: dict) -> bool:
+        return bool(session.get("expires_at")) and session["expires_at"] - self.refresh_margin <= time.time()
+
+    async def refresh_session(self, session_id: str, stale_token: Optional[str] = None) -> Optional[dict]:
+        """
+        Refresh a session's access token, coalescing concurrent callers.
+        `stale_token` is a token the FHIR server just rejected; it is
+        refreshed even if not yet near expiry. Returns the current session,
+        or None when it cannot be refreshed (no refresh token, or rejected).
+        """
+        return await self._refreshes.do(session_id, lambda: self._refresh(session_id, stale_token))
+
+    async def _refresh(self, session_id: str, stale_token: Optional[str]) -> Optional[dict]:
+        session = await session_store.get(SESSIONS, session_id)
+        if not session or not session.get("refresh_token"):
+            self.untrack(session_id)
+            return None
+        # Another worker, or an earlier refresh here, already renewed it
+        if session.get("access_token") != stale_token and not self._due(session):
+            self.track(session_id, session)
+            return session
+
+        try:
+            token_response = await self.refresh_access_token(session["refresh_token"])
+        except HTTPException as e:
+            self.refresh_failures += 1
+            logger.warning(f"Token refresh failed for a session: {e.detail}")
+            # A worker that refreshed concurrently may have rotated the refresh token
+            current = await session_store.get(SESSIONS, session_id)
+            if current and current.get("access_token") != session.get("access_token"):
+                return current
+            self.untrack(session_id)
+            return None
+
+        self.refreshed += 1
+        return await self.save_session(session_id, token_response, previous=session)
+
+    async def _refresh_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            now = time.time()
+            for session_id in [s for s, expires_at in self._tracked.items() if expires_at - self.refresh_margin <= now]:
+                try:
+                    await self.refresh_session(session_id)
+                except SessionStoreError as e:
+                    logger.warning(f"Background token refresh skipped: {e}")
+                except Exception:
+                    logger.exception("Background token refresh failed")
+
+    def start_refresher(self):
+        """Renew tracked sessions TOKEN_REFRESH_MARGIN seconds before their tokens expire."""
+        if settings.TOKEN_REFRESH_INTERVAL > 0 and self._refresher is None:
+            self._refresher = asyncio.create_task(self._refresh_loop(settings.TOKEN_REFRESH_INTERVAL))
+
+    async def stop_refresher(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
             try:
-                response = await client.post(self.token_endpoint, data=data)
-                response.raise_for_status()
-                return response.json()
-            except httpx.RequestError as e:
-                raise HTTPException(status_code=400, detail=f"Token exchange failed: {str(e)}")
\ No newline at end of file
+                await self._refresher
+            except asyncio.CancelledError:
+                pass
+            self._refresher = None
+
+    def stats(self) -> dict:
+        return {
+            "tracked_sessions": len(self._tracked),
+            "refreshed": self.refreshed,
+            "refresh_failures": self.refresh_failures,
+            "refreshes_in_flight": self._refreshes.in_flight
+        }
@@ -0,0 +1,331 @@
+"""
+Session and OAuth-state storage shared by every API worker process.
+
+Values are small JSON objects stored per (namespace, key) with a TTL.
+Backends are picked by SESSION_STORE:
+
+    memory                     per-process dict; only correct with one worker
+    sqlite:///relative.db      shared file, safe across worker processes on one
+    sqlite:////absolute.db     host (three slashes: relative, four: absolute)
+    redis://[:password@]host:port/db
+                               any server speaking the Redis protocol (RESP)
+                               with GETDEL, i.e. Redis >= 6.2 or a stand-in
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple
+from urllib.parse import unquote, urlparse
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+class SessionStoreError(Exception):
+    """The session backend could not be reached or returned an error."""
+
+
+class SessionStore(ABC):
+    backend = "base"
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @abstractmethod
+    async def get(self, namespace: str, key: str) -> Optional[dict]:
+        pass
+
+    @abstractmethod
+    async def set(self, namespace: str, key: str, value: dict, ttl: float):
+        pass
+
+    @abstractmethod
+    async def pop(self, namespace: str, key: str) -> Optional[dict]:
+        """Atomically read and delete, so a one-time value (an OAuth state) is accepted once."""
+
+    @abstractmethod
+    async def delete(self, namespace: str, key: str):
+        pass
+
+    async def close(self):
+        pass
+
+    def _count(self, value: Optional[dict]) -> Optional[dict]:
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def stats(self) -> dict:
+        return {"backend": self.backend, "hits": self.hits, "misses": self.misses}
+
+
+class MemorySessionStore(SessionStore):
+    """Per-process store; expired entries are dropped on access and by a periodic sweep."""
+    backend = "memory"
+    SWEEP_EVERY = 256
+
+    def __init__(self):
+        super().__init__()
+        self._entries: Dict[Tuple[str, str], Tuple[dict, float]] = {}
+        self._writes = 0
+
+    def _live(self, namespace: str, key: str) -> Optional[dict]:
+        entry = self._entries.get((namespace, key))
+        if entry and entry[1] > time.time():
+            return entry[0]
+        self._entries.pop((namespace, key), None)
+        return None
+
+    async def get(self, namespace, key):
+        return self._count(self._live(namespace, key))
+
+    async def set(self, namespace, key, value, ttl):
+        self._entries[(namespace, key)] = (value, time.time() + ttl)
+        self._writes += 1
+        if self._writes % self.SWEEP_EVERY == 0:
+            now = time.time()
+            for expired in [k for k, (_, expires_at) in self._entries.items() if expires_at <= now]:
+                del self._entries[expired]
+
+    async def pop(self, namespace, key):
+        value = self._live(namespace, key)
+        self._entries.pop((namespace, key), None)
+        return self._count(value)
+
+    async def delete(self, namespace, key):
+        self._entries.pop((namespace, key), None)
+
+    def stats(self):
+        return {**super().stats(), "entries": len(self._entries)}
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Shared SQLite file in WAL mode, so several worker processes on one host
+    see the same sessions. Queries run in a thread; expired rows are purged
+    at most once a minute.
+    """
+    backend = "sqlite"
+    PURGE_INTERVAL = 60
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._purged_at = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=5, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+        return self._db
+
+    def _run(self, fn):
+        try:
+            with self._db_lock:
+                return fn(self._connect())
+        except sqlite3.Error as e:
+            raise SessionStoreError(f"SQLite session store error: {e}")
+
+    def _get(self, namespace, key, delete=False):
+        select = "SELECT value FROM sessions WHERE namespace = ? AND key = ? AND expires_at > ?"
+        if not delete:
+            row = self._run(lambda db: db.execute(select, (namespace, key, time.time())).fetchone())
+            return json.loads(row[0]) if row else None
+
+        # Read and delete in one write transaction so two workers cannot both take the value
+        def query(db):
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute(select, (namespace, key, time.time())).fetchone()
+                db.execute("DELETE FROM sessions WHERE namespace = ? AND key = ?", (namespace, key))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            return json.loads(row[0]) if row else None
+        return self._run(query)
+
+    def _set(self, namespace, key, value, ttl):
+        now = time.time()
+
+        def query(db):
+            db.execute(
+                "INSERT OR REPLACE INTO sessions (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), now + ttl)
+            )
+            if now - self._purged_at > self.PURGE_INTERVAL:
+                self._purged_at = now
+                db.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+        self._run(query)
+
+    def _delete(self, namespace, key):
+        self._run(lambda db: db.execute("DELETE FROM sessions WHERE namespace = ? AND key = ?", (namespace, key)))
+
+    async def get(self, namespace, key):
+        return self._count(await asyncio.to_thread(self._get, namespace, key))
+
+    async def set(self, namespace, key, value, ttl):
+        await asyncio.to_thread(self._set, namespace, key, value, ttl)
+
+    async def pop(self, namespace, key):
+        return self._count(await asyncio.to_thread(self._get, namespace, key, True))
+
+    async def delete(self, namespace, key):
+        await asyncio.to_thread(self._delete, namespace, key)
+
+    async def close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self):
+        return {**super().stats(), "path": self.path}
+
+
+class RESPConnection:
+    """
+    Minimal client for the Redis serialization protocol: one connection,
+    one command at a time, reconnecting once when the connection drops.
+    """
+
+    def __init__(self, host: str, port: int, password: Optional[str] = None, db: int = 0, timeout: float = 5):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.db = db
+        self.timeout = timeout
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def encode(*args) -> bytes:
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    async def _read_reply(self):
+        line = await self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Connection closed by server")
+        prefix, body = line[:1], line[1:-2]
+        if prefix == b"+":
+            return body.decode()
+        if prefix == b"-":
+            raise SessionStoreError(f"Redis error: {body.decode()}")
+        if prefix == b":":
+            return int(body)
+        if prefix == b"$":
+            length = int(body)
+            if length < 0:
+                return None
+            return (await self._reader.readexactly(length + 2))[:-2]
+        if prefix == b"*":
+            length = int(body)
+            return None if length < 0 else [await self._read_reply() for _ in range(length)]
+        raise SessionStoreError(f"Unexpected RESP reply: {line!r}")
+
+    async def _roundtrip(self, *args):
+        self._writer.write(self.encode(*args))
+        await self._writer.drain()
+        return await self._read_reply()
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            await self._roundtrip("AUTH", self.password)
+        if self.db:
+            await self._roundtrip("SELECT", self.db)
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._reader = self._writer = None
+
+    async def execute(self, *args):
+        async with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._writer is None:
+                        await asyncio.wait_for(self._connect(), self.timeout)
+                    return await asyncio.wait_for(self._roundtrip(*args), self.timeout)
+                except (ConnectionError, OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+                    await self.close()
+                    if attempt:
+                        raise SessionStoreError(f"Redis session store unavailable: {e!r}")
+                except BaseException:
+                    # A failed AUTH or a command cancelled mid-reply leaves the
+                    # connection unusable; start clean next time
+                    await self.close()
+                    raise
+
+
+class RedisSessionStore(SessionStore):
+    """Sessions as Redis string keys with a PX expiry, so the server does the TTL eviction."""
+    backend = "redis"
+
+    def __init__(self, url: str, prefix: str = "triage:"):
+        super().__init__()
+        parsed = urlparse(url)
+        self.prefix = prefix
+        self.connection = RESPConnection(
+            parsed.hostname or "localhost",
+            parsed.port or 6379,
+            password=unquote(parsed.password) if parsed.password else None,
+            db=int(parsed.path.lstrip("/") or 0)
+        )
+
+    def _key(self, namespace, key) -> str:
+        return f"{self.prefix}{namespace}:{key}"
+
+    async def get(self, namespace, key):
+        raw = await self.connection.execute("GET", self._key(namespace, key))
+        return self._count(json.loads(raw) if raw else None)
+
+    async def set(self, namespace, key, value, ttl):
+        await self.connection.execute("SET", self._key(namespace, key), json.dumps(value), "PX", max(int(ttl * 1000), 1))
+
+    async def pop(self, namespace, key):
+        raw = await self.connection.execute("GETDEL", self._key(namespace, key))
+        return self._count(json.loads(raw) if raw else None)
+
+    async def delete(self, namespace, key):
+        await self.connection.execute("DEL", self._key(namespace, key))
+
+    async def close(self):
+        await self.connection.close()
+
+
+def create_session_store(spec: str) -> SessionStore:
+    if not spec or spec == "memory":
+        return MemorySessionStore()
+    if spec.startswith("sqlite://"):
+        return SQLiteSessionStore(spec[len("sqlite:///"):])
+    if spec.startswith(("redis://", "rediss://")):
+        if spec.startswith("rediss://"):
+            raise ValueError("TLS (rediss://) is not supported by the built-in RESP client")
+        return RedisSessionStore(spec)
+    raise ValueError(f"Unknown SESSION_STORE {spec!r}; use memory, sqlite:///path or redis://host:port/db")
+
+
+session_store = create_session_store(settings.SESSION_STORE)
@@ -1,23 +1,10 @@
 import os
 from dotenv import load_dotenv
 from pathlib import Path
-import os
-
-# settings.py
-print("📍 현재 경로:", os.getcwd())  # 현재 작업 디렉토리
-print("📍 .env 존재?", os.path.exists(".env"))  # .env가 실제로 거기에 있는지
-
 
 env_path = Path(__file__).resolve().parents[2] / ".env"
-
-print("📍 현재 경로:", os.getcwd())
-print("📍 .env 존재?", env_path.exists())
-print("📍 .env 경로:", env_path)
 load_dotenv(dotenv_path=env_path)
 
-if not os.getenv("OPENAI_API_KEY"):
-    raise RuntimeError("❌ OPENAI_API_KEY not set! Check .env or environment.")
-
 
 class Settings:
     API_V1_STR: str = "/api/v1"
@@ -36,12 +23,135 @@ class Settings:
 
     DEBUG: bool = os.getenv("DEBUG", "false").lower() == "true"
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
-    
-    def __init__(self):
-        print("🔑 OPENAI_API_KEY:", self.OPENAI_API_KEY)
-        if not self.OPENAI_API_KEY:
-            raise RuntimeError("❌ OPENAI_API_KEY not set! Check .env or environment.")
+
+    # Shared FHIR HTTP client pool
+    FHIR_POOL_MAX_CONNECTIONS: int = int(os.getenv("FHIR_POOL_MAX_CONNECTIONS", "100"))
+    FHIR_POOL_MAX_KEEPALIVE: int = int(os.getenv("FHIR_POOL_MAX_KEEPALIVE", "20"))
+    FHIR_POOL_KEEPALIVE_EXPIRY: float = float(os.getenv("FHIR_POOL_KEEPALIVE_EXPIRY", "30"))
+    FHIR_CONNECT_TIMEOUT: float = float(os.getenv("FHIR_CONNECT_TIMEOUT", "5"))
+    FHIR_READ_TIMEOUT: float = float(os.getenv("FHIR_READ_TIMEOUT", "30"))
+    FHIR_POOL_TIMEOUT: float = float(os.getenv("FHIR_POOL_TIMEOUT", "10"))
+    FHIR_HTTP2: bool = os.getenv("FHIR_HTTP2", "false").lower() == "true"
+
+    # Concurrent section fan-out for composite patient endpoints
+    FHIR_SECTION_TIMEOUT: float = float(os.getenv("FHIR_SECTION_TIMEOUT", "15"))
+    FHIR_FANOUT_CONCURRENCY: int = int(os.getenv("FHIR_FANOUT_CONCURRENCY", "8"))
+
+    # Bundle pagination (0 disables a cap)
+    FHIR_PAGE_PREFETCH: int = int(os.getenv("FHIR_PAGE_PREFETCH", "1"))
+    FHIR_MAX_ENTRIES: int = int(os.getenv("FHIR_MAX_ENTRIES", "0"))
+    FHIR_MAX_BYTES: int = int(os.getenv("FHIR_MAX_BYTES", "0"))
+
+    # Batch Bundle mode for composite endpoints: "auto" (use the server's
+    # CapabilityStatement), "on" or "off"
+    FHIR_BATCH_MODE: str = os.getenv("FHIR_BATCH_MODE", "auto").lower()
+
+    # In-process FHIR response cache (FHIR_CACHE_MAX_BYTES=0 disables it)
+    FHIR_CACHE_MAX_BYTES: int = int(os.getenv("FHIR_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    FHIR_CACHE_TTL: float = float(os.getenv("FHIR_CACHE_TTL", "60"))
+    FHIR_CACHE_TTLS: str = os.getenv(
+        "FHIR_CACHE_TTLS",
+        "Patient=600,Condition=300,AllergyIntolerance=300,MedicationRequest=120,"
+        "MedicationStatement=120,Encounter=120,DocumentReference=120,DiagnosticReport=120,"
+        "Observation=30,metadata=3600"
+    )
+
+    # Incremental sync: searches of these resource types are kept as
+    # per-patient snapshots and refreshed with _lastUpdated deltas, with a full
+    # re-fetch every FHIR_DELTA_FULL_RESYNC seconds
+    FHIR_DELTA_SYNC: bool = os.getenv("FHIR_DELTA_SYNC", "false").lower() == "true"
+    FHIR_DELTA_SYNC_TYPES: str = os.getenv("FHIR_DELTA_SYNC_TYPES", "Observation,Condition,Encounter")
+    FHIR_DELTA_FULL_RESYNC: float = float(os.getenv("FHIR_DELTA_FULL_RESYNC", "3600"))
+    FHIR_DELTA_MAX_SNAPSHOTS: int = int(os.getenv("FHIR_DELTA_MAX_SNAPSHOTS", "1024"))
+
+    # Local replica (FHIR_REPLICA_PATH, empty disables): searches of these
+    # resource types are stored in SQLite and answered from it for
+    # FHIR_REPLICA_MAX_AGE seconds after a complete fetch
+    FHIR_REPLICA_PATH: str = os.getenv("FHIR_REPLICA_PATH", "")
+    FHIR_REPLICA_TYPES: str = os.getenv("FHIR_REPLICA_TYPES", "Observation,Condition,Encounter")
+    FHIR_REPLICA_MAX_AGE: float = float(os.getenv("FHIR_REPLICA_MAX_AGE", "300"))
+
+    # name+DOB -> patient id resolution cache (PATIENT_ID_CACHE_PATH enables SQLite persistence)
+    PATIENT_ID_CACHE_SIZE: int = int(os.getenv("PATIENT_ID_CACHE_SIZE", "10000"))
+    PATIENT_ID_CACHE_TTL: float = float(os.getenv("PATIENT_ID_CACHE_TTL", "86400"))
+    PATIENT_ID_NEGATIVE_TTL: float = float(os.getenv("PATIENT_ID_NEGATIVE_TTL", "60"))
+    PATIENT_ID_CACHE_PATH: str = os.getenv("PATIENT_ID_CACHE_PATH", "")
+
+    # LLM scoring
+    LLM_MODEL: str = os.getenv("LLM_MODEL", "mistralai/mistral-7b-instruct")
+    LLM_TEMPERATURE: float = float(os.getenv("LLM_TEMPERATURE", "0.3"))
+    LLM_CACHE_SIZE: int = int(os.getenv("LLM_CACHE_SIZE", "1024"))
+    LLM_CACHE_TTL: float = float(os.getenv("LLM_CACHE_TTL", "86400"))
+    LLM_CACHE_PATH: str = os.getenv("LLM_CACHE_PATH", "cache/llm_scores.db")
+    LLM_BATCH_CONCURRENCY: int = int(os.getenv("LLM_BATCH_CONCURRENCY", "8"))
+    # Largest /llm/predict/batch request accepted, per strategy: batches that
+    # may reach the LLM (llm, cascade) are kept small since every item can be
+    # a paid call; the vectorized rule engine takes far larger ones. Bigger
+    # batches are rejected with 422
+    LLM_BATCH_MAX_ITEMS: int = int(os.getenv("LLM_BATCH_MAX_ITEMS", "100"))
+    RULE_BATCH_MAX_ITEMS: int = int(os.getenv("RULE_BATCH_MAX_ITEMS", "100000"))
+
+    # LLM upstream client: deadlines, retries, circuit breaker and in-flight cap
+    LLM_API_URL: str = os.getenv("LLM_API_URL", "https://openrouter.ai/api/v1/chat/completions")
+    LLM_CONNECT_TIMEOUT: float = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+    LLM_READ_TIMEOUT: float = float(os.getenv("LLM_READ_TIMEOUT", "30"))
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "2"))
+    LLM_BACKOFF_BASE: float = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+    LLM_BACKOFF_MAX: float = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+    LLM_MAX_IN_FLIGHT: int = int(os.getenv("LLM_MAX_IN_FLIGHT", "16"))
+    LLM_MAX_QUEUE: int = int(os.getenv("LLM_MAX_QUEUE", "64"))
+    LLM_QUEUE_TIMEOUT: float = float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))
+    LLM_BREAKER_FAILURES: int = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+    LLM_BREAKER_RESET: float = float(os.getenv("LLM_BREAKER_RESET", "30"))
+    LLM_FALLBACK_TO_RULES: bool = os.getenv("LLM_FALLBACK_TO_RULES", "true").lower() == "true"
+
+    # Triage scoring strategy for /llm/predict: "llm", "rule" or "cascade"
+    TRIAGE_STRATEGY: str = os.getenv("TRIAGE_STRATEGY", "cascade")
+    CASCADE_CONFIDENCE_THRESHOLD: float = float(os.getenv("CASCADE_CONFIDENCE_THRESHOLD", "0.9"))
+
+    # Declarative triage rules (empty path = bundled app/logic/rules/esi_rules.json);
+    # the file is checked for changes at most every TRIAGE_RULES_RELOAD_INTERVAL
+    # seconds, a negative interval disables hot reload
+    TRIAGE_RULES_PATH: str = os.getenv("TRIAGE_RULES_PATH", "")
+    TRIAGE_RULES_RELOAD_INTERVAL: float = float(os.getenv("TRIAGE_RULES_RELOAD_INTERVAL", "5"))
+
+    # In-process request tracing; /debug/traces is only served when
+    # TRACES_ENDPOINT is on (defaults to DEBUG) since traces describe patient lookups
+    TRACING_ENABLED: bool = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+    TRACE_BUFFER_SIZE: int = int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+    TRACES_ENDPOINT: bool = os.getenv("TRACES_ENDPOINT", str(DEBUG)).lower() == "true"
+
+    # Per-session tokens and OAuth states: memory (single worker only),
+    # sqlite:///path or redis://host:port/db to share them across workers.
+    # Requests without a session cookie or X-Session-Id get a 401. Setting
+    # SESSION_LATEST_FALLBACK=true makes them use the most recent login instead,
+    # which is only safe for a single-user, local deployment
+    SESSION_STORE: str = os.getenv("SESSION_STORE", "memory")
+    SESSION_TTL: float = float(os.getenv("SESSION_TTL", "28800"))
+    OAUTH_STATE_TTL: float = float(os.getenv("OAUTH_STATE_TTL", "600"))
+    SESSION_COOKIE_NAME: str = os.getenv("SESSION_COOKIE_NAME", "triage_session")
+    SESSION_COOKIE_SECURE: bool = os.getenv("SESSION_COOKIE_SECURE", "false").lower() == "true"
+    SESSION_LATEST_FALLBACK: bool = os.getenv("SESSION_LATEST_FALLBACK", "false").lower() == "true"
+
+    # SMART token refresh: sessions are renewed TOKEN_REFRESH_MARGIN seconds
+    # before expiry by a check every TOKEN_REFRESH_INTERVAL seconds (0 disables
+    # the background check; expired tokens and FHIR 401s still trigger a refresh)
+    TOKEN_REFRESH_MARGIN: float = float(os.getenv("TOKEN_REFRESH_MARGIN", "120"))
+    TOKEN_REFRESH_INTERVAL: float = float(os.getenv("TOKEN_REFRESH_INTERVAL", "15"))
+
+    # Identify-then-prefetch: once a patient is resolved every section is
+    # fetched in the background (PREFETCH_CONCURRENCY at a time) into a
+    # per-session snapshot that section routes read for PREFETCH_TTL seconds
+    PREFETCH_ENABLED: bool = os.getenv("PREFETCH_ENABLED", "true").lower() == "true"
+    PREFETCH_TTL: float = float(os.getenv("PREFETCH_TTL", "120"))
+    PREFETCH_MAX_PATIENTS: int = int(os.getenv("PREFETCH_MAX_PATIENTS", "256"))
+    PREFETCH_CONCURRENCY: int = int(os.getenv("PREFETCH_CONCURRENCY", "8"))
+
+    # Logging: "json" or "text" records, a bounded queue drained by a writer
+    # thread, and per-logger sampling of DEBUG/INFO ("logger=rate,...")
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json").lower()
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    LOG_SAMPLING: str = os.getenv("LOG_SAMPLING", "")
 
 
-settings = Settings()
-print(settings.OPENAI_API_KEY)
\ No newline at end of file
+settings = Settings()
\ No newline at end of file
@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+import httpx
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+class LLMError(Exception):
+    """The LLM upstream rejected or failed a request."""
+
+
+class LLMUnavailableError(LLMError):
+    """The LLM upstream is unhealthy or saturated; callers should fall back."""
+
+
+class CircuitOpenError(LLMUnavailableError):
+    pass
+
+
+class LLMOverloadedError(LLMUnavailableError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After `failure_threshold` failures in a row the circuit opens and calls
+    fail fast for `reset_timeout` seconds; then a single probe is let
+    through (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"LLM circuit opened after {self.failures} consecutive failures")
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def release(self):
+        """Give up a half-open probe that ended without an outcome (e.g. it was cancelled)."""
+        self._probing = False
+
+
+class LLMClient:
+    """
+    Pooled, resilient client for the chat completions upstream.
+
+    - one keep-alive connection pool shared by every scoring call
+    - connect/read deadlines on every request
+    - jittered exponential backoff on 429/5xx and transport errors
+    - a circuit breaker that fails fast while the upstream is unhealthy
+    - at most `max_in_flight` concurrent calls with a bounded wait queue
+    """
+
+    def __init__(
+        self,
+        url: str,
+        connect_timeout: float,
+        read_timeout: float,
+        max_retries: int,
+        backoff_base: float,
+        backoff_max: float,
+        max_in_flight: int,
+        max_queue: int,
+        queue_timeout: float,
+        breaker: CircuitBreaker
+    ):
+        self.url = url
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.breaker = breaker
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._client: Optional[httpx.AsyncClient] = None
+        self.in_flight = 0
+        self.waiting = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_in_flight,
+                    max_keepalive_connections=self.max_in_flight
+                )
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @asynccontextmanager
+    async def _slot(self):
+        if self.waiting >= self.max_queue:
+            raise LLMOverloadedError(f"LLM wait queue is full ({self.max_queue} waiting)")
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise LLMOverloadedError(f"Timed out after {self.queue_timeout}s waiting for an LLM slot")
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        # Full jitter keeps retrying workers from synchronising
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def _send(self, headers: dict, payload: dict, stream: bool) -> httpx.Response:
+        """Send with retries; returns a successful (2xx) response or raises."""
+        probe = self.breaker.state == "half-open"
+        if not self.breaker.allow():
+            raise CircuitOpenError("LLM circuit is open; upstream marked unhealthy")
+        try:
+            return await self._attempt(headers, payload, stream)
+        finally:
+            # A probe that is cancelled or fails in an unexpected way records
+            # no outcome; without this the circuit would stay half-open and
+            # reject every call
+            if probe:
+                self.breaker.release()
+
+    async def _attempt(self, headers: dict, payload: dict, stream: bool) -> httpx.Response:
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                request = self.client.build_request("POST", self.url, headers=headers, json=payload)
+                response = await self.client.send(request, stream=stream)
+            except httpx.TransportError as e:
+                error = LLMUnavailableError(f"LLM request failed: {type(e).__name__}: {e}")
+            else:
+                if response.status_code < 400:
+                    self.breaker.record_success()
+                    return response
+
+                body = (await response.aread()).decode(errors="replace")
+                await response.aclose()
+                if response.status_code not in RETRYABLE_STATUS:
+                    self.breaker.record_success()
+                    raise LLMError(f"OpenRouter API error {response.status_code}: {body}")
+                error = LLMUnavailableError(f"OpenRouter API error {response.status_code}: {body}")
+
+            if attempt < self.max_retries:
+                delay = self._backoff(attempt, response)
+                logger.warning(f"{error}; retrying in {delay:.2f}s ({attempt + 1}/{self.max_retries})")
+                await asyncio.sleep(delay)
+
+        self.breaker.record_failure()
+        raise error
+
+    async def complete(self, headers: dict, payload: dict) -> dict:
+        async with self._slot():
+            response = await self._send(headers, payload, stream=False)
+            return response.json()
+
+    @asynccontextmanager
+    async def stream(self, headers: dict, payload: dict) -> AsyncIterator[httpx.Response]:
+        """Open a streaming completion; only the initial request is retried."""
+        async with self._slot():
+            response = await self._send(headers, payload, stream=True)
+            try:
+                yield response
+            finally:
+                await response.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures
+        }
+
+
+llm_client = LLMClient(
+    url=settings.LLM_API_URL,
+    connect_timeout=settings.LLM_CONNECT_TIMEOUT,
+    read_timeout=settings.LLM_READ_TIMEOUT,
+    max_retries=settings.LLM_MAX_RETRIES,
+    backoff_base=settings.LLM_BACKOFF_BASE,
+    backoff_max=settings.LLM_BACKOFF_MAX,
+    max_in_flight=settings.LLM_MAX_IN_FLIGHT,
+    max_queue=settings.LLM_MAX_QUEUE,
+    queue_timeout=settings.LLM_QUEUE_TIMEOUT,
+    breaker=CircuitBreaker(settings.LLM_BREAKER_FAILURES, settings.LLM_BREAKER_RESET)
+)
@@ -0,0 +1,333 @@
+import functools
+import json
+import logging
+import math
+import operator
+import os
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Dict, FrozenSet, List, Optional, Sequence
+from app.config.settings import settings
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(__file__), "rules", "esi_rules.json")
+
+OPERATORS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+def _to_number(parse, value) -> float:
+    try:
+        return parse(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class RuleSetError(ValueError):
+    """A rule file could not be parsed or compiled."""
+
+
+class KeywordMatcher:
+    """
+    Aho–Corasick automaton over lower-cased keywords.
+
+    labels(text) walks the text once and returns the labels of every keyword
+    occurring in it, so matching cost depends on the text length only, not
+    on how many keywords are registered. Results for recently seen texts
+    are memoized, since chief complaints repeat heavily across requests.
+    """
+
+    def __init__(self, keywords: Dict[str, Sequence[str]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._out: List[FrozenSet[str]] = [frozenset()]
+
+        for label, words in keywords.items():
+            for word in words:
+                state = 0
+                for ch in word.lower():
+                    if ch not in self._goto[state]:
+                        self._goto.append({})
+                        self._out.append(frozenset())
+                        self._goto[state][ch] = len(self._goto) - 1
+                    state = self._goto[state][ch]
+                self._out[state] = self._out[state] | {label}
+
+        # Breadth-first so every failure target is finished before it is used,
+        # then fold the failure links into a full transition table: matching
+        # is one dict lookup per character with no backtracking
+        fail = [0] * len(self._goto)
+        self._delta: List[Dict[str, int]] = [dict(self._goto[0])] + [{} for _ in self._goto[1:]]
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            self._delta[state] = {**self._delta[fail[state]], **self._goto[state]}
+            for ch, child in self._goto[state].items():
+                queue.append(child)
+                fail[child] = self._delta[fail[state]].get(ch, 0)
+                self._out[child] = self._out[child] | self._out[fail[child]]
+
+        self.labels = functools.lru_cache(maxsize=4096)(self._scan)
+
+    def _scan(self, text: str) -> FrozenSet[str]:
+        delta, out = self._delta, self._out
+        found = frozenset()
+        state = 0
+        for ch in text.lower():
+            state = delta[state].get(ch, 0)
+            if out[state]:
+                found = found | out[state]
+        return found
+
+
+class Clause:
+    """One criterion of a rule, optionally restricted to an age band."""
+
+    def __init__(self, spec: dict, vitals: Dict[str, dict], groups: Dict[str, list]):
+        self.min_age = spec.get("min_age")
+        self.max_age = spec.get("max_age")
+        self.vital = self.op = self.value = None
+        self.symptoms: FrozenSet[str] = frozenset()
+        self.conditions: FrozenSet[str] = frozenset()
+
+        if "vital" in spec:
+            if spec["vital"] not in vitals:
+                raise RuleSetError(f"Unknown vital {spec['vital']!r}; declare it under \"vitals\"")
+            if spec.get("op") not in OPERATORS:
+                raise RuleSetError(f"Unknown operator {spec.get('op')!r} for vital {spec['vital']!r}")
+            self.vital = spec["vital"]
+            self.op = OPERATORS[spec["op"]]
+            self.value = float(spec["value"])
+        elif "symptoms" in spec:
+            unknown = [g for g in spec["symptoms"] if g not in groups]
+            if unknown:
+                raise RuleSetError(f"Unknown symptom groups: {', '.join(unknown)}")
+            self.symptoms = frozenset(spec["symptoms"])
+        elif "conditions" in spec:
+            self.conditions = frozenset(spec["conditions"])
+        else:
+            raise RuleSetError(f"Clause needs one of vital, symptoms or conditions: {spec}")
+
+    def _in_age_band(self, age: int) -> bool:
+        return (self.min_age is None or age >= self.min_age) and (self.max_age is None or age <= self.max_age)
+
+    def matches(self, age: int, vitals: Dict[str, float], symptoms: FrozenSet[str], conditions: FrozenSet[str]) -> bool:
+        if not self._in_age_band(age):
+            return False
+        if self.vital:
+            return self.op(vitals[self.vital], self.value)
+        if self.symptoms:
+            return not self.symptoms.isdisjoint(symptoms)
+        return not self.conditions.isdisjoint(conditions)
+
+    def mask(self, ages: "np.ndarray", vitals: Dict[str, "np.ndarray"], symptoms: list, conditions: list) -> "np.ndarray":
+        import numpy as np
+        if self.vital:
+            # NaN (unparseable) compares False, like a missing criterion
+            selected = self.op(vitals[self.vital], self.value)
+        elif self.symptoms:
+            selected = np.fromiter((not self.symptoms.isdisjoint(s) for s in symptoms), bool, len(symptoms))
+        else:
+            selected = np.fromiter((not self.conditions.isdisjoint(c) for c in conditions), bool, len(conditions))
+        if self.min_age is not None:
+            selected = selected & (ages >= self.min_age)
+        if self.max_age is not None:
+            selected = selected & (ages <= self.max_age)
+        return selected
+
+
+class Rule:
+    def __init__(self, spec: dict, vitals: Dict[str, dict], groups: Dict[str, list]):
+        try:
+            self.name = spec["name"]
+            self.esi_score = int(spec["esi_score"])
+            self.confidence = float(spec["confidence"])
+            self.explanation = spec["explanation"]
+        except (KeyError, TypeError, ValueError) as e:
+            raise RuleSetError(f"Invalid rule {spec.get('name', spec)!r}: {e}")
+        self.clauses = [Clause(clause, vitals, groups) for clause in spec.get("any", [])]
+
+    @property
+    def is_fallback(self) -> bool:
+        return not self.clauses
+
+    def result(self) -> dict:
+        return {"esi_score": self.esi_score, "explanation": self.explanation, "confidence": self.confidence}
+
+
+class CompiledRuleSet:
+    """
+    Decision table compiled from a rule file: rules are tried in order and
+    the first whose criteria match wins; the final rule is the fallback.
+    """
+
+    def __init__(self, spec: dict, source: str = "<memory>"):
+        self.source = source
+        self.version = spec.get("version")
+        self.vitals: Dict[str, dict] = spec.get("vitals", {})
+        groups = spec.get("symptom_groups", {})
+        for name, vital in self.vitals.items():
+            if vital.get("type", "int") not in ("int", "float"):
+                raise RuleSetError(f"Vital {name!r} has unsupported type {vital.get('type')!r}")
+
+        self.rules = [Rule(rule, self.vitals, groups) for rule in spec.get("rules", [])]
+        if not self.rules or not self.rules[-1].is_fallback:
+            raise RuleSetError("The last rule must have no criteria so every request gets a score")
+        if any(rule.is_fallback for rule in self.rules[:-1]):
+            raise RuleSetError("Only the last rule may be a fallback; later rules would never match")
+
+        self._parsers = {name: int if vital.get("type", "int") == "int" else float for name, vital in self.vitals.items()}
+        self.matcher = KeywordMatcher(groups)
+        self.keyword_count = sum(len(words) for words in groups.values())
+
+    def _parse(self, name: str, value) -> float:
+        return _to_number(self._parsers[name], value)
+
+    def _invalid_vitals(self, vitals: Dict[str, str]) -> List[str]:
+        invalid = []
+        for name, vital in self.vitals.items():
+            value = vitals.get(name, vital.get("default"))
+            if value is None:
+                invalid.append(f"{name} missing")
+            elif math.isnan(self._parse(name, value)):
+                invalid.append(f"{name}={value!r}")
+        return invalid
+
+    def evaluate(self, age: int, vitals: Dict[str, str], symptoms: str, conditions: Sequence[str]) -> dict:
+        """Score one request; raises ValueError if a declared vital is not a number."""
+        parsed = {name: self._parse(name, vitals.get(name, v.get("default"))) for name, v in self.vitals.items()}
+        if any(math.isnan(value) for value in parsed.values()):
+            raise ValueError(f"Invalid vitals: {', '.join(self._invalid_vitals(vitals))}")
+
+        matched = self.matcher.labels(symptoms)
+        condition_set = frozenset(conditions)
+        for rule in self.rules:
+            if rule.is_fallback or any(c.matches(age, parsed, matched, condition_set) for c in rule.clauses):
+                return rule.result()
+
+    def evaluate_batch(self, items: Sequence) -> List:
+        """
+        Score a batch of LLMRequest-like items at once: vitals become NumPy
+        columns, each rule a boolean mask, and np.select picks the first
+        matching rule per row. Rows with unparseable vitals get a ValueError.
+        """
+        n = len(items)
+        if not n:
+            return []
+        # Deferred so the scalar path and app start-up never load NumPy
+        import numpy as np
+
+        ages = np.fromiter((i.age for i in items), float, n)
+        columns = {
+            name: np.fromiter(
+                (_to_number(parse, i.vitals.get(name, default)) for i in items), float, n
+            )
+            for (name, parse), default in zip(self._parsers.items(), (v.get("default") for v in self.vitals.values()))
+        }
+        symptoms = [self.matcher.labels(i.symptoms) for i in items]
+        conditions = [frozenset(i.conditions) for i in items]
+
+        masks = []
+        for rule in self.rules[:-1]:
+            mask = np.zeros(n, bool)
+            for clause in rule.clauses:
+                mask |= clause.mask(ages, columns, symptoms, conditions)
+            masks.append(mask)
+        chosen = np.select(masks, np.arange(len(masks)), default=len(self.rules) - 1) if masks else np.full(n, 0)
+
+        outcomes = [rule.result() for rule in self.rules]
+        results: List = [dict(outcomes[r]) for r in chosen.tolist()]
+        if columns:
+            invalid = np.logical_or.reduce([np.isnan(column) for column in columns.values()])
+            for index in np.flatnonzero(invalid).tolist():
+                results[index] = ValueError(f"Invalid vitals: {', '.join(self._invalid_vitals(items[index].vitals))}")
+        return results
+
+
+def load_rules(path: str) -> CompiledRuleSet:
+    try:
+        with open(path, encoding="utf-8") as f:
+            spec = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise RuleSetError(f"Could not read rule file {path}: {e}")
+    return CompiledRuleSet(spec, source=path)
+
+
+class RuleEngine:
+    """
+    Holds the compiled rule set for a rule file and hot-reloads it.
+
+    At most every `check_interval` seconds the file's mtime is compared with
+    the loaded one; a changed file is recompiled and swapped in atomically.
+    If the new file fails to compile the previous rules stay active.
+    """
+
+    def __init__(self, path: str, check_interval: float):
+        self.path = path
+        self.check_interval = check_interval
+        self.reloads = 0
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._mtime = self._stat()
+        self._checked_at = time.monotonic()
+        self._rules = load_rules(path)
+
+    def _stat(self) -> Optional[float]:
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+            mtime = self._stat()
+            if mtime is None or mtime == self._mtime:
+                return
+            self._mtime = mtime
+            try:
+                self._rules = load_rules(self.path)
+            except RuleSetError as e:
+                self.last_error = str(e)
+                logger.error(f"Keeping previous triage rules; reload of {self.path} failed: {e}")
+                return
+            self.reloads += 1
+            self.last_error = None
+            logger.info(f"Reloaded triage rules from {self.path} ({len(self._rules.rules)} rules)")
+
+    @property
+    def rules(self) -> CompiledRuleSet:
+        if self.check_interval >= 0:
+            self._maybe_reload()
+        return self._rules
+
+    def stats(self) -> dict:
+        rules = self._rules
+        return {
+            "source": rules.source,
+            "version": rules.version,
+            "rules": len(rules.rules),
+            "keywords": rules.keyword_count,
+            "reloads": self.reloads,
+            "last_error": self.last_error
+        }
+
+
+rule_engine = RuleEngine(
+    settings.TRIAGE_RULES_PATH or DEFAULT_RULES_PATH,
+    check_interval=settings.TRIAGE_RULES_RELOAD_INTERVAL
+)
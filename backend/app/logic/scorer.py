@@ -1,17 +1,93 @@
+import logging
+from typing import AsyncIterator, Dict, List, Tuple, Union
 from app.schemas.triage import LLMRequest
+from app.logic.llm_client import LLMUnavailableError
 from app.logic.strategies.llm_strategy import LLMScoringStrategy
 from app.logic.strategies.rule_strategy import RuleBasedESIStrategy
+from app.logic.strategies.cascade_strategy import CascadeScoringStrategy
+from app.config.settings import settings
+from app.utils.tracing import span
+
+logger = logging.getLogger(__name__)
 
 class TriageScorer:
+    STRATEGIES = {
+        "llm": LLMScoringStrategy,
+        "rule": RuleBasedESIStrategy,
+        "cascade": CascadeScoringStrategy
+    }
+
     def __init__(self, strategy: str = "llm"):
         self.strategy_name = strategy.lower()
-        self.strategy = {
-            "llm": LLMScoringStrategy(),
-            "rule": RuleBasedESIStrategy()
-        }.get(self.strategy_name)
+        strategy_class = self.STRATEGIES.get(self.strategy_name)
 
-        if not self.strategy:
+        if not strategy_class:
             raise ValueError(f"Unknown strategy: {strategy}")
+        self.strategy = strategy_class()
+
+    def _can_fall_back(self) -> bool:
+        return settings.LLM_FALLBACK_TO_RULES and self.strategy_name != "rule"
+
+    async def _fallback(self, request_data: LLMRequest, error: LLMUnavailableError) -> dict:
+        """Score with the rule engine when the LLM upstream is unavailable."""
+        if not self._can_fall_back():
+            raise error
+        logger.warning(f"LLM unavailable ({error}); falling back to rule-based scoring")
+        try:
+            result = await RuleBasedESIStrategy().score(request_data)
+        except ValueError:
+            raise error
+        return {**result, "strategy": "rule-fallback"}
 
     async def predict(self, request_data: LLMRequest) -> dict:
-        return await self.strategy.score(request_data)
+        with span(f"score.{self.strategy_name}"):
+            try:
+                result = await self.strategy.score(request_data)
+            except LLMUnavailableError as e:
+                result = await self._fallback(request_data, e)
+        return {"strategy": self.strategy_name, **result}
+
+    async def predict_batch(self, items: List[LLMRequest]) -> List[Union[dict, Exception]]:
+        with span(f"score.{self.strategy_name}", items=len(items)):
+            results = await self.strategy.score_batch(items)
+
+        unavailable = [i for i, result in enumerate(results) if isinstance(result, LLMUnavailableError)]
+        if unavailable and self._can_fall_back():
+            logger.warning(f"LLM unavailable for {len(unavailable)} batch items; falling back to rule-based scoring")
+            fallbacks = await RuleBasedESIStrategy().score_batch([items[i] for i in unavailable])
+            for index, fallback in zip(unavailable, fallbacks):
+                if not isinstance(fallback, Exception):
+                    results[index] = {**fallback, "strategy": "rule-fallback"}
+
+        return [
+            result if isinstance(result, Exception) else {"strategy": self.strategy_name, **result}
+            for result in results
+        ]
+
+    async def stream(self, request_data: LLMRequest) -> AsyncIterator[Tuple[str, dict]]:
+        started = False
+        try:
+            async for event, payload in self.strategy.stream(request_data):
+                started = True
+                if event == "result":
+                    payload = {"strategy": self.strategy_name, **payload}
+                yield event, payload
+        except LLMUnavailableError as e:
+            # Tokens already sent cannot be taken back, so only fall back
+            # when the upstream failed before producing anything.
+            if started:
+                raise
+            result = await self._fallback(request_data, e)
+            yield "esi_score", {"esi_score": result["esi_score"]}
+            yield "result", result
+
+
+
+_scorers: Dict[str, TriageScorer] = {}
+
+def get_scorer(strategy: str) -> TriageScorer:
+    """Shared scorer per strategy name, built on first use rather than per request."""
+    name = strategy.lower()
+    if name not in _scorers:
+        _scorers[name] = TriageScorer(name)
+    return _scorers[name]
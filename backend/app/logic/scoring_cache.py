@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from app.schemas.triage import LLMRequest
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+def _coerce_vital(value: str):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return " ".join(str(value).casefold().split())
+
+
+def canonical_request(data: LLMRequest, model: str, temperature: float, prompt_version: str) -> str:
+    """
+    Canonical form of a scoring request: conditions sorted, symptom text
+    case/whitespace-normalized and vitals coerced to numbers, together with
+    everything else that changes the LLM's answer.
+    """
+    return json.dumps(
+        {
+            "age": data.age,
+            "gender": data.gender.strip().casefold(),
+            "symptoms": " ".join(data.symptoms.casefold().split()),
+            "vitals": {key: _coerce_vital(value) for key, value in data.vitals.items()},
+            "conditions": sorted(" ".join(c.casefold().split()) for c in data.conditions),
+            "model": model,
+            "temperature": temperature,
+            "prompt_version": prompt_version,
+        },
+        sort_keys=True,
+        separators=(",", ":")
+    )
+
+
+class ScoringCache:
+    """
+    Two-tier cache of LLM scoring results.
+
+    An in-memory LRU answers repeat submissions within the worker; an
+    on-disk SQLite tier (optional, `path`) shares results across workers
+    and restarts. Both tiers honour the same TTL.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._entries: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+
+    @staticmethod
+    def key(canonical: str) -> str:
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS scoring_cache ("
+                "key TEXT PRIMARY KEY, result TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+        return self._db
+
+    def _db_get(self, key: str) -> Optional[Tuple[dict, float]]:
+        with self._db_lock:
+            row = self._connect().execute(
+                "SELECT result, expires_at FROM scoring_cache WHERE key = ?", (key,)
+            ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def _db_set(self, key: str, result: dict, expires_at: float):
+        with self._db_lock:
+            db = self._connect()
+            db.execute(
+                "INSERT OR REPLACE INTO scoring_cache (key, result, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(result), expires_at)
+            )
+            db.execute("DELETE FROM scoring_cache WHERE expires_at < ?", (time.time(),))
+            db.commit()
+
+    def _remember(self, key: str, result: dict, expires_at: float):
+        self._entries[key] = (result, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str) -> Tuple[Optional[dict], Optional[str]]:
+        """Return (result, tier) where tier is "memory" or "disk", or (None, None) on a miss."""
+        entry = self._entries.get(key)
+        if entry and entry[1] > time.time():
+            self._entries.move_to_end(key)
+            self.hits["memory"] += 1
+            return entry[0], "memory"
+
+        if self.path:
+            try:
+                entry = await asyncio.to_thread(self._db_get, key)
+            except sqlite3.Error as e:
+                logger.warning(f"Scoring cache read failed, using memory tier only: {e}")
+                self.path = None
+                entry = None
+            if entry and entry[1] > time.time():
+                self._remember(key, *entry)
+                self.hits["disk"] += 1
+                return entry[0], "disk"
+
+        self._entries.pop(key, None)
+        self.misses += 1
+        return None, None
+
+    async def set(self, key: str, result: dict):
+        expires_at = time.time() + self.ttl
+        self._remember(key, result, expires_at)
+        if self.path:
+            try:
+                await asyncio.to_thread(self._db_set, key, result, expires_at)
+            except sqlite3.Error as e:
+                logger.warning(f"Scoring cache write failed, using memory tier only: {e}")
+                self.path = None
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": dict(self.hits), "misses": self.misses}
+
+
+scoring_cache = ScoringCache(
+    max_entries=settings.LLM_CACHE_SIZE,
+    ttl=settings.LLM_CACHE_TTL,
+    path=settings.LLM_CACHE_PATH or None
+)
@@ -1,7 +1,28 @@
+import asyncio
 from abc import ABC, abstractmethod
+from typing import AsyncIterator, List, Tuple, Union
 from app.schemas.triage import LLMRequest
 
 class TriageScoringStrategy(ABC):
+    # Max concurrent score() calls when a batch falls back to per-item scoring
+    batch_concurrency: int = 8
+
     @abstractmethod
     async def score(self, data: LLMRequest) -> dict:
-        pass
\ No newline at end of file
+        pass
+
+    async def score_batch(self, items: List[LLMRequest]) -> List[Union[dict, Exception]]:
+        """Score many requests, returning results (or the raised exception) in input order."""
+        semaphore = asyncio.Semaphore(self.batch_concurrency)
+
+        async def score_one(item: LLMRequest):
+            async with semaphore:
+                return await self.score(item)
+
+        return await asyncio.gather(*(score_one(item) for item in items), return_exceptions=True)
+
+    async def stream(self, data: LLMRequest) -> AsyncIterator[Tuple[str, dict]]:
+        """Yield ("esi_score", ...) then ("result", ...); streaming strategies also yield tokens."""
+        result = await self.score(data)
+        yield "esi_score", {"esi_score": result.get("esi_score")}
+        yield "result", result
@@ -0,0 +1,69 @@
+import functools
+from typing import AsyncIterator, List, Tuple, Union
+from app.schemas.triage import LLMRequest
+from app.logic.strategies.base import TriageScoringStrategy
+from app.logic.strategies.llm_strategy import LLMScoringStrategy
+from app.logic.strategies.rule_strategy import RuleBasedESIStrategy
+from app.config.settings import settings
+
+class CascadeScoringStrategy(TriageScoringStrategy):
+    """
+    Score with the rule engine first and only escalate to the LLM when the
+    rule result is below the confidence threshold (or the rules cannot
+    evaluate the request). Results record which path was taken.
+    """
+
+    def __init__(self, threshold: float = None):
+        self.threshold = settings.CASCADE_CONFIDENCE_THRESHOLD if threshold is None else threshold
+
+    @functools.cached_property
+    def rule(self) -> RuleBasedESIStrategy:
+        return RuleBasedESIStrategy()
+
+    @functools.cached_property
+    def llm(self) -> LLMScoringStrategy:
+        # Only built once a request is actually escalated
+        return LLMScoringStrategy()
+
+    def _is_decisive(self, result) -> bool:
+        return isinstance(result, dict) and result.get("confidence", 0) >= self.threshold
+
+    async def score(self, data: LLMRequest) -> dict:
+        try:
+            result = await self.rule.score(data)
+        except ValueError:
+            result = None
+
+        if self._is_decisive(result):
+            return {**result, "strategy": "rule"}
+        return {**await self.llm.score(data), "strategy": "llm"}
+
+    async def score_batch(self, items: List[LLMRequest]) -> List[Union[dict, Exception]]:
+        results = await self.rule.score_batch(items)
+        escalate = [index for index, result in enumerate(results) if not self._is_decisive(result)]
+
+        for index, result in enumerate(results):
+            if self._is_decisive(result):
+                results[index] = {**result, "strategy": "rule"}
+
+        if escalate:
+            llm_results = await self.llm.score_batch([items[index] for index in escalate])
+            for index, result in zip(escalate, llm_results):
+                results[index] = result if isinstance(result, Exception) else {**result, "strategy": "llm"}
+        return results
+
+    async def stream(self, data: LLMRequest) -> AsyncIterator[Tuple[str, dict]]:
+        try:
+            result = await self.rule.score(data)
+        except ValueError:
+            result = None
+
+        if self._is_decisive(result):
+            yield "esi_score", {"esi_score": result["esi_score"]}
+            yield "result", {**result, "strategy": "rule"}
+            return
+
+        async for event, payload in self.llm.stream(data):
+            if event == "result":
+                payload = {**payload, "strategy": "llm"}
+            yield event, payload
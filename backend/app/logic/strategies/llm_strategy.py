@@ -1,61 +1,191 @@
 import json
+import logging
+import re
+import time
+from typing import AsyncIterator, Optional, Tuple
+import httpx
 from app.schemas.triage import LLMRequest
 from app.logic.strategies.base import TriageScoringStrategy
+from app.logic.scoring_cache import scoring_cache, canonical_request
+from app.logic.llm_client import LLMError, LLMUnavailableError, llm_client
+from app.utils.metrics import llm_errors, llm_request_duration, llm_tokens
+from app.utils.tracing import record_span
 from app.config.settings import settings
-import httpx
 
+logger = logging.getLogger(__name__)
+
+# Models often wrap the JSON answer in a Markdown code fence
+CODE_FENCE = re.compile(r"^\s*```[\w-]*\s*\n?(.*?)\n?\s*```\s*$", re.DOTALL)
+
+class ESIScoreScanner:
+    """
+    Incrementally scan streamed JSON text for a complete "esi_score" value.
+
+    The score is reported once the digits are followed by a delimiter, so a
+    partial token such as `"esi_score": 1` is not mistaken for ESI 1 when
+    more digits may follow.
+    """
+    PATTERN = re.compile(r'"esi_score"\s*:\s*"?(\d+)(?=[^\d])')
+
+    def __init__(self):
+        self.buffer = ""
+        self.offset = 0
+        self.score: Optional[int] = None
+
+    def feed(self, text: str) -> Optional[int]:
+        """Add text; return the score the first time it becomes complete."""
+        self.buffer += text
+        if self.score is not None:
+            return None
+        match = self.PATTERN.search(self.buffer, self.offset)
+        if match:
+            self.score = int(match.group(1))
+            return self.score
+        # Keep enough tail to re-match a key split across chunks
+        self.offset = max(0, len(self.buffer) - 32)
+        return None
 
-print("🧪 OPENAI_API_KEY:", settings.OPENAI_API_KEY)
 
 class LLMScoringStrategy(TriageScoringStrategy):
+    # Bump whenever build_prompt changes so cached scores are not reused
+    PROMPT_VERSION = "1"
+
+    def __init__(self):
+        if not settings.OPENAI_API_KEY:
+            logger.warning("OPENAI_API_KEY is not set; LLM scoring requests will be rejected upstream")
+        self.model = settings.LLM_MODEL
+        self.temperature = settings.LLM_TEMPERATURE
+        self.batch_concurrency = settings.LLM_BATCH_CONCURRENCY
+
     async def score(self, data: LLMRequest) -> dict:
+        cache_key = scoring_cache.key(
+            canonical_request(data, self.model, self.temperature, self.PROMPT_VERSION)
+        )
+        cached, tier = await scoring_cache.get(cache_key)
+        if cached:
+            return {**cached, "cache": tier}
+
         prompt = self.build_prompt(data)
+        headers = self._headers()
+        payload = self._payload(prompt)
+        logger.debug(f"LLM request: model={self.model} prompt_chars={len(prompt)}")
+
+        start = time.perf_counter()
+        try:
+            completion = await llm_client.complete(headers, payload)
+        except LLMError as e:
+            self._record_failure("complete", start, e)
+            raise
+        self._record_success("complete", start)
+        self._record_usage(completion.get("usage"))
+
+        content = completion["choices"][0]["message"]["content"]
+        return await self._finish(cache_key, content)
+
+    async def stream(self, data: LLMRequest) -> AsyncIterator[Tuple[str, dict]]:
+        """
+        Stream the completion as ("token", ...) events, emit ("esi_score", ...)
+        as soon as the score field is complete and finish with ("result", ...).
+        """
+        cache_key = scoring_cache.key(
+            canonical_request(data, self.model, self.temperature, self.PROMPT_VERSION)
+        )
+        cached, tier = await scoring_cache.get(cache_key)
+        if cached:
+            yield "esi_score", {"esi_score": cached.get("esi_score")}
+            yield "result", {**cached, "cache": tier}
+            return
 
-        headers = {
+        payload = self._payload(self.build_prompt(data), stream=True)
+        scanner = ESIScoreScanner()
+        start = time.perf_counter()
+        try:
+            async with llm_client.stream(self._headers(), payload) as response:
+                async for line in response.aiter_lines():
+                    # SSE comments (": keep-alive") and blank separators carry no data
+                    if not line.startswith("data:"):
+                        continue
+                    chunk = line[5:].strip()
+                    if chunk == "[DONE]":
+                        break
+                    event = json.loads(chunk)
+                    # Some upstreams report usage on the final chunk
+                    self._record_usage(event.get("usage"))
+                    delta = (event.get("choices") or [{}])[0].get("delta", {}).get("content")
+                    if not delta:
+                        continue
+                    yield "token", {"text": delta}
+                    esi_score = scanner.feed(delta)
+                    if esi_score is not None:
+                        yield "esi_score", {"esi_score": esi_score}
+        except LLMError as e:
+            self._record_failure("stream", start, e)
+            raise
+        except (httpx.HTTPError, ValueError) as e:
+            # The connection dropped or the upstream sent a malformed chunk
+            # after the response started; count it against the upstream
+            llm_client.breaker.record_failure()
+            error = LLMUnavailableError(f"LLM stream failed: {type(e).__name__}: {e}")
+            self._record_failure("stream", start, error)
+            raise error from e
+        self._record_success("stream", start)
+
+        yield "result", await self._finish(cache_key, scanner.buffer, streamed_score=scanner.score)
+
+    async def _finish(self, cache_key: str, content: str, streamed_score: Optional[int] = None) -> dict:
+        fenced = CODE_FENCE.match(content)
+        try:
+            parsed = json.loads(fenced.group(1) if fenced else content)
+        except json.JSONDecodeError:
+            # Unparseable answers are not cached. A stream keeps the score it
+            # already sent, so the client never sees two; otherwise ESI 3
+            return {
+                "esi_score": streamed_score if streamed_score is not None else 3,
+                "explanation": content.strip(),
+                "cache": "miss"
+            }
+
+        if isinstance(parsed, dict) and isinstance(parsed.get("esi_score"), int):
+            await scoring_cache.set(cache_key, parsed)
+        return {**parsed, "cache": "miss"}
+
+    def _record_usage(self, usage: Optional[dict]):
+        for kind in ("prompt_tokens", "completion_tokens"):
+            if usage and usage.get(kind):
+                llm_tokens.inc(usage[kind], model=self.model, kind=kind.split("_")[0])
+
+    def _record_success(self, mode: str, start: float):
+        elapsed = time.perf_counter() - start
+        llm_request_duration.observe(elapsed, model=self.model, mode=mode, outcome="ok")
+        record_span(f"llm.{mode}", start, elapsed, model=self.model)
+
+    def _record_failure(self, mode: str, start: float, error: LLMError):
+        elapsed = time.perf_counter() - start
+        outcome = "unavailable" if isinstance(error, LLMUnavailableError) else "error"
+        llm_request_duration.observe(elapsed, model=self.model, mode=mode, outcome=outcome)
+        llm_errors.inc(model=self.model, error=type(error).__name__)
+        record_span(f"llm.{mode}", start, elapsed, model=self.model, error=type(error).__name__)
+
+    def _headers(self) -> dict:
+        return {
             "Authorization": f"Bearer {settings.OPENAI_API_KEY}",
             "HTTP-Referer": "http://localhost:8000",
             "X-Title": "triage-llm-dev",
             "Content-Type": "application/json"
         }
 
+    def _payload(self, prompt: str, stream: bool = False) -> dict:
         payload = {
-            "model": "mistralai/mistral-7b-instruct",  
+            "model": self.model,
             "messages": [
                 {"role": "system", "content": "You are a medical triage assistant."},
                 {"role": "user", "content": prompt}
             ],
-            "temperature": 0.3
+            "temperature": self.temperature
         }
-
-        # 🔍 DEBUG 로그 출력
-        print("📦 [디버그] API KEY:", settings.OPENAI_API_KEY)
-        print("📦 [디버그] Headers:", headers)
-        print("📦 [디버그] Payload:", json.dumps(payload, indent=2))
-
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                url="https://openrouter.ai/api/v1/chat/completions",
-                headers=headers,
-                json=payload
-            )
-
-        print("📨 [디버그] 응답 상태코드:", response.status_code)
-        print("📨 [디버그] 응답 본문:", response.text)
-
-        if response.status_code != 200:
-            raise Exception(f"OpenRouter API error {response.status_code}: {response.text}")
-
-        content = response.json()["choices"][0]["message"]["content"]
-
-        try:
-            parsed = json.loads(content)
-        except json.JSONDecodeError:
-            parsed = {
-                "esi_score": 3,
-                "explanation": content.strip()
-            }
-
-        return parsed
+        if stream:
+            payload["stream"] = True
+        return payload
 
     def build_prompt(self, data: LLMRequest) -> str:
         return f"""You are a triage assistant. Based on the following data, assign an ESI level (1–5) and explain.
@@ -1,32 +1,25 @@
+from typing import List, Optional, Union
+from app.logic.rule_engine import RuleEngine, rule_engine
 from app.logic.strategies.base import TriageScoringStrategy
 from app.schemas.triage import LLMRequest
 
 class RuleBasedESIStrategy(TriageScoringStrategy):
-    async def score(self, data: LLMRequest) -> dict:
-        vitals = data.vitals
-        symptoms = data.symptoms.lower()
-        conditions = data.conditions
-
-        hr = int(vitals.get("heartRate", "0"))
-        bp = int(vitals.get("bloodPressureSystolic", "120"))
-        rr = int(vitals.get("respiratoryRate", "16"))
+    """
+    Scores requests with the declarative rule set (app/logic/rules/esi_rules.json
+    by default, TRIAGE_RULES_PATH to override). Rule confidences tell the
+    cascade strategy which results to trust and which to escalate to the LLM.
+    """
 
-        explanation = []
+    def __init__(self, engine: Optional[RuleEngine] = None):
+        self.engine = engine or rule_engine
 
-        if hr > 130 or bp < 90 or rr > 30:
-            explanation.append("Abnormal vitals (HR > 130, BP < 90, RR > 30)")
-            score = 2
-        elif "chest pain" in symptoms or "shortness of breath" in symptoms:
-            explanation.append("Symptoms indicate moderate severity")
-            score = 2
-        elif "hypertension" in conditions:
-            explanation.append("Stable chronic condition with no acute distress")
-            score = 3
-        else:
-            explanation.append("Stable vitals and symptoms")
-            score = 4
+    async def score(self, data: LLMRequest) -> dict:
+        return self.engine.rules.evaluate(data.age, data.vitals, data.symptoms, data.conditions)
 
-        return {
-            "esi_score": score,
-            "explanation": "; ".join(explanation)
-        }
+    async def score_batch(self, items: List[LLMRequest]) -> List[Union[dict, Exception]]:
+        """
+        Apply the same rules as score() to a whole batch at once: vitals are
+        parsed into NumPy columns and every rule evaluated as one mask.
+        Rows with non-integer vitals get a ValueError instead of a result.
+        """
+        return self.engine.rules.evaluate_batch(items)
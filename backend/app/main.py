@@ -1,14 +1,44 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from app.api.routes import llm
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.docs import get_swagger_ui_html, get_redoc_html
-from app.api.routes import auth, patient
+from app.api.routes import auth, debug, metrics, patient
 from app.config.settings import settings
 from app.api.middleware.error_handler import error_handler_middleware
-from app.utils.logging_config import setup_logging
+from app.api.middleware.metrics import metrics_middleware
+from app.api.middleware.tracing import tracing_middleware
+from app.api.responses import FastJSONResponse
+from app.utils.logging_config import setup_logging, shutdown_logging
+from app.services.http_client import fhir_clients
+from app.services.fhir_cache import fhir_cache
+from app.services.singleflight import fhir_flights
+from app.logic.llm_client import llm_client
+from app.logic.rule_engine import rule_engine
+from app.auth.session_store import session_store
+from app.services.prefetch import prefetcher
+from app.services.delta_sync import delta_store
+from app.services.fhir_replica import fhir_replica
 import os
 
-setup_logging(debug=settings.DEBUG)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_logging(
+        debug=settings.DEBUG,
+        log_format=settings.LOG_FORMAT,
+        queue_size=settings.LOG_QUEUE_SIZE,
+        sampling=settings.LOG_SAMPLING
+    )
+    await fhir_clients.startup(settings.FHIR_SERVER_URL)
+    auth.smart_auth.start_refresher()
+    yield
+    await auth.smart_auth.stop_refresher()
+    prefetcher.close()
+    await fhir_clients.shutdown()
+    await llm_client.aclose()
+    await session_store.close()
+    await fhir_replica.close()
+    shutdown_logging()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -16,7 +46,9 @@ app = FastAPI(
     version="1.0.0",
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     docs_url=None,
-    redoc_url=None
+    redoc_url=None,
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 app.add_middleware(
@@ -31,8 +63,12 @@ app.add_middleware(
 )
 
 app.middleware("http")(error_handler_middleware)
+app.middleware("http")(metrics_middleware)
+app.middleware("http")(tracing_middleware)
 
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
+app.include_router(metrics.router, tags=["metrics"])
+app.include_router(debug.router, prefix="/debug", tags=["debug"], include_in_schema=False)
 app.include_router(
     patient.router, 
     prefix=f"{settings.API_V1_STR}/patient", 
@@ -69,7 +105,18 @@ def read_root():
 @app.get("/health")
 def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "version": "1.0.0"}
+    return {
+        "status": "healthy",
+        "version": "1.0.0",
+        "fhir_cache": fhir_cache.stats(),
+        "fhir_single_flight": fhir_flights.stats(),
+        "fhir_delta_sync": delta_store.stats(),
+        "fhir_replica": fhir_replica.stats(),
+        "llm_client": llm_client.stats(),
+        "triage_rules": rule_engine.stats(),
+        "sessions": {**session_store.stats(), **auth.smart_auth.stats()},
+        "prefetch": prefetcher.stats()
+    }
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,5 +1,6 @@
-from pydantic import BaseModel
-from typing import List, Dict
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Dict, Optional
+from app.config.settings import settings
 
 class LLMRequest(BaseModel):
     age: int
@@ -11,3 +12,33 @@ class LLMRequest(BaseModel):
 class LLMResponse(BaseModel):
     esi_score: int
     explanation: str
+    # Scoring cache status: "memory", "disk" or "miss"; None if not cached
+    cache: Optional[str] = None
+    # Strategy that produced the score ("rule" or "llm"); the cascade
+    # strategy reports which of its paths was taken
+    strategy: Optional[str] = None
+    confidence: Optional[float] = None
+
+class LLMBatchRequest(BaseModel):
+    items: List[LLMRequest] = Field(..., max_length=settings.RULE_BATCH_MAX_ITEMS)
+    strategy: str = Field("rule", description="Scoring strategy: rule, llm or cascade")
+
+    @model_validator(mode="after")
+    def check_llm_batch_size(self):
+        # Rule batches only get the schema bound above
+        if self.strategy.lower() != "rule" and len(self.items) > settings.LLM_BATCH_MAX_ITEMS:
+            raise ValueError(
+                f"{self.strategy} batches are limited to {settings.LLM_BATCH_MAX_ITEMS} items "
+                f"(got {len(self.items)})"
+            )
+        return self
+
+class LLMBatchItem(BaseModel):
+    index: int
+    result: Optional[LLMResponse] = None
+    error: Optional[str] = None
+
+class LLMBatchResponse(BaseModel):
+    results: List[LLMBatchItem]
+    succeeded: int
+    failed: int
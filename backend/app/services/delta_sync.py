@@ -0,0 +1,192 @@
+import datetime
+import logging
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from urllib.parse import urlparse
+from app.config.settings import settings
+from app.services.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+SnapshotKey = Tuple[str, str]
+
+def _instant(value: Optional[str]) -> Optional[datetime.datetime]:
+    """Parse a FHIR instant; naive values are taken as UTC"""
+    if not value:
+        return None
+    try:
+        moment = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return moment if moment.tzinfo else moment.replace(tzinfo=datetime.timezone.utc)
+
+
+def _entry_key(entry: dict) -> str:
+    resource = entry.get("resource", {})
+    if resource.get("id"):
+        return f"{resource.get('resourceType')}/{resource['id']}"
+    return entry.get("fullUrl", "")
+
+
+def _sort_date(entry: dict) -> str:
+    """The date `_sort=date` orders by for the resource types synced here"""
+    resource = entry.get("resource", {})
+    return (
+        resource.get("effectiveDateTime")
+        or resource.get("effectivePeriod", {}).get("start")
+        or resource.get("period", {}).get("start")
+        or resource.get("issued")
+        or resource.get("recordedDate")
+        or ""
+    )
+
+
+class DeltaSnapshot:
+    """
+    The merged entries of one search, with the high-water mark: the newest
+    meta.lastUpdated seen. None means the server does not stamp resources
+    and every sync has to be a full one.
+    """
+
+    def __init__(self, url: str, entries: List[dict]):
+        self.url = url
+        self.synced_at = time.monotonic()
+        self.entries: "OrderedDict[str, dict]" = OrderedDict()
+        self.mark: Optional[str] = None
+        self._mark_at: Optional[datetime.datetime] = None
+        self.complete = True
+        # Server order until a merge changes something
+        self._ordered: Optional[List[dict]] = list(entries)
+        for entry in entries:
+            self.entries[_entry_key(entry)] = entry
+            self.complete = self._advance(entry) and self.complete
+
+    def _advance(self, entry: dict) -> bool:
+        """Raise the mark to the entry's lastUpdated; False if it has none"""
+        stamp = entry.get("resource", {}).get("meta", {}).get("lastUpdated")
+        moment = _instant(stamp)
+        if moment is None:
+            return False
+        if self._mark_at is None or moment > self._mark_at:
+            self.mark, self._mark_at = stamp, moment
+        return True
+
+    @property
+    def incremental(self) -> bool:
+        return self.complete and self.mark is not None
+
+    def merge(self, changes: List[dict]):
+        """Apply changed entries by id: updates replace, entered-in-error removes."""
+        added = []
+        for entry in changes:
+            key = _entry_key(entry)
+            self.complete = self._advance(entry) and self.complete
+            if entry.get("resource", {}).get("status") == "entered-in-error":
+                if self.entries.pop(key, None) is not None:
+                    self._ordered = None
+            elif key not in self.entries:
+                added.append((key, entry))
+            elif self.entries[key] != entry:
+                # `ge` returns the resources stamped at the mark again; only real updates count
+                self.entries[key] = entry
+                self._ordered = None
+        # New resources are the most recent ones; keep them first
+        for key, entry in reversed(added):
+            self.entries[key] = entry
+            self.entries.move_to_end(key, last=False)
+            self._ordered = None
+
+    def ordered(self) -> List[dict]:
+        if self._ordered is None:
+            entries = list(self.entries.values())
+            if "_sort=-date" in self.url:
+                # Stable, so entries with equal dates keep the server's order
+                entries.sort(key=_sort_date, reverse=True)
+            self._ordered = entries
+        return self._ordered
+
+
+class DeltaSyncStore:
+    """
+    Per-patient search snapshots kept current with `_lastUpdated` deltas.
+
+    Snapshots are keyed by search URL (patient, resource type and filters)
+    plus the caller's auth context, like the response cache. Repeat lookups
+    fetch only what changed since the mark. A full re-fetch happens after
+    `full_resync` seconds, when the server counts fewer matches than the
+    snapshot holds (a deletion, or a resource that no longer matches the
+    filter), or when it returns no usable count. At most `max_snapshots` are kept, least recently used evicted.
+    """
+
+    def __init__(self, enabled: bool, resource_types: List[str], full_resync: float, max_snapshots: int):
+        self.enabled = enabled
+        self.resource_types = set(resource_types)
+        self.full_resync = full_resync
+        self.max_snapshots = max_snapshots
+        self._snapshots: "OrderedDict[SnapshotKey, DeltaSnapshot]" = OrderedDict()
+        # Concurrent syncs of one search share a single round of requests
+        self.flights = SingleFlight()
+        self.full_syncs = 0
+        self.delta_syncs = 0
+        self.resyncs = 0
+        self.full_entries = 0
+        self.delta_entries = 0
+
+    def handles(self, url: str) -> bool:
+        if not self.enabled:
+            return False
+        resource_type = urlparse(url).path.rstrip("/").rsplit("/", 1)[-1]
+        return resource_type in self.resource_types
+
+    def get(self, key: SnapshotKey) -> Optional[DeltaSnapshot]:
+        """A snapshot that can be brought up to date with a delta, else None"""
+        snapshot = self._snapshots.get(key)
+        if snapshot is None:
+            return None
+        if not snapshot.incremental or time.monotonic() - snapshot.synced_at > self.full_resync:
+            return None
+        self._snapshots.move_to_end(key)
+        return snapshot
+
+    def has(self, key: SnapshotKey) -> bool:
+        return self.get(key) is not None
+
+    def replace(self, key: SnapshotKey, url: str, entries: List[dict]) -> DeltaSnapshot:
+        """Store the result of a full fetch"""
+        snapshot = DeltaSnapshot(url, entries)
+        self._snapshots[key] = snapshot
+        self._snapshots.move_to_end(key)
+        while len(self._snapshots) > self.max_snapshots:
+            self._snapshots.popitem(last=False)
+        self.full_syncs += 1
+        self.full_entries += len(entries)
+        return snapshot
+
+    def merge(self, snapshot: DeltaSnapshot, changes: List[dict]) -> DeltaSnapshot:
+        snapshot.merge(changes)
+        self.delta_syncs += 1
+        self.delta_entries += len(changes)
+        return snapshot
+
+    def clear(self):
+        self._snapshots.clear()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "snapshots": len(self._snapshots),
+            "full_syncs": self.full_syncs,
+            "delta_syncs": self.delta_syncs,
+            "resyncs": self.resyncs,
+            "full_entries": self.full_entries,
+            "delta_entries": self.delta_entries
+        }
+
+
+delta_store = DeltaSyncStore(
+    enabled=settings.FHIR_DELTA_SYNC,
+    resource_types=[t.strip() for t in settings.FHIR_DELTA_SYNC_TYPES.split(",") if t.strip()],
+    full_resync=settings.FHIR_DELTA_FULL_RESYNC,
+    max_snapshots=settings.FHIR_DELTA_MAX_SNAPSHOTS
+)
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+from fastapi import HTTPException
+from app.utils.tracing import span
+
+logger = logging.getLogger(__name__)
+
+SectionFetcher = Callable[[], Awaitable[Any]]
+
+@dataclass
+class SectionResult:
+    status: str
+    data: Any = None
+    detail: Optional[str] = None
+    status_code: Optional[int] = None
+    elapsed_ms: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "ok"
+
+    def summary(self) -> dict:
+        """Per-section status block returned alongside the data."""
+        summary = {"status": self.status, "elapsed_ms": round(self.elapsed_ms, 1)}
+        if self.detail:
+            summary["detail"] = self.detail
+        if self.status_code:
+            summary["status_code"] = self.status_code
+        return summary
+
+
+async def fan_out(
+    sections: Dict[str, SectionFetcher],
+    timeout: Optional[float] = None,
+    concurrency: Optional[int] = None
+) -> Dict[str, SectionResult]:
+    """
+    Run independent section fetches concurrently and collect partial results.
+
+    Each section gets its own timeout and a failure in one section never
+    cancels the others. At most `concurrency` sections run at once.
+    """
+    semaphore = asyncio.Semaphore(concurrency) if concurrency else None
+
+    async def run(name: str, fetch: SectionFetcher) -> SectionResult:
+        if semaphore:
+            await semaphore.acquire()
+        start = time.perf_counter()
+        try:
+            with span(f"section.{name}"):
+                data = await asyncio.wait_for(fetch(), timeout)
+            return SectionResult("ok", data=data, elapsed_ms=(time.perf_counter() - start) * 1000)
+        except asyncio.TimeoutError:
+            logger.warning(f"Section '{name}' timed out after {timeout}s")
+            return SectionResult(
+                "timeout",
+                detail=f"Timed out after {timeout}s",
+                elapsed_ms=(time.perf_counter() - start) * 1000
+            )
+        except HTTPException as e:
+            logger.warning(f"Section '{name}' failed: {e.detail}")
+            return SectionResult(
+                "error",
+                detail=str(e.detail),
+                status_code=e.status_code,
+                elapsed_ms=(time.perf_counter() - start) * 1000
+            )
+        except Exception as e:
+            logger.exception(f"Section '{name}' failed")
+            return SectionResult(
+                "error",
+                detail=str(e),
+                elapsed_ms=(time.perf_counter() - start) * 1000
+            )
+        finally:
+            if semaphore:
+                semaphore.release()
+
+    names = list(sections)
+    results = await asyncio.gather(*(run(name, sections[name]) for name in names))
+    return dict(zip(names, results))
@@ -0,0 +1,137 @@
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+CacheKey = Tuple[str, ...]
+
+@dataclass
+class CacheEntry:
+    data: Any
+    nbytes: int
+    expires_at: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    @property
+    def fresh(self) -> bool:
+        return time.monotonic() < self.expires_at
+
+    @property
+    def revalidatable(self) -> bool:
+        return bool(self.etag or self.last_modified)
+
+
+def parse_ttls(spec: str) -> Dict[str, float]:
+    """Parse "Patient=600,Observation=60" into a per-resource-type TTL map."""
+    ttls = {}
+    for item in spec.split(","):
+        if "=" in item:
+            resource_type, ttl = item.split("=", 1)
+            ttls[resource_type.strip()] = float(ttl)
+    return ttls
+
+
+class FHIRResponseCache:
+    """
+    In-process LRU cache for FHIR GET responses.
+
+    Entries are keyed by URL plus the caller's auth context (token scope and
+    patient), expire after a per-resource-type TTL and are evicted least
+    recently used first once the cached bodies exceed `max_bytes`. Expired
+    entries that carry an ETag or Last-Modified are kept so the next request
+    can be revalidated with a conditional GET.
+    """
+
+    def __init__(self, max_bytes: int, default_ttl: float, ttls: Optional[Dict[str, float]] = None):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.ttls = ttls or {}
+        self._entries: "OrderedDict[CacheKey, CacheEntry]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def ttl_for(self, url: str) -> float:
+        path = urlparse(url).path.rstrip("/")
+        for segment in reversed(path.split("/")):
+            if segment in self.ttls:
+                return self.ttls[segment]
+        return self.default_ttl
+
+    def get(self, key: CacheKey) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if not entry.fresh and not entry.revalidatable:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: CacheKey, url: str, data: Any, nbytes: int,
+            etag: Optional[str] = None, last_modified: Optional[str] = None):
+        ttl = self.ttl_for(url)
+        if nbytes > self.max_bytes or (ttl <= 0 and not (etag or last_modified)):
+            return
+
+        self._remove(key)
+        self._entries[key] = CacheEntry(
+            data=data,
+            nbytes=nbytes,
+            expires_at=time.monotonic() + ttl,
+            etag=etag,
+            last_modified=last_modified
+        )
+        self.total_bytes += nbytes
+
+        while self.total_bytes > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def refresh(self, key: CacheKey, url: str):
+        """Extend an entry's lifetime after the server answered 304 Not Modified."""
+        entry = self._entries.get(key)
+        if entry:
+            entry.expires_at = time.monotonic() + self.ttl_for(url)
+            self._entries.move_to_end(key)
+
+    def clear(self):
+        self._entries.clear()
+        self.total_bytes = 0
+
+    def _remove(self, key: CacheKey):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self.total_bytes -= entry.nbytes
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.revalidated
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "evictions": self.evictions,
+            "hit_ratio": round((self.hits + self.revalidated) / lookups, 3) if lookups else 0.0
+        }
+
+
+fhir_cache = FHIRResponseCache(
+    max_bytes=settings.FHIR_CACHE_MAX_BYTES,
+    default_ttl=settings.FHIR_CACHE_TTL,
+    ttls=parse_ttls(settings.FHIR_CACHE_TTLS)
+)
@@ -0,0 +1,350 @@
+"""
+Local FHIR replica: a read-through tier in front of the EHR.
+
+Search results for the configured resource types are stored as JSON in a
+SQLite file, indexed by patient, resource type, date and the token search
+parameters the service uses (category, code, clinical-status). Everything
+is partitioned by auth context (token scope and launch patient), so one
+context never reads what another fetched. A search is answered locally
+when a complete copy of its scope is on file: the coverage table records
+which (patient, resource type, category/clinical-status) searches were
+last fetched in full and when. Anything else (unknown parameters, missing or stale coverage) returns
+None and goes to the network, and the result is written back.
+
+Date filters follow FHIR prefix semantics at the precision given, so
+le2024-01-31 includes the whole of that day.
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlparse
+import orjson
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Search parameters the replica can evaluate; any other makes it defer to the server
+SEARCH_PARAMS = {"patient", "category", "code", "date", "clinical-status", "_count", "_sort"}
+TOKEN_PARAMS = ("category", "code", "clinical-status")
+# Token parameters that pick which complete copy answers a search; code and
+# date only narrow the results within it
+SCOPE_PARAMS = ("category", "clinical-status")
+DATE_PREFIXES = {"ge": ">=", "le": "<=", "gt": ">", "lt": "<", "eq": "="}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS resources (
+    context TEXT NOT NULL,
+    resource_type TEXT NOT NULL,
+    id TEXT NOT NULL,
+    patient TEXT NOT NULL,
+    date TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    body BLOB NOT NULL,
+    PRIMARY KEY (context, resource_type, id)
+);
+CREATE INDEX IF NOT EXISTS resources_patient_date ON resources (context, patient, resource_type, date);
+CREATE TABLE IF NOT EXISTS tokens (
+    context TEXT NOT NULL,
+    resource_type TEXT NOT NULL,
+    id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (context, resource_type, id, name, value)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS tokens_value ON tokens (context, name, value, resource_type);
+CREATE TABLE IF NOT EXISTS coverage (
+    context TEXT NOT NULL,
+    patient TEXT NOT NULL,
+    resource_type TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    synced_at REAL NOT NULL,
+    PRIMARY KEY (context, patient, resource_type, scope)
+);
+"""
+
+
+@dataclass
+class ReplicaQuery:
+    resource_type: str
+    patient: str
+    tokens: Dict[str, List[str]] = field(default_factory=dict)
+    dates: List[Tuple[str, str]] = field(default_factory=list)
+    sort_by_date: bool = False
+    # The server's results were cut short by FHIR_MAX_ENTRIES/FHIR_MAX_BYTES
+    truncated: bool = False
+
+    @property
+    def scope(self) -> str:
+        """The category/clinical-status part, which a stored copy must match"""
+        return "&".join(f"{name}={','.join(self.tokens[name])}" for name in SCOPE_PARAMS if name in self.tokens)
+
+    @property
+    def complete(self) -> bool:
+        """True when the results are everything in its scope (no code or date narrowing)"""
+        return not self.truncated and "code" not in self.tokens and not self.dates
+
+
+def parse_search(url: str, resource_types: Set[str]) -> Optional[ReplicaQuery]:
+    """The replica query for a search URL, or None if it cannot be answered locally."""
+    parsed = urlparse(url)
+    resource_type = parsed.path.rstrip("/").rsplit("/", 1)[-1]
+    if resource_type not in resource_types:
+        return None
+    params = parse_qs(parsed.query, keep_blank_values=True)
+    if set(params) - SEARCH_PARAMS or len(params.get("patient", [])) != 1:
+        return None
+    if params.get("_sort", ["-date"]) != ["-date"]:
+        return None
+
+    query = ReplicaQuery(resource_type, params["patient"][0], sort_by_date="_sort" in params)
+    for name in TOKEN_PARAMS:
+        if name in params:
+            if len(params[name]) != 1:
+                return None
+            query.tokens[name] = params[name][0].split(",")
+    for value in params.get("date", []):
+        prefix, bound = value[:2], value[2:]
+        if prefix not in DATE_PREFIXES or not bound:
+            return None
+        query.dates.append((DATE_PREFIXES[prefix], bound))
+    return query
+
+
+def resource_date(resource: dict) -> str:
+    """The date `_sort=date` orders by for the resource types replicated here"""
+    return (
+        resource.get("effectiveDateTime")
+        or resource.get("effectivePeriod", {}).get("start")
+        or resource.get("period", {}).get("start")
+        or resource.get("issued")
+        or resource.get("onsetDateTime")
+        or resource.get("recordedDate")
+        or ""
+    )
+
+
+def _codings(concepts: Iterable[dict]) -> Iterable[str]:
+    for concept in concepts:
+        for coding in concept.get("coding", []):
+            if coding.get("code"):
+                yield coding["code"]
+                if coding.get("system"):
+                    yield f"{coding['system']}|{coding['code']}"
+
+
+def resource_tokens(resource: dict) -> Set[Tuple[str, str]]:
+    tokens = {("category", value) for value in _codings(resource.get("category", []))}
+    tokens |= {("code", value) for value in _codings([resource.get("code", {})])}
+    tokens |= {("clinical-status", value) for value in _codings([resource.get("clinicalStatus", {})])}
+    return tokens
+
+
+class FHIRReplica:
+    """
+    SQLite replica of FHIR search results. Queries run in a thread under a
+    lock on one WAL-mode connection, so several worker processes can share
+    the file. The decoded results of the most recent queries are kept in
+    memory, checked against the coverage row on every read. Errors are
+    logged and treated as a miss; the replica never fails a request.
+    """
+    HOT_QUERIES = 256
+
+    def __init__(self, path: str, resource_types: List[str], max_age: float):
+        self.path = path
+        self.resource_types = set(resource_types)
+        self.max_age = max_age
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._hot: "OrderedDict[Tuple[str, str], Tuple[float, List[dict]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def handles(self, url: str) -> bool:
+        return self.enabled and parse_search(url, self.resource_types) is not None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=5, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(SCHEMA)
+        return self._db
+
+    def _run(self, fn):
+        try:
+            with self._db_lock:
+                return fn(self._connect())
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"FHIR replica error, using the server instead: {e}")
+            return None
+
+    def _where(self, query: ReplicaQuery, context: str) -> Tuple[str, list]:
+        clauses = ["r.context = ?", "r.patient = ?", "r.resource_type = ?"]
+        args: list = [context, query.patient, query.resource_type]
+        for name, values in query.tokens.items():
+            clauses.append(
+                "r.id IN (SELECT t.id FROM tokens t WHERE t.context = ? AND t.name = ? "
+                f"AND t.value IN ({','.join('?' * len(values))}) AND t.resource_type = ?)"
+            )
+            args += [context, name, *values, query.resource_type]
+        for op, bound in query.dates:
+            # Compare at the precision of the bound, as FHIR date prefixes do
+            clauses.append(f"r.date != '' AND substr(r.date, 1, ?) {op} ?")
+            args += [len(bound), bound]
+        return " AND ".join(clauses), args
+
+    def _covered(self, db: sqlite3.Connection, context: str, query: ReplicaQuery) -> Optional[float]:
+        """When the copy answering `query` was synced, or None if there is no fresh one"""
+        row = db.execute(
+            "SELECT MAX(synced_at) FROM coverage WHERE context = ? AND patient = ? AND resource_type = ? "
+            "AND scope IN ('', ?)",
+            (context, query.patient, query.resource_type, query.scope)
+        ).fetchone()
+        if row and row[0] and time.time() - row[0] <= self.max_age:
+            return row[0]
+        return None
+
+    def _search(self, url: str, query: ReplicaQuery, context: str) -> Optional[List[dict]]:
+        def run(db):
+            synced_at = self._covered(db, context, query)
+            if synced_at is None:
+                return None
+            # Decoding the bodies dominates for long histories; reuse the last
+            # decode while the copy it came from is unchanged
+            hot = self._hot.get((context, url))
+            if hot and hot[0] == synced_at:
+                self._hot.move_to_end((context, url))
+                return hot[1]
+
+            where, args = self._where(query, context)
+            order = "r.date DESC, r.seq" if query.sort_by_date else "r.seq"
+            rows = db.execute(f"SELECT r.body FROM resources r WHERE {where} ORDER BY {order}", args).fetchall()
+            entries = [orjson.loads(row[0]) for row in rows]
+            self._hot[(context, url)] = (synced_at, entries)
+            while len(self._hot) > self.HOT_QUERIES:
+                self._hot.popitem(last=False)
+            return entries
+        return self._run(run)
+
+    def _store(self, query: ReplicaQuery, context: str, entries: List[dict]):
+        resources = [
+            entry for entry in entries
+            if entry.get("resource", {}).get("resourceType") == query.resource_type and entry["resource"].get("id")
+        ]
+        ids = [entry["resource"]["id"] for entry in resources]
+        rows = [
+            (context, query.resource_type, entry["resource"]["id"], query.patient,
+             resource_date(entry["resource"]), seq, orjson.dumps(entry))
+            for seq, entry in enumerate(resources)
+        ]
+        tokens = [
+            (context, query.resource_type, entry["resource"]["id"], name, value)
+            for entry in resources for name, value in resource_tokens(entry["resource"])
+        ]
+        key = "context = ? AND resource_type = ? AND id = ?"
+
+        def run(db):
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.executemany(f"DELETE FROM tokens WHERE {key}", [(context, query.resource_type, i) for i in ids])
+                db.executemany(
+                    "INSERT OR REPLACE INTO resources (context, resource_type, id, patient, date, seq, body) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+                )
+                db.executemany("INSERT OR IGNORE INTO tokens (context, resource_type, id, name, value) "
+                               "VALUES (?, ?, ?, ?, ?)", tokens)
+
+                if query.complete:
+                    # Everything in scope was returned, so anything else on file in scope is gone upstream
+                    where, args = self._where(query, context)
+                    stale = {row[0] for row in db.execute(f"SELECT r.id FROM resources r WHERE {where}", args)} - set(ids)
+                    if stale:
+                        removed = [(context, query.resource_type, i) for i in stale]
+                        db.executemany(f"DELETE FROM resources WHERE {key}", removed)
+                        db.executemany(f"DELETE FROM tokens WHERE {key}", removed)
+                        # A resource that merely left this scope (e.g. a resolved
+                        # condition) was removed too; other copies must be re-fetched
+                        db.execute(
+                            "DELETE FROM coverage WHERE context = ? AND patient = ? AND resource_type = ? AND scope != ?",
+                            (context, query.patient, query.resource_type, query.scope)
+                        )
+                    db.execute(
+                        "INSERT OR REPLACE INTO coverage (context, patient, resource_type, scope, synced_at) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (context, query.patient, query.resource_type, query.scope, time.time())
+                    )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            return len(rows)
+        return self._run(run)
+
+    async def search(self, url: str, context: str) -> Optional[List[dict]]:
+        """Entries of a search from the replica, or None when it has no fresh complete copy."""
+        query = parse_search(url, self.resource_types)
+        entries = await asyncio.to_thread(self._search, url, query, context) if query else None
+        if entries is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entries
+
+    async def covers(self, url: str, context: str) -> bool:
+        query = parse_search(url, self.resource_types)
+        if query is None:
+            return False
+        return await asyncio.to_thread(self._run, lambda db: self._covered(db, context, query)) is not None
+
+    async def store(self, url: str, context: str, entries: List[dict], complete: bool = True):
+        """
+        Write back the entries of a search fetched from the server. With
+        `complete` false (the fetch hit FHIR_MAX_ENTRIES/FHIR_MAX_BYTES) the
+        resources are kept but the search is not marked as covered.
+        """
+        query = parse_search(url, self.resource_types)
+        if query is None:
+            return
+        query.truncated = not complete
+        stored = await asyncio.to_thread(self._store, query, context, entries)
+        self.stored += stored or 0
+
+    async def close(self):
+        with self._db_lock:
+            self._hot.clear()
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "path": self.path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stored": self.stored,
+            "errors": self.errors
+        }
+
+
+fhir_replica = FHIRReplica(
+    path=settings.FHIR_REPLICA_PATH,
+    resource_types=[t.strip() for t in settings.FHIR_REPLICA_TYPES.split(",") if t.strip()],
+    max_age=settings.FHIR_REPLICA_MAX_AGE
+)
@@ -1,15 +1,63 @@
+import asyncio
 import httpx
 from fastapi import HTTPException
 import logging
-from typing import Optional, List, Dict, Any
+from contextlib import aclosing
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Any, AsyncIterator, Awaitable, Callable
+from urllib.parse import quote, urljoin, urlparse
 import datetime
+import time
+import orjson
+from app.config.settings import settings
+from app.services.http_client import fhir_clients
+from app.services.fhir_cache import fhir_cache
+from app.services.delta_sync import delta_store
+from app.services.fhir_replica import fhir_replica
+from app.services.singleflight import fhir_flights
+from app.services.patient_identity import patient_identity_cache
+from app.utils.metrics import fhir_request_duration, fhir_response_bytes
+from app.utils.tracing import current_trace, record_span, span
 
 logger = logging.getLogger(__name__)
 
+# Composite-endpoint sections that can be fetched in one batch Bundle
+BATCH_SECTIONS = (
+    "demographics", "vitals", "labs", "conditions", "medications",
+    "allergies", "clinical_notes", "encounters"
+)
+
+# CapabilityStatement batch support, cached per FHIR base URL
+_batch_support: Dict[str, bool] = {}
+# When /metadata last failed per base URL; it is read again after BATCH_PROBE_RETRY seconds
+_batch_probe_failed: Dict[str, float] = {}
+BATCH_PROBE_RETRY = 60.0
+
+async def _aiter(entries: List[dict]) -> AsyncIterator[dict]:
+    for entry in entries:
+        yield entry
+
+@dataclass
+class FHIRResponse:
+    data: Any
+    nbytes: int = 0
+
 class FHIRService:
-    def __init__(self, base_url, access_token=None):
+    def __init__(self, base_url, access_token=None, client: Optional[httpx.AsyncClient] = None,
+                 cache_context: Optional[str] = None,
+                 renew_token: Optional[Callable[[str], Awaitable[Optional[str]]]] = None,
+                 on_patient_resolved: Optional[Callable[[str], Any]] = None):
         self.base_url = base_url
         self.access_token = access_token
+        self.client = client
+        # Called with a token the server rejected (401); returns a fresh one or None
+        self.renew_token = renew_token
+        # Called with a patient id once find_patient_id/get_patient resolves it
+        self.on_patient_resolved = on_patient_resolved
+        # Cached responses are only shared between callers with the same
+        # context (token scope/patient); default to the token itself.
+        self.cache_context = cache_context if cache_context is not None else (access_token or "")
+        self._prefetched: Dict[str, FHIRResponse] = {}
         
     def _get_headers(self):
         headers = {
@@ -21,62 +69,457 @@ class FHIRService:
         return headers
     
     async def _make_request(self, method, url, **kwargs):
-        headers = kwargs.pop('headers', self._get_headers())
+        response = await self._request(method, url, **kwargs)
+        return response.data
+
+    async def _request(self, method, url, cached=True, **kwargs) -> FHIRResponse:
+        if method == "GET" and url in self._prefetched:
+            return self._prefetched.pop(url)
+        if method == "GET" and not cached:
+            return await self._get(url, cached=False)
+        if method == "GET" and not kwargs:
+            # Concurrent identical GETs share one upstream call
+            return await fhir_flights.do((url, self.access_token), lambda: self._get(url))
+
+        response = await self._send(method, url, **kwargs)
+        return FHIRResponse(data=orjson.loads(response.content), nbytes=len(response.content))
+
+    async def _get(self, url, cached=True) -> FHIRResponse:
+        if cached and fhir_cache.enabled:
+            return await self._cached_get(url)
+        response = await self._send("GET", url)
+        return FHIRResponse(data=orjson.loads(response.content), nbytes=len(response.content))
+
+    async def _get_raw(self, url) -> bytes:
+        """Upstream response body, unparsed, for endpoints that pass Bundles through as-is"""
+        async def fetch():
+            if fhir_cache.enabled:
+                return (await self._cached_get(url, raw=True)).data
+            return (await self._send("GET", url)).content
+        return await fhir_flights.do(("raw", url, self.access_token), fetch)
+
+    async def _cached_get(self, url, raw=False) -> FHIRResponse:
+        # Raw bodies are cached under their own key so they are never parsed
+        key = (url, self.cache_context, "raw") if raw else (url, self.cache_context)
+        entry = fhir_cache.get(key)
+        # Conditional headers only; _send adds the (possibly refreshed) Authorization
+        headers = {}
+        if entry:
+            if entry.fresh:
+                fhir_cache.hits += 1
+                return FHIRResponse(data=entry.data, nbytes=entry.nbytes)
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        response = await self._send("GET", url, headers=headers)
+        if response.status_code == 304 and entry:
+            fhir_cache.revalidated += 1
+            fhir_cache.refresh(key, url)
+            return FHIRResponse(data=entry.data, nbytes=entry.nbytes)
+
+        fhir_cache.misses += 1
+        data = response.content if raw else orjson.loads(response.content)
+        fhir_cache.put(
+            key, url, data, len(response.content),
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified")
+        )
+        return FHIRResponse(data=data, nbytes=len(response.content))
+
+    async def _send(self, method, url, **kwargs) -> httpx.Response:
+        extra_headers = kwargs.pop('headers', None)
+        headers = {**self._get_headers(), **(extra_headers or {})}
+        client = self.client or fhir_clients.get_client(self.base_url)
+        resource_type = self._resource_type(url)
+        status = "error"
+        start = time.perf_counter()
         
-        async with httpx.AsyncClient() as client:
-            try:
-                logger.info(f"Making {method} request to {url}")
-                response = await client.request(method, url, headers=headers, **kwargs)
+        try:
+            logger.info(f"Making {method} request to {url}")
+            sent_token = self.access_token
+            response = await client.request(method, url, headers=headers, **kwargs)
+            if response.status_code == 401 and self.renew_token and sent_token:
+                # One transparent retry with a refreshed token; concurrent
+                # sections may already have renewed it on this instance
+                new_token = self.access_token
+                if new_token == sent_token:
+                    new_token = await self.renew_token(sent_token)
+                if new_token and new_token != sent_token:
+                    logger.info(f"Retrying {method} {url} with a refreshed access token")
+                    self.access_token = new_token
+                    headers = {**self._get_headers(), **(extra_headers or {})}
+                    response = await client.request(method, url, headers=headers, **kwargs)
+            status = str(response.status_code)
+            fhir_response_bytes.inc(len(response.content), resource_type=resource_type)
+            if response.status_code != 304:
                 response.raise_for_status()
-                return response.json()
-            except httpx.HTTPStatusError as e:
-                status_code = e.response.status_code
-                error_detail = f"FHIR request failed: HTTP {status_code}"
-                try:
-                    error_body = e.response.json()
-                    if "issue" in error_body:
-                        error_detail += f" - {error_body['issue'][0].get('details', {}).get('text', '')}"
-                except:
-                    error_detail += f" - {e.response.text}"
-                
-                logger.error(error_detail)
-                raise HTTPException(
-                    status_code=status_code,
-                    detail=error_detail
-                )
-            except httpx.RequestError as e:
-                logger.error(f"FHIR request error: {str(e)}")
-                raise HTTPException(
-                    status_code=503, 
-                    detail=f"FHIR server connection error: {str(e)}"
-                )
+            return response
+        except httpx.HTTPStatusError as e:
+            status_code = e.response.status_code
+            error_detail = f"FHIR request failed: HTTP {status_code}"
+            try:
+                error_body = orjson.loads(e.response.content)
+                if "issue" in error_body:
+                    error_detail += f" - {error_body['issue'][0].get('details', {}).get('text', '')}"
+            except:
+                error_detail += f" - {e.response.text}"
+            
+            logger.error(error_detail)
+            raise HTTPException(
+                status_code=status_code,
+                detail=error_detail
+            )
+        except httpx.RequestError as e:
+            logger.error(f"FHIR request error: {str(e)}")
+            raise HTTPException(
+                status_code=503, 
+                detail=f"FHIR server connection error: {str(e)}"
+            )
+        finally:
+            elapsed = time.perf_counter() - start
+            fhir_request_duration.observe(elapsed, method=method, resource_type=resource_type, status=status)
+            record_span(f"fhir.{resource_type}", start, elapsed, method=method, status=status)
+
+    def _resource_type(self, url) -> str:
+        """Metric label for a request: the resource type, "metadata", or "batch" for the base URL"""
+        path = url[len(self.base_url):] if url.startswith(self.base_url) else urlparse(url).path
+        return path.lstrip("/").split("?", 1)[0].split("/", 1)[0] or "batch"
+
+    def _next_link(self, bundle: dict) -> Optional[str]:
+        for link in bundle.get("link", []):
+            if link.get("relation") == "next" and link.get("url"):
+                return urljoin(f"{self.base_url}/", link["url"])
+        return None
+
+    async def _iter_entries(
+        self,
+        url: Optional[str] = None,
+        first_page: Optional[dict] = None,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        cached: bool = True
+    ) -> AsyncIterator[dict]:
+        """
+        Stream Bundle entries across pages by following `link[relation=next]`.
+
+        A background task fetches up to FHIR_PAGE_PREFETCH pages ahead of the
+        consumer, so at most that many pages (plus the current one) are held
+        in memory. `max_entries` and `max_bytes` cap the total entries yielded
+        and the total response bytes fetched; 0 or None means unlimited.
+        With `cached` False every page bypasses the response cache.
+        """
+        if max_entries is None:
+            max_entries = settings.FHIR_MAX_ENTRIES
+        if max_bytes is None:
+            max_bytes = settings.FHIR_MAX_BYTES
+
+        pages: asyncio.Queue = asyncio.Queue(maxsize=max(settings.FHIR_PAGE_PREFETCH, 1))
+        done = object()
+
+        async def produce():
+            next_url = url
+            fetched_bytes = 0
+            fetched_entries = 0
+            try:
+                if first_page is not None:
+                    fetched_entries += len(first_page.get("entry", []))
+                    await pages.put(first_page)
+                    next_url = self._next_link(first_page)
+                while next_url:
+                    if max_entries and fetched_entries >= max_entries:
+                        break
+                    if max_bytes and fetched_bytes >= max_bytes:
+                        logger.warning(f"Stopped paging at {fetched_bytes} bytes (FHIR_MAX_BYTES={max_bytes}): {next_url}")
+                        break
+                    page = await self._request("GET", next_url, cached=cached)
+                    fetched_bytes += page.nbytes
+                    fetched_entries += len(page.data.get("entry", []))
+                    await pages.put(page.data)
+                    next_url = self._next_link(page.data)
+                await pages.put(done)
+            except Exception as e:
+                await pages.put(e)
+
+        producer = asyncio.create_task(produce())
+        yielded = 0
+        # Consumer time spent between yields, i.e. processing the entries;
+        # only measured inside a traced request since it costs two clock reads per entry
+        traced = current_trace() is not None
+        busy = 0.0
+        first_yield = None
+        try:
+            while True:
+                page = await pages.get()
+                if page is done:
+                    return
+                if isinstance(page, Exception):
+                    raise page
+                for entry in page.get("entry", []):
+                    if max_entries and yielded >= max_entries:
+                        logger.warning(f"Stopped paging at FHIR_MAX_ENTRIES={max_entries}")
+                        return
+                    yielded += 1
+                    if not traced:
+                        yield entry
+                        continue
+                    resumed = time.perf_counter()
+                    if first_yield is None:
+                        first_yield = resumed
+                    yield entry
+                    busy += time.perf_counter() - resumed
+        finally:
+            if not producer.done():
+                producer.cancel()
+            if first_yield is not None:
+                resource_type = self._resource_type(url) if url else "bundle"
+                record_span(f"process.{resource_type}", first_yield, busy, entries=yielded)
+
+    async def _collect_bundle(self, url: str, max_entries: Optional[int] = None) -> dict:
+        """Follow every page of a search and return the entries as one searchset Bundle."""
+        if max_entries is None and self._tiered(url):
+            entries = await self._search_entries(url)
+        else:
+            entries = [entry async for entry in self._iter_entries(url, max_entries=max_entries)]
+        return {
+            "resourceType": "Bundle",
+            "type": "searchset",
+            "total": len(entries),
+            "entry": entries
+        }
+
+    def _tiered(self, url: str) -> bool:
+        return fhir_replica.handles(url) or delta_store.handles(url)
+
+    async def _entries(self, url: str) -> AsyncIterator[dict]:
+        """A search's entries: through the local tiers when they cover it, else streamed"""
+        if self._tiered(url):
+            return _aiter(await self._search_entries(url))
+        return self._iter_entries(url)
+
+    async def _search_entries(self, url: str) -> List[dict]:
+        """
+        Every entry of a search, from the first tier that has it: the local
+        replica (FHIR_REPLICA_PATH), the incrementally synced snapshot
+        (FHIR_DELTA_SYNC), then the server. Whatever had to be fetched is
+        written back to the replica.
+        """
+        replicated = fhir_replica.handles(url)
+        if replicated:
+            with span(f"replica.{self._resource_type(url)}") as current:
+                entries = await fhir_replica.search(url, self.cache_context)
+                if current:
+                    current.set(hit=entries is not None)
+            if entries is not None:
+                return entries
+
+        if delta_store.handles(url):
+            entries = await self._synced_entries(url)
+        else:
+            entries = await self._collect_entries(url)
+
+        if replicated:
+            # A capped fetch may be missing entries, so it must not count as a complete copy
+            complete = not settings.FHIR_MAX_BYTES and not (
+                settings.FHIR_MAX_ENTRIES and len(entries) >= settings.FHIR_MAX_ENTRIES
+            )
+            await fhir_replica.store(url, self.cache_context, entries, complete=complete)
+        return entries
+
+    async def _synced_entries(self, url: str) -> List[dict]:
+        key = (url, self.cache_context)
+        return await delta_store.flights.do(key, lambda: self._sync(key, url))
+
+    async def _sync(self, key, url: str) -> List[dict]:
+        """
+        Bring a search's snapshot up to date. Only resources updated since
+        the high-water mark are fetched (`ge`, so one stamped in the same
+        instant as the mark is not missed; merging by id makes the overlap
+        harmless). The server's match count, requested alongside, catches
+        deletions: fewer matches than the merged snapshot holds (or no usable
+        count at all) means a full re-fetch. None of this goes through the response cache: the snapshot
+        is the cache, and a cached page would hide the changes (or keep a
+        deleted resource after the re-fetch).
+        """
+        snapshot = delta_store.get(key)
+        if snapshot is not None:
+            delta_url = f"{url}&_lastUpdated=ge{quote(snapshot.mark)}"
+            changes, total = await asyncio.gather(
+                self._collect_entries(delta_url, cached=False),
+                self._search_total(url)
+            )
+            delta_store.merge(snapshot, changes)
+            if total is not None and total >= len(snapshot.entries):
+                return snapshot.ordered()
+            if total is None:
+                logger.info(f"No match count from the server; re-fetching {url}")
+            else:
+                logger.info(f"Server counts {total} matches, snapshot has {len(snapshot.entries)}; re-fetching {url}")
+            delta_store.resyncs += 1
+
+        entries = await self._collect_entries(url, cached=False)
+        return delta_store.replace(key, url, entries).ordered()
+
+    async def _collect_entries(self, url: str, cached: bool = True) -> List[dict]:
+        return [entry async for entry in self._iter_entries(url, cached=cached)]
+
+    async def _search_total(self, url: str) -> Optional[int]:
+        """Number of matches of a search (`_summary=count`), bypassing the response cache; None if unknown"""
+        try:
+            response = await self._send("GET", f"{url}&_summary=count")
+            body = orjson.loads(response.content)
+        except (HTTPException, ValueError):
+            return None
+        total = body.get("total") if isinstance(body, dict) else None
+        return total if isinstance(total, int) else None
                 
-    async def get_resources(self, resource_type: str, params: dict) -> dict:
-        """Generic fetch for a resource type with query parameters."""
+    async def supports_batch(self) -> bool:
+        """
+        Check (once per base URL) whether the server's CapabilityStatement
+        allows batch. A failed read is not cached; until BATCH_PROBE_RETRY
+        seconds have passed batch is assumed unsupported, then it is read again.
+        """
+        if self.base_url in _batch_support:
+            return _batch_support[self.base_url]
+        failed_at = _batch_probe_failed.get(self.base_url)
+        if failed_at is not None and time.monotonic() - failed_at < BATCH_PROBE_RETRY:
+            return False
+        try:
+            capability = await self._make_request("GET", f"{self.base_url}/metadata")
+        except (HTTPException, ValueError) as e:
+            logger.warning(f"Could not read CapabilityStatement from {self.base_url} ({e}); assuming no batch support for now")
+            _batch_probe_failed[self.base_url] = time.monotonic()
+            return False
+        _batch_probe_failed.pop(self.base_url, None)
+        _batch_support[self.base_url] = any(
+            interaction.get("code") == "batch"
+            for rest in capability.get("rest", [])
+            for interaction in rest.get("interaction", [])
+        )
+        return _batch_support[self.base_url]
+
+    def _section_urls(self, patient_id, section) -> List[str]:
+        """Search URLs a composite-endpoint section issues, matching the get_* methods."""
+        return {
+            "demographics": [self._patient_url(patient_id)],
+            "vitals": [self._observations_url(patient_id, category="vital-signs")],
+            "labs": [self._observations_url(patient_id, category="laboratory")],
+            "conditions": [self._conditions_url(patient_id, clinical_status="active")],
+            "medications": [self._medications_url(patient_id)],
+            "allergies": [self._allergies_url(patient_id)],
+            "clinical_notes": list(self._clinical_notes_urls(patient_id)),
+            "encounters": [self._encounters_url(patient_id)],
+        }[section]
+
+    async def prefetch_sections(self, patient_id, sections=BATCH_SECTIONS) -> bool:
+        """
+        Fetch the first page of every section search in one FHIR batch Bundle.
+
+        Successful entries are parked so that the next GET of the same URL
+        (issued by the regular get_* methods) is answered without a round
+        trip. Returns False, leaving the get_* methods to fall back to
+        individual GETs, when batch mode is off, unsupported or the batch
+        request itself fails.
+        """
+        mode = settings.FHIR_BATCH_MODE
+        if mode == "off" or (mode == "auto" and not await self.supports_batch()):
+            return False
+
+        # Searches the replica answers, or that only need a delta, are left out
+        urls = [
+            url for section in sections for url in self._section_urls(patient_id, section)
+            if not delta_store.has((url, self.cache_context))
+            and not (fhir_replica.handles(url) and await fhir_replica.covers(url, self.cache_context))
+        ]
+        if not urls:
+            return True
+        bundle = {
+            "resourceType": "Bundle",
+            "type": "batch",
+            "entry": [
+                {"request": {"method": "GET", "url": url[len(self.base_url) + 1:]}}
+                for url in urls
+            ]
+        }
+
+        try:
+            response = await self._make_request("POST", self.base_url, content=orjson.dumps(bundle))
+        except HTTPException as e:
+            logger.warning(f"FHIR batch request failed ({e.detail}); falling back to individual requests")
+            return False
+        except ValueError as e:
+            logger.warning(f"FHIR batch reply is not JSON ({e}); falling back to individual requests")
+            return False
+        if not isinstance(response, dict) or not isinstance(response.get("entry", []), list):
+            logger.warning("FHIR batch reply is not a Bundle; falling back to individual requests")
+            return False
+
+        for url, entry in zip(urls, response.get("entry", [])):
+            if not isinstance(entry, dict) or not isinstance(entry.get("response", {}), dict):
+                logger.info(f"Malformed batch entry for {url}; it will be fetched individually")
+                continue
+            status = str(entry.get("response", {}).get("status", ""))
+            if status.startswith("2") and "resource" in entry:
+                self._prefetched[url] = FHIRResponse(data=entry["resource"])
+            else:
+                logger.info(f"Batch entry for {url} returned '{status}'; it will be fetched individually")
+        return True
+
+    def _resources_url(self, resource_type: str, params: dict) -> str:
         from urllib.parse import urlencode
         query_string = urlencode(params)
-        url = f"{self.base_url}/{resource_type}?{query_string}"
-        return await self._make_request("GET", url)
+        return f"{self.base_url}/{resource_type}?{query_string}"
+
+    async def get_resources(self, resource_type: str, params: dict) -> dict:
+        """Generic fetch for a resource type with query parameters."""
+        return await self._collect_bundle(self._resources_url(resource_type, params))
     
     async def find_patient_id(self, first_name: str, last_name: str, birthdate: str):
         """Search for a patient by first name, last name, and DOB (YYYY-MM-DD)."""
+        from urllib.parse import urlencode
+        hit, patient_id = await patient_identity_cache.get(self.base_url, self.cache_context, first_name, last_name, birthdate)
+        if hit:
+            self._resolved(patient_id)
+            return patient_id
+
         params = {
             "given": first_name,
             "family": last_name,
             "birthdate": birthdate
         }
-        results = await self.get_resources("Patient", params)
-        
-        if "entry" in results and results["entry"]:
-            # Return first match's ID
-            return results["entry"][0]["resource"]["id"]
-        else:
-            return None
+        url = f"{self.base_url}/Patient?{urlencode(params)}"
+        
+        # Use first match's ID
+        patient_id = None
+        with span("patient_search"):
+            async with aclosing(self._iter_entries(url, max_entries=1)) as entries:
+                async for entry in entries:
+                    patient_id = entry["resource"]["id"]
+                    break
+
+        await patient_identity_cache.set(self.base_url, self.cache_context, first_name, last_name, birthdate, patient_id)
+        self._resolved(patient_id)
+        return patient_id
+
+    def _resolved(self, patient_id):
+        if patient_id and self.on_patient_resolved:
+            self.on_patient_resolved(patient_id)
 
     
+    def _patient_url(self, patient_id):
+        return f"{self.base_url}/Patient/{patient_id}"
+
     async def get_patient(self, patient_id):
-        url = f"{self.base_url}/Patient/{patient_id}"
-        return await self._make_request("GET", url)
+        try:
+            patient = await self._make_request("GET", self._patient_url(patient_id))
+        except HTTPException as e:
+            if e.status_code in (404, 410):
+                # The id may have come from a stale name+DOB resolution
+                await patient_identity_cache.invalidate_patient(patient_id)
+            raise
+        self._resolved(patient_id)
+        return patient
     
     async def get_patient_demographics(self, patient_id):
         patient_data = await self.get_patient(patient_id)
@@ -93,9 +536,9 @@ class FHIRService:
         }
         
         return demographics
-    
-    async def get_observations(self, patient_id, category=None, code=None, 
-                              date_from=None, date_to=None, _count=50):
+
+    def _observations_url(self, patient_id, category=None, code=None,
+                          date_from=None, date_to=None, _count=50):
         url = f"{self.base_url}/Observation?patient={patient_id}"
         
         if category:
@@ -108,102 +551,85 @@ class FHIRService:
             url += f"&date=le{date_to}"
         
         url += f"&_count={_count}&_sort=-date"
-        
-        return await self._make_request("GET", url)
+        return url
+    
+    async def get_observations(self, patient_id, category=None, code=None, 
+                              date_from=None, date_to=None, _count=50, max_entries=None):
+        url = self._observations_url(patient_id, category, code, date_from, date_to, _count)
+        return await self._collect_bundle(url, max_entries=max_entries)
+
+    async def get_observations_raw(self, patient_id, category=None, code=None,
+                                   date_from=None, date_to=None, _count=50) -> bytes:
+        """First page of the observation search exactly as the server sent it (next link included)"""
+        url = self._observations_url(patient_id, category, code, date_from, date_to, _count)
+        return await self._get_raw(url)
     
     async def get_vital_signs(self, patient_id, date_from=None, date_to=None):
-        observations = await self.get_observations(
+        url = self._observations_url(
             patient_id, 
             category="vital-signs",
             date_from=date_from,
             date_to=date_to
         )
         
-        return self._process_observations(observations)
+        return await self._process_observations(await self._entries(url))
+    
+    async def get_vital_series(self, patient_id, date_from=None, date_to=None):
+        """Vital signs as one columnar VitalSeries per LOINC code"""
+        # NumPy is only needed here, so it stays out of worker start-up
+        from app.services.vital_series import build_series
+        vitals = await self.get_vital_signs(patient_id, date_from, date_to)
+        return build_series(vitals["observations"])
     
     async def get_lab_results(self, patient_id, date_from=None, date_to=None):
-        observations = await self.get_observations(
+        url = self._observations_url(
             patient_id, 
             category="laboratory",
             date_from=date_from,
             date_to=date_to
         )
         
-        return self._process_observations(observations)
+        return await self._process_observations(await self._entries(url))
     
-    async def get_conditions(self, patient_id, clinical_status=None):
+    def _conditions_url(self, patient_id, clinical_status=None):
         url = f"{self.base_url}/Condition?patient={patient_id}"
         
         if clinical_status:
             url += f"&clinical-status={clinical_status}"
-        
-        conditions_data = await self._make_request("GET", url)
-        
-        processed_conditions = []
-        if "entry" in conditions_data:
-            for entry in conditions_data["entry"]:
-                condition = entry.get("resource", {})
-                
-                processed_condition = {
-                    "code": self._extract_coding(condition.get("code", {})),
-                    "clinicalStatus": self._extract_coding(condition.get("clinicalStatus", {})),
-                    "verificationStatus": self._extract_coding(condition.get("verificationStatus", {})),
-                    "severity": self._extract_coding(condition.get("severity", {})),
-                    "onsetDateTime": condition.get("onsetDateTime"),
-                    "recordedDate": condition.get("recordedDate"),
-                }
-                processed_conditions.append(processed_condition)
-        
-        return {
-            "conditions": processed_conditions,
-            "total": len(processed_conditions)
-        }
+        return url
+
+    async def get_conditions(self, patient_id, clinical_status=None):
+        url = self._conditions_url(patient_id, clinical_status)
+        return await self._process_conditions(await self._entries(url))
     
+    def _medications_url(self, patient_id):
+        return f"{self.base_url}/MedicationRequest?patient={patient_id}&_include=MedicationRequest:medication"
+
     async def get_medications(self, patient_id):
-        url = f"{self.base_url}/MedicationRequest?patient={patient_id}&_include=MedicationRequest:medication"
+        url = self._medications_url(patient_id)
         
         try:
-            med_requests = await self._make_request("GET", url)
-            return self._process_medications(med_requests)
+            return await self._process_medications(self._iter_entries(url))
         except HTTPException as e:
             if e.status_code == 404:
                 url = f"{self.base_url}/MedicationStatement?patient={patient_id}&_include=MedicationStatement:medication"
                 try:
-                    med_statements = await self._make_request("GET", url)
-                    return self._process_medications(med_statements, is_request=False)
+                    return await self._process_medications(self._iter_entries(url), is_request=False)
                 except HTTPException:
                     return {"medications": [], "total": 0}
             else:
                 raise
     
+    def _allergies_url(self, patient_id):
+        return f"{self.base_url}/AllergyIntolerance?patient={patient_id}"
+
     async def get_allergies(self, patient_id):
-        url = f"{self.base_url}/AllergyIntolerance?patient={patient_id}"
+        url = self._allergies_url(patient_id)
         
-        allergies_data = await self._make_request("GET", url)
-        
-        processed_allergies = []
-        if "entry" in allergies_data:
-            for entry in allergies_data["entry"]:
-                allergy = entry.get("resource", {})
-                
-                processed_allergy = {
-                    "id": allergy.get("id"),
-                    "code": self._extract_coding(allergy.get("code", {})),
-                    "type": allergy.get("type"),
-                    "category": allergy.get("category", []),
-                    "criticality": allergy.get("criticality"),
-                    "reaction": self._extract_reactions(allergy.get("reaction", [])),
-                    "recordedDate": allergy.get("recordedDate"),
-                }
-                processed_allergies.append(processed_allergy)
-        
-        return {
-            "allergies": processed_allergies,
-            "total": len(processed_allergies)
-        }
+        return await self._process_allergies(self._iter_entries(url))
     
-    async def get_clinical_notes(self, patient_id):
-        doc_references = await self.get_resources(
+    def _clinical_notes_urls(self, patient_id):
+        doc_references_url = self._resources_url(
             resource_type="DocumentReference",
             params={
                 "patient": patient_id,
@@ -211,8 +637,7 @@ class FHIRService:
                 "_sort": "-date"
             }
         )
-        
-        diagnostic_reports = await self.get_resources(
+        diagnostic_reports_url = self._resources_url(
             resource_type="DiagnosticReport",
             params={
                 "patient": patient_id,
@@ -220,48 +645,39 @@ class FHIRService:
                 "_sort": "-date"
             }
         )
+        return doc_references_url, diagnostic_reports_url
+
+    async def get_clinical_notes(self, patient_id):
+        doc_references_url, diagnostic_reports_url = self._clinical_notes_urls(patient_id)
+        doc_references = await self._collect_bundle(doc_references_url)
+        diagnostic_reports = await self._collect_bundle(diagnostic_reports_url)
         
         return {
             "document_references": doc_references,
             "diagnostic_reports": diagnostic_reports
         }
-        
-    async def get_encounters(self, patient_id):
-        url = f"{self.base_url}/Encounter?patient={patient_id}&_sort=-date"
-        encounters_data = await self._make_request("GET", url)
-
-        today = datetime.date.today()
-        ten_years_ago = today.replace(year=today.year - 10)
 
-        processed_encounters = []
-        if "entry" in encounters_data:
-            for entry in encounters_data["entry"]:
-                enc = entry.get("resource", {})
-                period = enc.get("period", {})
-                start_str = period.get("start")
-                # Only get encounters from within the last 10 years
-                if not start_str:
-                    continue
-
-                try:
-                    start_date = datetime.datetime.fromisoformat(start_str[:10]).date()
-                    if start_date < ten_years_ago:
-                        continue
-                except ValueError:
-                    continue
-                
-                processed_encounters.append({
-                    "status": enc.get("status"),
-                    "class": enc.get("class", {}).get("code"),
-                    "type": [t.get("text") for t in enc.get("type", [])],
-                    "reasonCode": [r.get("text") for r in enc.get("reasonCode", [])],
-                    "period": enc.get("period", {}),
-                })
+    async def get_clinical_notes_raw(self, patient_id) -> bytes:
+        """
+        Same shape as get_clinical_notes, but the two upstream Bundles (first
+        page each) are spliced in as bytes and never parsed or re-encoded.
+        """
+        doc_references_url, diagnostic_reports_url = self._clinical_notes_urls(patient_id)
+        doc_references, diagnostic_reports = await asyncio.gather(
+            self._get_raw(doc_references_url),
+            self._get_raw(diagnostic_reports_url)
+        )
+        return b"".join([
+            b'{"document_references":', doc_references,
+            b',"diagnostic_reports":', diagnostic_reports, b"}"
+        ])
+        
+    def _encounters_url(self, patient_id):
+        return f"{self.base_url}/Encounter?patient={patient_id}&_sort=-date"
 
-        return {
-            "encounters": processed_encounters,
-            "total": len(processed_encounters)
-        }
+    async def get_encounters(self, patient_id):
+        url = self._encounters_url(patient_id)
+        return await self._process_encounters(await self._entries(url))
     
     def _extract_name(self, names):
         if not names:
@@ -344,127 +760,200 @@ class FHIRService:
                 
         return result
     
-    def _process_observations(self, observations_data):
+    async def _process_conditions(self, entries):
+        processed_conditions = []
+        async for entry in entries:
+            condition = entry.get("resource", {})
+            
+            processed_condition = {
+                "code": self._extract_coding(condition.get("code", {})),
+                "clinicalStatus": self._extract_coding(condition.get("clinicalStatus", {})),
+                "verificationStatus": self._extract_coding(condition.get("verificationStatus", {})),
+                "severity": self._extract_coding(condition.get("severity", {})),
+                "onsetDateTime": condition.get("onsetDateTime"),
+                "recordedDate": condition.get("recordedDate"),
+            }
+            processed_conditions.append(processed_condition)
+        
+        return {
+            "conditions": processed_conditions,
+            "total": len(processed_conditions)
+        }
+    
+    async def _process_allergies(self, entries):
+        processed_allergies = []
+        async for entry in entries:
+            allergy = entry.get("resource", {})
+            
+            processed_allergy = {
+                "id": allergy.get("id"),
+                "code": self._extract_coding(allergy.get("code", {})),
+                "type": allergy.get("type"),
+                "category": allergy.get("category", []),
+                "criticality": allergy.get("criticality"),
+                "reaction": self._extract_reactions(allergy.get("reaction", [])),
+                "recordedDate": allergy.get("recordedDate"),
+            }
+            processed_allergies.append(processed_allergy)
+        
+        return {
+            "allergies": processed_allergies,
+            "total": len(processed_allergies)
+        }
+    
+    async def _process_encounters(self, entries):
+        today = datetime.date.today()
+        ten_years_ago = today.replace(year=today.year - 10)
+
+        processed_encounters = []
+        async for entry in entries:
+            enc = entry.get("resource", {})
+            period = enc.get("period", {})
+            start_str = period.get("start")
+            # Only get encounters from within the last 10 years
+            if not start_str:
+                continue
+
+            try:
+                start_date = datetime.datetime.fromisoformat(start_str[:10]).date()
+                if start_date < ten_years_ago:
+                    continue
+            except ValueError:
+                continue
+            
+            processed_encounters.append({
+                "status": enc.get("status"),
+                "class": enc.get("class", {}).get("code"),
+                "type": [t.get("text") for t in enc.get("type", [])],
+                "reasonCode": [r.get("text") for r in enc.get("reasonCode", [])],
+                "period": enc.get("period", {}),
+            })
+
+        return {
+            "encounters": processed_encounters,
+            "total": len(processed_encounters)
+        }
+    
+    async def _process_observations(self, entries):
         processed_observations = []
+        async for entry in entries:
+            processed_observations.append(self._process_observation(entry.get("resource", {})))
         
-        if "entry" in observations_data:
-            for entry in observations_data["entry"]:
-                obs = entry.get("resource", {})
-                
-                processed_obs = {
-                    "id": obs.get("id"),
-                    "code": self._extract_coding(obs.get("code", {})),
-                    "effectiveDateTime": obs.get("effectiveDateTime"),
-                    "issued": obs.get("issued"),
-                    "status": obs.get("status"),
-                    "category": [self._extract_coding(cat) for cat in obs.get("category", [])],
+        return {
+            "observations": processed_observations,
+            "total": len(processed_observations)
+        }
+    
+    def _process_observation(self, obs):
+        processed_obs = {
+            "id": obs.get("id"),
+            "code": self._extract_coding(obs.get("code", {})),
+            "effectiveDateTime": obs.get("effectiveDateTime"),
+            "issued": obs.get("issued"),
+            "status": obs.get("status"),
+            "category": [self._extract_coding(cat) for cat in obs.get("category", [])],
+        }
+        
+        if "valueQuantity" in obs:
+            value = obs["valueQuantity"]
+            processed_obs["value"] = {
+                "value": value.get("value"),
+                "unit": value.get("unit"),
+                "system": value.get("system"),
+                "code": value.get("code")
+            }
+        elif "valueString" in obs:
+            processed_obs["value"] = {"value": obs["valueString"]}
+        elif "valueBoolean" in obs:
+            processed_obs["value"] = {"value": obs["valueBoolean"]}
+        elif "valueInteger" in obs:
+            processed_obs["value"] = {"value": obs["valueInteger"]}
+        elif "valueCodeableConcept" in obs:
+            processed_obs["value"] = {"value": self._extract_coding(obs["valueCodeableConcept"])}
+        elif "component" in obs:
+            components = []
+            for component in obs["component"]:
+                comp_data = {
+                    "code": self._extract_coding(component.get("code", {})),
                 }
                 
-                if "valueQuantity" in obs:
-                    value = obs["valueQuantity"]
-                    processed_obs["value"] = {
+                if "valueQuantity" in component:
+                    value = component["valueQuantity"]
+                    comp_data["value"] = {
                         "value": value.get("value"),
                         "unit": value.get("unit"),
                         "system": value.get("system"),
                         "code": value.get("code")
                     }
-                elif "valueString" in obs:
-                    processed_obs["value"] = {"value": obs["valueString"]}
-                elif "valueBoolean" in obs:
-                    processed_obs["value"] = {"value": obs["valueBoolean"]}
-                elif "valueInteger" in obs:
-                    processed_obs["value"] = {"value": obs["valueInteger"]}
-                elif "valueCodeableConcept" in obs:
-                    processed_obs["value"] = {"value": self._extract_coding(obs["valueCodeableConcept"])}
-                elif "component" in obs:
-                    components = []
-                    for component in obs["component"]:
-                        comp_data = {
-                            "code": self._extract_coding(component.get("code", {})),
-                        }
-                        
-                        if "valueQuantity" in component:
-                            value = component["valueQuantity"]
-                            comp_data["value"] = {
-                                "value": value.get("value"),
-                                "unit": value.get("unit"),
-                                "system": value.get("system"),
-                                "code": value.get("code")
-                            }
-                        elif "valueString" in component:
-                            comp_data["value"] = {"value": component["valueString"]}
-                        elif "valueBoolean" in component:
-                            comp_data["value"] = {"value": component["valueBoolean"]}
-                        elif "valueInteger" in component:
-                            comp_data["value"] = {"value": component["valueInteger"]}
-                        elif "valueCodeableConcept" in component:
-                            comp_data["value"] = {"value": self._extract_coding(component["valueCodeableConcept"])}
-                            
-                        components.append(comp_data)
+                elif "valueString" in component:
+                    comp_data["value"] = {"value": component["valueString"]}
+                elif "valueBoolean" in component:
+                    comp_data["value"] = {"value": component["valueBoolean"]}
+                elif "valueInteger" in component:
+                    comp_data["value"] = {"value": component["valueInteger"]}
+                elif "valueCodeableConcept" in component:
+                    comp_data["value"] = {"value": self._extract_coding(component["valueCodeableConcept"])}
                     
-                    processed_obs["components"] = components
-                
-                processed_observations.append(processed_obs)
+                components.append(comp_data)
+            
+            processed_obs["components"] = components
         
-        return {
-            "observations": processed_observations,
-            "total": len(processed_observations)
-        }
+        return processed_obs
     
-    def _process_medications(self, medications_data, is_request=True):
+    async def _process_medications(self, entries, is_request=True):
         processed_medications = []
         resource_type = "MedicationRequest" if is_request else "MedicationStatement"
         
-        if "entry" in medications_data:
-            medications = {}
-            for entry in medications_data["entry"]:
-                resource = entry.get("resource", {})
-                if resource.get("resourceType") == "Medication":
-                    med_id = resource.get("id", "")
-                    medications[med_id] = resource
+        # Included Medication resources can arrive on any page, so only the
+        # active requests are held back until the stream is exhausted.
+        medications = {}
+        active_requests = []
+        async for entry in entries:
+            resource = entry.get("resource", {})
+            if resource.get("resourceType") == "Medication":
+                med_id = resource.get("id", "")
+                medications[med_id] = resource
+            elif resource.get("resourceType") == resource_type and resource.get("status", "").lower() == "active":
+                active_requests.append(resource)
+        
+        for med_request in active_requests:
+            medication_info = {}
+            if "medicationReference" in med_request:
+                med_ref = med_request["medicationReference"].get("reference", "")
+                med_id = med_ref.replace("Medication/", "")
+                medication = medications.get(med_id, {})
+                medication_info = self._extract_medication_info(medication)
+            elif "medicationCodeableConcept" in med_request:
+                medication_info = self._extract_coding(med_request["medicationCodeableConcept"])
             
-            for entry in medications_data["entry"]:
-                resource = entry.get("resource", {})
-                if resource.get("resourceType") == resource_type and resource.get("status", "").lower() == "active":
-                    med_request = resource
-                    
-                    medication_info = {}
-                    if "medicationReference" in med_request:
-                        med_ref = med_request["medicationReference"].get("reference", "")
-                        med_id = med_ref.replace("Medication/", "")
-                        medication = medications.get(med_id, {})
-                        medication_info = self._extract_medication_info(medication)
-                    elif "medicationCodeableConcept" in med_request:
-                        medication_info = self._extract_coding(med_request["medicationCodeableConcept"])
+            dosage_info = []
+            if "dosageInstruction" in med_request:
+                for dosage in med_request["dosageInstruction"]:
+                    dosage_data = {
+                        "text": dosage.get("text", ""),
+                        "timing": self._extract_timing(dosage.get("timing", {})),
+                        "route": self._extract_coding(dosage.get("route", {})),
+                        "method": self._extract_coding(dosage.get("method", {})),
+                    }
                     
-                    dosage_info = []
-                    if "dosageInstruction" in med_request:
-                        for dosage in med_request["dosageInstruction"]:
-                            dosage_data = {
-                                "text": dosage.get("text", ""),
-                                "timing": self._extract_timing(dosage.get("timing", {})),
-                                "route": self._extract_coding(dosage.get("route", {})),
-                                "method": self._extract_coding(dosage.get("method", {})),
+                    if "doseAndRate" in dosage:
+                        dose_rate = dosage["doseAndRate"][0] if dosage["doseAndRate"] else {}
+                        if "doseQuantity" in dose_rate:
+                            dose_data = dose_rate["doseQuantity"]
+                            dosage_data["dose"] = {
+                                "value": dose_data.get("value"),
+                                "unit": dose_data.get("unit")
                             }
                             
-                            if "doseAndRate" in dosage:
-                                dose_rate = dosage["doseAndRate"][0] if dosage["doseAndRate"] else {}
-                                if "doseQuantity" in dose_rate:
-                                    dose_data = dose_rate["doseQuantity"]
-                                    dosage_data["dose"] = {
-                                        "value": dose_data.get("value"),
-                                        "unit": dose_data.get("unit")
-                                    }
-                                    
-                            dosage_info.append(dosage_data)
+                    dosage_info.append(dosage_data)
+            
+            processed_med = {
+                "status": med_request.get("status"),
+                "medication": medication_info,
+                "dosage": dosage_info,
+            }
                     
-                    processed_med = {
-                        "status": med_request.get("status"),
-                        "medication": medication_info,
-                        "dosage": dosage_info,
-                    }
-                            
-                    processed_medications.append(processed_med)
+            processed_medications.append(processed_med)
         
         return {
             "medications": processed_medications,
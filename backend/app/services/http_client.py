@@ -0,0 +1,62 @@
+import httpx
+import logging
+from importlib.util import find_spec
+from typing import Dict
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+class FHIRClientPool:
+    """Long-lived, connection-pooled HTTP clients, one per FHIR base URL.
+
+    Clients are opened in the FastAPI lifespan and closed on shutdown so that
+    every FHIR call reuses keep-alive connections instead of paying a fresh
+    TCP+TLS handshake. Auth headers are passed per request, so a client is
+    never rebuilt when the access token changes.
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    def _build_client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=settings.FHIR_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.FHIR_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=settings.FHIR_POOL_KEEPALIVE_EXPIRY
+        )
+        timeout = httpx.Timeout(
+            settings.FHIR_READ_TIMEOUT,
+            connect=settings.FHIR_CONNECT_TIMEOUT,
+            pool=settings.FHIR_POOL_TIMEOUT
+        )
+
+        http2 = settings.FHIR_HTTP2
+        if http2 and find_spec("h2") is None:
+            logger.warning("FHIR_HTTP2 is enabled but the 'h2' package is not installed; using HTTP/1.1")
+            http2 = False
+
+        return httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2)
+
+    def get_client(self, base_url: str) -> httpx.AsyncClient:
+        """Return the pooled client for a base URL, creating it on first use."""
+        client = self._clients.get(base_url)
+        if client is None or client.is_closed:
+            logger.info(f"Opening pooled FHIR client for {base_url}")
+            client = self._build_client()
+            self._clients[base_url] = client
+        return client
+
+    async def startup(self, *base_urls: str):
+        for base_url in base_urls:
+            if base_url:
+                self.get_client(base_url)
+
+    async def shutdown(self):
+        clients = list(self._clients.items())
+        self._clients.clear()
+        for base_url, client in clients:
+            logger.info(f"Closing pooled FHIR client for {base_url}")
+            await client.aclose()
+
+
+fhir_clients = FHIRClientPool()
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, Tuple
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+def normalize_identity(first_name: str, last_name: str, birthdate: str) -> str:
+    """Fold case, whitespace and diacritics so "José  Núñez" and "jose nunez" match."""
+    def fold(value: str) -> str:
+        decomposed = unicodedata.normalize("NFKD", value or "")
+        stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+        return " ".join(stripped.casefold().split())
+
+    return f"{fold(first_name)}|{fold(last_name)}|{(birthdate or '').strip()}"
+
+
+class PatientIdentityCache:
+    """
+    Bounded TTL cache of normalized name+DOB -> patient id, partitioned by
+    FHIR base URL and auth context (granted scope and launch patient), the
+    same partitioning as the response cache and the replica. This is
+    intended: sessions with the same scope and launch context share
+    resolutions, including persisted ones, just as they share cached
+    responses; sessions with different scopes never do.
+
+    "Not found" results are cached too, for a shorter TTL. When `path` is
+    set, entries are also written to a local SQLite file so resolutions
+    survive restarts; the in-memory LRU is consulted first.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, negative_ttl: float, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.path = path
+        self._entries: "OrderedDict[str, Tuple[Optional[str], float]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, base_url: str, context: str, first_name: str, last_name: str, birthdate: str) -> str:
+        return f"{base_url}|{context}|{normalize_identity(first_name, last_name, birthdate)}"
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS patient_identity ("
+                "key TEXT PRIMARY KEY, patient_id TEXT, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+        return self._db
+
+    def _db_get(self, key: str) -> Optional[Tuple[Optional[str], float]]:
+        with self._db_lock:
+            row = self._connect().execute(
+                "SELECT patient_id, expires_at FROM patient_identity WHERE key = ?", (key,)
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def _db_set(self, key: str, patient_id: Optional[str], expires_at: float):
+        with self._db_lock:
+            db = self._connect()
+            db.execute(
+                "INSERT OR REPLACE INTO patient_identity (key, patient_id, expires_at) VALUES (?, ?, ?)",
+                (key, patient_id, expires_at)
+            )
+            db.commit()
+
+    def _db_delete(self, where: str, value: str):
+        with self._db_lock:
+            db = self._connect()
+            db.execute(f"DELETE FROM patient_identity WHERE {where} = ?", (value,))
+            db.commit()
+
+    def _remember(self, key: str, patient_id: Optional[str], expires_at: float):
+        self._entries[key] = (patient_id, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, base_url: str, context: str, first_name: str, last_name: str,
+                  birthdate: str) -> Tuple[bool, Optional[str]]:
+        """Return (hit, patient_id); a hit with patient_id None is a cached "not found"."""
+        key = self._key(base_url, context, first_name, last_name, birthdate)
+        entry = self._entries.get(key)
+        if entry is None and self.path:
+            entry = await asyncio.to_thread(self._db_get, key)
+            if entry:
+                self._remember(key, *entry)
+
+        # Expiry is wall-clock time so persisted entries stay valid across restarts
+        if entry and entry[1] > time.time():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+
+        if entry:
+            self._entries.pop(key, None)
+        self.misses += 1
+        return False, None
+
+    async def set(self, base_url: str, context: str, first_name: str, last_name: str, birthdate: str,
+                  patient_id: Optional[str]):
+        key = self._key(base_url, context, first_name, last_name, birthdate)
+        expires_at = time.time() + (self.ttl if patient_id else self.negative_ttl)
+        self._remember(key, patient_id, expires_at)
+        if self.path:
+            await asyncio.to_thread(self._db_set, key, patient_id, expires_at)
+
+    async def invalidate(self, base_url: str, context: str, first_name: str, last_name: str, birthdate: str):
+        key = self._key(base_url, context, first_name, last_name, birthdate)
+        self._entries.pop(key, None)
+        if self.path:
+            await asyncio.to_thread(self._db_delete, "key", key)
+
+    async def invalidate_patient(self, patient_id: str):
+        """Drop every name+DOB mapping that resolves to `patient_id`, in every context."""
+        for key in [k for k, (pid, _) in self._entries.items() if pid == patient_id]:
+            del self._entries[key]
+        if self.path:
+            await asyncio.to_thread(self._db_delete, "patient_id", patient_id)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+patient_identity_cache = PatientIdentityCache(
+    max_entries=settings.PATIENT_ID_CACHE_SIZE,
+    ttl=settings.PATIENT_ID_CACHE_TTL,
+    negative_ttl=settings.PATIENT_ID_NEGATIVE_TTL,
+    path=settings.PATIENT_ID_CACHE_PATH or None
+)
@@ -0,0 +1,215 @@
+import asyncio
+import contextvars
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from app.config.settings import settings
+from app.utils.tracing import span
+
+logger = logging.getLogger(__name__)
+
+SnapshotKey = Tuple[str, str]
+
+# Highest priority first: what the ED screen renders before anything else
+PREFETCH_SECTIONS: Tuple[Tuple[str, Callable], ...] = (
+    ("demographics", lambda svc, pid: svc.get_patient_demographics(pid)),
+    ("vitals", lambda svc, pid: svc.get_vital_signs(pid)),
+    ("conditions", lambda svc, pid: svc.get_conditions(pid, clinical_status="active")),
+    ("allergies", lambda svc, pid: svc.get_allergies(pid)),
+    ("medications", lambda svc, pid: svc.get_medications(pid)),
+    ("labs", lambda svc, pid: svc.get_lab_results(pid)),
+    ("encounters", lambda svc, pid: svc.get_encounters(pid)),
+    ("clinical_notes", lambda svc, pid: svc.get_clinical_notes(pid)),
+    ("all_conditions", lambda svc, pid: svc.get_conditions(pid)),
+)
+
+class PatientSnapshot:
+    """
+    Section results for one patient as seen by one session. Each section is
+    a future resolved to (ok, value-or-exception) so readers can wait for a
+    section that is still loading.
+    """
+
+    def __init__(self, session_id: str, patient_id: str):
+        self.session_id = session_id
+        self.patient_id = patient_id
+        self.created_at = time.monotonic()
+        loop = asyncio.get_running_loop()
+        self.sections: Dict[str, asyncio.Future] = {name: loop.create_future() for name, _ in PREFETCH_SECTIONS}
+        # Not yet started, next first; a section someone is waiting for jumps the queue
+        self.pending: List[str] = [name for name, _ in PREFETCH_SECTIONS]
+        self.task: Optional[asyncio.Task] = None
+
+    def age(self) -> float:
+        return time.monotonic() - self.created_at
+
+    def promote(self, section: str):
+        if section in self.pending:
+            self.pending.remove(section)
+            self.pending.insert(0, section)
+
+    def cancel(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+        for future in self.sections.values():
+            if not future.done():
+                future.cancel()
+
+
+class PrefetchScheduler:
+    """
+    Warms every section of a patient in the background once the patient is
+    resolved, so follow-up section routes are answered from memory.
+
+    Snapshots are keyed by (session, patient), so data fetched with one
+    session's token is never served to another. They live for `ttl` seconds.
+    At most `max_patients` are kept (least recently used evicted). Ending a
+    session cancels its outstanding fetches.
+    """
+
+    def __init__(self, enabled: bool, ttl: float, max_patients: int, concurrency: int):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_patients = max_patients
+        self.concurrency = concurrency
+        self._snapshots: "OrderedDict[SnapshotKey, PatientSnapshot]" = OrderedDict()
+        self._by_session: Dict[str, Set[SnapshotKey]] = {}
+        self.scheduled = 0
+        self.ready_hits = 0
+        self.waited = 0
+        self.fallbacks = 0
+
+    def _drop(self, key: SnapshotKey):
+        snapshot = self._snapshots.pop(key, None)
+        if snapshot:
+            snapshot.cancel()
+            keys = self._by_session.get(snapshot.session_id)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._by_session[snapshot.session_id]
+
+    def _lookup(self, key: SnapshotKey) -> Optional[PatientSnapshot]:
+        snapshot = self._snapshots.get(key)
+        if snapshot and snapshot.age() > self.ttl:
+            self._drop(key)
+            return None
+        if snapshot:
+            self._snapshots.move_to_end(key)
+        return snapshot
+
+    def schedule(self, session_id: str, patient_id: str, service) -> Optional[PatientSnapshot]:
+        """Start warming a patient's sections unless a fresh snapshot already exists."""
+        if not self.enabled or not session_id or not patient_id:
+            return None
+        key = (session_id, patient_id)
+        snapshot = self._lookup(key)
+        if snapshot:
+            return snapshot
+
+        snapshot = PatientSnapshot(session_id, patient_id)
+        self._snapshots[key] = snapshot
+        self._by_session.setdefault(session_id, set()).add(key)
+        while len(self._snapshots) > self.max_patients:
+            self._drop(next(iter(self._snapshots)))
+
+        # A dedicated service, so the request's own state (batch-parked
+        # responses, the resolution hook) is untouched. The task runs in
+        # a fresh context so its spans don't land in the triggering trace.
+        worker = type(service)(
+            service.base_url, service.access_token, client=service.client,
+            cache_context=service.cache_context, renew_token=service.renew_token
+        )
+        snapshot.task = asyncio.create_task(self._run(snapshot, worker), context=contextvars.Context())
+        self.scheduled += 1
+        return snapshot
+
+    async def _run(self, snapshot: PatientSnapshot, service):
+        patient_id = snapshot.patient_id
+        fetchers = dict(PREFETCH_SECTIONS)
+
+        async def worker():
+            while snapshot.pending:
+                name = snapshot.pending.pop(0)
+                try:
+                    outcome = (True, await fetchers[name](service, patient_id))
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    outcome = (False, e)
+                future = snapshot.sections[name]
+                if not future.done():
+                    future.set_result(outcome)
+
+        try:
+            # One batch Bundle for everything when the server supports it;
+            # if it fails in any way the workers fetch each section themselves
+            try:
+                await service.prefetch_sections(patient_id)
+            except Exception as e:
+                logger.warning(f"Batch prefetch failed ({type(e).__name__}: {e}); fetching sections individually")
+            await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        finally:
+            for future in snapshot.sections.values():
+                if not future.done():
+                    future.cancel()
+
+    async def read(self, session_id: str, patient_id: str, section: str,
+                   fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        A section from the patient's snapshot, waiting for it if it is still
+        loading. Only an existing snapshot is read: a single-section route
+        must not start fetching all the others. Falls back to `fetch()`
+        when there is no snapshot or the section failed or was cancelled,
+        so errors come from a live call.
+        """
+        snapshot = self._lookup((session_id, patient_id)) if self.enabled else None
+        future = snapshot.sections.get(section) if snapshot else None
+        if future is None:
+            return await fetch()
+
+        ready = future.done()
+        snapshot.promote(section)
+        with span(f"snapshot.{section}", ready=ready):
+            try:
+                ok, value = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                ok, value = False, None
+        if ok:
+            if ready:
+                self.ready_hits += 1
+            else:
+                self.waited += 1
+            return value
+        self.fallbacks += 1
+        return await fetch()
+
+    def cancel_session(self, session_id: str):
+        """Cancel outstanding fetches and drop every snapshot of an ended session."""
+        for key in list(self._by_session.get(session_id, ())):
+            self._drop(key)
+
+    def close(self):
+        for key in list(self._snapshots):
+            self._drop(key)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "snapshots": len(self._snapshots),
+            "scheduled": self.scheduled,
+            "ready_hits": self.ready_hits,
+            "waited": self.waited,
+            "fallbacks": self.fallbacks
+        }
+
+
+prefetcher = PrefetchScheduler(
+    enabled=settings.PREFETCH_ENABLED,
+    ttl=settings.PREFETCH_TTL,
+    max_patients=settings.PREFETCH_MAX_PATIENTS,
+    concurrency=settings.PREFETCH_CONCURRENCY
+)
@@ -0,0 +1,198 @@
+import datetime
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+import numpy as np
+
+@dataclass
+class VitalSeries:
+    """
+    One vital sign as parallel arrays: epoch seconds (ascending) and values.
+    Blood-pressure panels are split into one series per component code.
+    """
+    code: str
+    display: str
+    unit: Optional[str]
+    timestamps: np.ndarray
+    values: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def window(self, start: float, end: float) -> "VitalSeries":
+        lo = np.searchsorted(self.timestamps, start, side="left")
+        hi = np.searchsorted(self.timestamps, end, side="right")
+        return VitalSeries(self.code, self.display, self.unit, self.timestamps[lo:hi], self.values[lo:hi])
+
+    def take(self, indices: np.ndarray) -> "VitalSeries":
+        return VitalSeries(self.code, self.display, self.unit, self.timestamps[indices], self.values[indices])
+
+
+def _epoch(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        moment = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return moment.timestamp()
+
+
+def _numeric(value: Optional[dict]) -> Optional[float]:
+    raw = (value or {}).get("value")
+    if isinstance(raw, bool) or not isinstance(raw, (int, float)):
+        return None
+    return float(raw)
+
+
+def build_series(observations: Iterable[dict]) -> Dict[str, VitalSeries]:
+    """
+    Convert processed observations (FHIRService._process_observation output)
+    into one VitalSeries per LOINC code. Non-numeric or undated values are
+    skipped.
+    """
+    columns: Dict[str, dict] = {}
+
+    def add(code: dict, value: Optional[dict], when: float):
+        number = _numeric(value)
+        if number is None or not code.get("code"):
+            return
+        column = columns.setdefault(
+            code["code"],
+            {"display": code.get("display", ""), "unit": value.get("unit"), "t": [], "v": []}
+        )
+        column["t"].append(when)
+        column["v"].append(number)
+
+    for obs in observations:
+        when = _epoch(obs.get("effectiveDateTime") or obs.get("issued"))
+        if when is None:
+            continue
+        if "value" in obs:
+            add(obs.get("code", {}), obs["value"], when)
+        for component in obs.get("components", []):
+            add(component.get("code", {}), component.get("value"), when)
+
+    series = {}
+    for code, column in columns.items():
+        timestamps = np.asarray(column["t"], dtype=np.float64)
+        values = np.asarray(column["v"], dtype=np.float64)
+        order = np.argsort(timestamps, kind="stable")
+        series[code] = VitalSeries(code, column["display"], column["unit"], timestamps[order], values[order])
+    return series
+
+
+def trend_features(series: VitalSeries, window_hours: float = 24) -> dict:
+    """
+    Features at the latest reading: the value, change since the previous
+    reading, and min/max/mean and least-squares slope (units per hour) of
+    the single trailing `window_hours` window that ends at it. Per-point
+    rolling statistics come from rolling_stats.
+    """
+    if not len(series):
+        return {"count": 0}
+
+    latest_t = series.timestamps[-1]
+    recent = series.window(latest_t - window_hours * 3600, latest_t)
+    features = {
+        "count": len(series),
+        "latest": float(series.values[-1]),
+        "latest_at": datetime.datetime.fromtimestamp(latest_t, datetime.timezone.utc).isoformat(),
+        "delta": float(series.values[-1] - series.values[-2]) if len(series) > 1 else None,
+        "window_hours": window_hours,
+        "window_count": len(recent),
+        "window_min": float(recent.values.min()),
+        "window_max": float(recent.values.max()),
+        "window_mean": float(recent.values.mean()),
+        "slope_per_hour": None,
+    }
+
+    hours = (recent.timestamps - recent.timestamps[0]) / 3600
+    if len(recent) > 1 and np.ptp(hours) > 0:
+        centered = hours - hours.mean()
+        features["slope_per_hour"] = float((centered * (recent.values - recent.values.mean())).sum() / (centered ** 2).sum())
+    return features
+
+
+def rolling_stats(series: VitalSeries, indices: np.ndarray, window_hours: float) -> Dict[str, np.ndarray]:
+    """
+    Rolling min/max/mean over the trailing `window_hours` ending at each of
+    the given points, computed from every reading in the series (not just
+    the selected ones). Each window holds at least the point itself.
+    """
+    if not len(indices):
+        empty = np.empty(0, dtype=np.float64)
+        return {"min": empty, "max": empty, "mean": empty}
+
+    timestamps, values = series.timestamps, series.values
+    hi = indices + 1
+    lo = np.searchsorted(timestamps, timestamps[indices] - window_hours * 3600, side="left")
+
+    sums = np.concatenate(([0.0], np.cumsum(values)))
+    # reduceat over the interleaved [lo, hi) bounds reduces each window in
+    # one pass; the odd segments between windows are discarded. The padding
+    # keeps hi == len(values) a valid index.
+    bounds = np.column_stack((lo, hi)).ravel()
+    padded = np.append(values, 0.0)
+    return {
+        "min": np.minimum.reduceat(padded, bounds)[::2],
+        "max": np.maximum.reduceat(padded, bounds)[::2],
+        "mean": (sums[hi] - sums[lo]) / (hi - lo),
+    }
+
+
+def lttb(timestamps: np.ndarray, values: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling; returns the indices of the
+    points to keep. Keeps the first and last points and, per bucket, the
+    point forming the largest triangle with its neighbours, which preserves
+    peaks and troughs far better than striding.
+    """
+    n = len(timestamps)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start, next_end = end, edges[bucket + 2] if bucket + 2 < len(edges) else n
+        avg_t = timestamps[next_start:next_end].mean()
+        avg_v = values[next_start:next_end].mean()
+
+        pt, pv = timestamps[previous], values[previous]
+        areas = np.abs(
+            (pt - avg_t) * (values[start:end] - pv)
+            - (pt - timestamps[start:end]) * (avg_v - pv)
+        )
+        previous = start + int(np.argmax(areas))
+        keep[bucket + 1] = previous
+    return keep
+
+
+def series_payload(series: VitalSeries, max_points: int, window_hours: float) -> dict:
+    """
+    JSON-ready view of a series: downsampled points, the rolling statistics
+    at each of them, and trend features, both computed at full resolution.
+    """
+    indices = lttb(series.timestamps, series.values, max_points)
+    shown = series.take(indices)
+    rolling = rolling_stats(series, indices, window_hours)
+    return {
+        "code": series.code,
+        "display": series.display,
+        "unit": series.unit,
+        "points": len(series),
+        "returned": len(shown),
+        # Epoch milliseconds, the form charting libraries take directly
+        "timestamps": (shown.timestamps * 1000).astype(np.int64).tolist(),
+        "values": shown.values.tolist(),
+        "rolling_min": rolling["min"].tolist(),
+        "rolling_max": rolling["max"].tolist(),
+        "rolling_mean": rolling["mean"].tolist(),
+        "features": trend_features(series, window_hours),
+    }
@@ -4,6 +4,7 @@ import json
 import os
 from dotenv import load_dotenv
 from app.services.fhir_service import FHIRService
+from app.services.http_client import fhir_clients
 
 load_dotenv()
 
@@ -39,6 +40,8 @@ async def test_fhir_service(patient_id, function_name):
         print(json.dumps(result, indent=2, ensure_ascii=False))
     except Exception as e:
         print(f"Error calling {function_name}: {str(e)}")
+    finally:
+        await fhir_clients.shutdown()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Test the FHIR service")
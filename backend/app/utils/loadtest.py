@@ -0,0 +1,286 @@
+"""
+Open-loop load generator for the triage API.
+
+By default the API runs in-process against the mock FHIR/LLM servers from
+app.utils.mock_servers, so a run needs no network access or credentials:
+
+    python -m app.utils.loadtest --rps 50 --duration 30 --llm-latency lognormal:800:0.5
+
+Use --target to drive an already running deployment instead (point it at
+the mock servers or a real sandbox yourself).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+import httpx
+
+DEFAULT_MIX = "medical-history=3,summary=2,vitals=2,labs=1,encounters=1,predict=2"
+
+FIRST_NAMES = ["Ada", "Ben", "Chloe", "Diego", "Emma", "Farid", "Grace", "Hiro", "Ines", "Jon"]
+LAST_NAMES = ["Smith", "Garcia", "Nguyen", "Okafor", "Müller", "Rossi", "Kim", "Patel", "Silva", "Cohen"]
+SYMPTOMS = ["chest pain", "shortness of breath", "headache", "fever and cough", "abdominal pain", "ankle sprain"]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _parse_mix(spec: str) -> Dict[str, int]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = int(weight or 1)
+    unknown = set(mix) - set(ENDPOINTS)
+    if unknown:
+        raise SystemExit(f"Unknown endpoints in mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def _patients(count: int) -> List[dict]:
+    rng = random.Random(42)
+    patients = []
+    for i in range(count):
+        first, last = FIRST_NAMES[i % len(FIRST_NAMES)], LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)]
+        dob = f"19{rng.randint(30, 99)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        patients.append({"first": first, "last": f"{last}{i}", "dob": dob, "id": f"lt-{i:04d}"})
+    return patients
+
+
+def _triage_request(patient: dict) -> dict:
+    return {
+        "age": random.randint(18, 90),
+        "gender": random.choice(["male", "female"]),
+        "symptoms": random.choice(SYMPTOMS),
+        # Same shape as PatientInputForm sends, so the rule engine and prompt see real vitals
+        "vitals": {
+            "heartRate": str(random.randint(50, 150)),
+            "respiratoryRate": str(random.randint(10, 30)),
+            "bloodPressureSystolic": str(random.randint(85, 180)),
+            "bloodPressureDiastolic": str(random.randint(50, 110)),
+            "oxygenSaturation": str(random.randint(85, 100)),
+            "temperature": f"{random.uniform(36.0, 39.5):.1f}",
+        },
+        "conditions": random.sample(["hypertension", "asthma", "diabetes", "copd"], k=random.randint(0, 2)),
+    }
+
+
+ENDPOINTS = {
+    "medical-history": lambda p: ("GET", f"/api/v1/patient/{p['first']}/{p['last']}/{p['dob']}/medical-history", None),
+    "summary": lambda p: ("GET", f"/api/v1/patient/{p['id']}/summary", None),
+    "vitals": lambda p: ("GET", f"/api/v1/patient/{p['id']}/vitals", None),
+    "labs": lambda p: ("GET", f"/api/v1/patient/{p['id']}/labs", None),
+    "encounters": lambda p: ("GET", f"/api/v1/patient/{p['id']}/encounters", None),
+    "clinical-notes": lambda p: ("GET", f"/api/v1/patient/{p['id']}/clinical-notes", None),
+    "predict": lambda p: ("POST", "/api/v1/llm/predict", _triage_request(p)),
+}
+
+
+class Recorder:
+    """Per-endpoint latencies and outcomes."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, Dict[str, int]] = {}
+        self.dropped = 0
+
+    def record(self, endpoint: str, elapsed: float, outcome: Optional[str]):
+        self.latencies.setdefault(endpoint, []).append(elapsed)
+        if outcome:
+            errors = self.errors.setdefault(endpoint, {})
+            errors[outcome] = errors.get(outcome, 0) + 1
+
+    @staticmethod
+    def _percentile(values: List[float], q: float) -> float:
+        index = min(len(values) - 1, max(0, round(q * len(values)) - 1))
+        return values[index]
+
+    def report(self, wall_time: float) -> dict:
+        endpoints = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            errors = self.errors.get(endpoint, {})
+            failed = sum(errors.values())
+            endpoints[endpoint] = {
+                "requests": len(values),
+                "throughput_rps": round(len(values) / wall_time, 2),
+                "error_rate": round(failed / len(values), 4),
+                "errors": errors,
+                "p50_ms": round(self._percentile(values, 0.50) * 1000, 1),
+                "p95_ms": round(self._percentile(values, 0.95) * 1000, 1),
+                "p99_ms": round(self._percentile(values, 0.99) * 1000, 1),
+                "max_ms": round(values[-1] * 1000, 1),
+            }
+        total = sum(e["requests"] for e in endpoints.values())
+        return {
+            "wall_time_s": round(wall_time, 2),
+            "requests": total,
+            "throughput_rps": round(total / wall_time, 2) if wall_time else 0,
+            "dropped": self.dropped,
+            "endpoints": endpoints,
+        }
+
+
+def print_report(report: dict):
+    print(f"\n{report['requests']} requests in {report['wall_time_s']}s "
+          f"({report['throughput_rps']} req/s, {report['dropped']} dropped at the client)")
+    header = f"{'endpoint':<16}{'reqs':>7}{'rps':>8}{'err%':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, e in report["endpoints"].items():
+        print(f"{name:<16}{e['requests']:>7}{e['throughput_rps']:>8}{e['error_rate'] * 100:>6.1f}%"
+              f"{e['p50_ms']:>9}{e['p95_ms']:>9}{e['p99_ms']:>9}{e['max_ms']:>9}")
+        if e["errors"]:
+            print(f"{'':<16}errors: {e['errors']}")
+
+
+async def login(client: httpx.AsyncClient):
+    """Walk the SMART authorization-code flow: /auth/login -> authorize -> /auth/callback."""
+    response = await client.get("/auth/login")
+    authorize_url = response.headers["location"]
+    async with httpx.AsyncClient() as upstream:
+        redirect = await upstream.get(authorize_url)
+    params = parse_qs(urlparse(redirect.headers["location"]).query)
+    callback = await client.get("/auth/callback", params={"code": params["code"][0], "state": params["state"][0]})
+    callback.raise_for_status()
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    rps: float,
+    duration: float,
+    mix: Dict[str, int],
+    patients: List[dict],
+    max_in_flight: int
+) -> dict:
+    """
+    Open-loop arrivals: requests start on a Poisson schedule regardless of
+    how long earlier ones take, so queueing in the API shows up as latency
+    instead of silently lowering the offered load.
+    """
+    recorder = Recorder()
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    in_flight = asyncio.Semaphore(max_in_flight)
+    tasks = set()
+
+    async def one_request(endpoint: str):
+        method, path, body = ENDPOINTS[endpoint](random.choice(patients))
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, json=body)
+            outcome = None if response.status_code < 400 else str(response.status_code)
+        except httpx.HTTPError as e:
+            outcome = type(e).__name__
+        recorder.record(endpoint, time.perf_counter() - start, outcome)
+        in_flight.release()
+
+    start = time.perf_counter()
+    next_at = start
+    while next_at - start < duration:
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        next_at += random.expovariate(rps)
+
+        if in_flight.locked():
+            recorder.dropped += 1
+            continue
+        await in_flight.acquire()
+        task = asyncio.create_task(one_request(random.choices(names, weights)[0]))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    if tasks:
+        await asyncio.gather(*tasks)
+    return recorder.report(time.perf_counter() - start)
+
+
+@asynccontextmanager
+async def in_process_api(args):
+    """Start the mock upstreams, configure the API against them and yield an ASGI client."""
+    from app.utils.mock_servers import LatencyModel, create_fhir_app, create_llm_app, serve_in_thread
+
+    fhir_port, llm_port = _free_port(), _free_port()
+    servers = [
+        serve_in_thread(create_fhir_app(LatencyModel(args.fhir_latency), args.fhir_error_rate), fhir_port),
+        serve_in_thread(create_llm_app(LatencyModel(args.llm_latency), args.llm_error_rate), llm_port),
+    ]
+    fhir_url = f"http://127.0.0.1:{fhir_port}"
+    os.environ.update({
+        "FHIR_SERVER_URL": fhir_url,
+        "AUTH_SERVER_URL": f"{fhir_url}/auth/authorize",
+        "TOKEN_SERVER_URL": f"{fhir_url}/auth/token",
+        "REDIRECT_URI": "http://loadtest/auth/callback",
+        "CLIENT_ID": "loadtest",
+        "LLM_API_URL": f"http://127.0.0.1:{llm_port}/v1/chat/completions",
+        "TRIAGE_STRATEGY": args.strategy,
+    })
+    os.environ.setdefault("OPENAI_API_KEY", "mock-key")
+    if args.cold:
+        os.environ.update({"FHIR_CACHE_MAX_BYTES": "0", "LLM_CACHE_SIZE": "0", "LLM_CACHE_PATH": "",
+                           "PATIENT_ID_CACHE_SIZE": "0", "PATIENT_ID_CACHE_PATH": ""})
+
+    # Settings are read at import time, so the app is imported only now
+    from app.main import app
+
+    try:
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=args.timeout) as client:
+                yield client
+    finally:
+        for server in servers:
+            server.should_exit = True
+
+
+async def main(args):
+    mix = _parse_mix(args.mix)
+    patients = _patients(args.patients)
+
+    if args.target:
+        api = httpx.AsyncClient(base_url=args.target, timeout=args.timeout)
+    else:
+        api = in_process_api(args)
+
+    async with api as client:
+        if not args.skip_login:
+            await login(client)
+        print(f"Offering {args.rps} req/s for {args.duration}s across {', '.join(f'{k}={v}' for k, v in mix.items())}")
+        report = await run_load(client, args.rps, args.duration, mix, patients, args.max_in_flight)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.json}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Open-loop load test for the triage API")
+    parser.add_argument("--target", help="Base URL of a running API; omit to run in-process against the mocks")
+    parser.add_argument("--rps", type=float, default=20, help="Offered request rate")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of load")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Endpoint weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--patients", type=int, default=50, help="Distinct synthetic patients to spread load over")
+    parser.add_argument("--max-in-flight", type=int, default=500, help="Client-side cap; arrivals beyond it are dropped")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--skip-login", action="store_true", help="Skip the OAuth flow (target already authenticated)")
+    parser.add_argument("--json", help="Write the report as JSON to this path")
+    parser.add_argument("--strategy", default="llm", help="TRIAGE_STRATEGY for the in-process API")
+    parser.add_argument("--cold", action="store_true", help="Disable FHIR, identity and scoring caches in-process")
+    parser.add_argument("--fhir-latency", default="uniform:20:80")
+    parser.add_argument("--fhir-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-latency", default="lognormal:800:0.5")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    asyncio.run(main(args))
@@ -1,42 +1,190 @@
+import atexit
+import copy
+import datetime
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional
+import orjson
+from app.utils.tracing import current_trace
 
-def setup_logging(debug=False):
-    """Configure application logging"""
+# Attributes every LogRecord has; anything else was passed via `extra=`
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "trace_id"}
+
+_listener: Optional[QueueListener] = None
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message, trace id and extras."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "trace_id", None):
+            entry["trace_id"] = record.trace_id
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of DEBUG/INFO records from selected loggers, e.g.
+    {"app.services.fhir_service": 0.1}. A rate applies to the named logger
+    and its children; warnings and errors are never sampled away.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self.sampled_out = 0
+
+    def _rate(self, name: str) -> Optional[float]:
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return None
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        if rate is None or random.random() < rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Hands records to the writer thread through a bounded queue. When the
+    queue is full the record is dropped and counted instead of blocking the
+    event loop until the disk catches up.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args and render the traceback now, while they are still valid,
+        # but leave the final formatting to the writer thread
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        trace = current_trace()
+        if trace:
+            record.trace_id = trace.trace_id
+        return record
+
+
+def parse_sampling(spec: str) -> Dict[str, float]:
+    """Parse "logger=rate,logger=rate" (rates between 0 and 1)."""
+    rates = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, rate = part.partition("=")
+        rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+def logging_stats() -> dict:
+    """Queue depth and drop counters of the logging pipeline, for /metrics."""
+    root = logging.getLogger()
+    for handler in root.handlers:
+        if isinstance(handler, DroppingQueueHandler):
+            sampler = next((f for f in handler.filters if isinstance(f, SamplingFilter)), None)
+            return {
+                "queued": handler.queue.qsize(),
+                "dropped": handler.dropped,
+                "sampled_out": sampler.sampled_out if sampler else 0,
+            }
+    return {"queued": 0, "dropped": 0, "sampled_out": 0}
+
+
+def setup_logging(debug=False, log_format="json", queue_size=10000, sampling=""):
+    """
+    Configure application logging.
+
+    Log calls only put the record on a bounded queue; a QueueListener thread
+    formats it and does the console/file I/O, including rotation.
+    """
+    global _listener
     log_level = logging.DEBUG if debug else logging.INFO
-    log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    
-    logging.basicConfig(
-        level=log_level,
-        format=log_format,
-    )
-    
+    if log_format == "json":
+        formatter = JSONFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    handlers = [console_handler]
+
     try:
         if not os.path.exists('logs'):
             os.makedirs('logs')
-    
+
         file_handler = RotatingFileHandler(
-            'logs/app.log', 
+            'logs/app.log',
             maxBytes=10485760,  # 10MB
             backupCount=10
         )
-        file_handler.setFormatter(logging.Formatter(log_format))
+        file_handler.setFormatter(formatter)
         file_handler.setLevel(log_level)
-        
+
         error_handler = RotatingFileHandler(
-            'logs/error.log', 
+            'logs/error.log',
             maxBytes=10485760,
             backupCount=10
         )
-        error_handler.setFormatter(logging.Formatter(log_format))
+        error_handler.setFormatter(formatter)
         error_handler.setLevel(logging.ERROR)
-        
-        root_logger = logging.getLogger()
-        root_logger.addHandler(file_handler)
-        root_logger.addHandler(error_handler)
+        handlers += [file_handler, error_handler]
     except (IOError, PermissionError):
-        print("Warning: Unable to create log files. Using console logging only.")
-    
+        logging.getLogger(__name__).warning("Unable to create log files. Using console logging only.")
+
+    shutdown_logging()
+    queue_handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    rates = parse_sampling(sampling)
+    if rates:
+        queue_handler.addFilter(SamplingFilter(rates))
+
+    root_logger = logging.getLogger()
+    root_logger.setLevel(log_level)
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(queue_handler)
+
+    _listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
     logging.getLogger('httpx').setLevel(logging.WARNING)
-    logging.getLogger('uvicorn').setLevel(logging.WARNING)
\ No newline at end of file
+    logging.getLogger('uvicorn').setLevel(logging.WARNING)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,368 @@
+"""
+Local stand-ins for the OpenAI-compatible LLM upstream and the FHIR server,
+so the API can be exercised and load-tested entirely offline.
+
+    python -m app.utils.mock_servers --fhir-port 8081 --llm-port 8082 \
+        --llm-latency lognormal:800:0.5 --llm-error-rate 0.02
+
+Point the API at them with FHIR_SERVER_URL=http://localhost:8081,
+AUTH_SERVER_URL=http://localhost:8081/auth/authorize,
+TOKEN_SERVER_URL=http://localhost:8081/auth/token and
+LLM_API_URL=http://localhost:8082/v1/chat/completions.
+"""
+import argparse
+import asyncio
+import datetime
+import functools
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlencode, urlparse
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, RedirectResponse, Response, StreamingResponse
+from app.utils.synthetic_fhir import DEFAULT_COUNTS, make_bundle, make_patient, make_resources
+
+class LatencyModel:
+    """
+    Latency distribution parsed from "fixed:100", "uniform:50:150",
+    "lognormal:<median_ms>:<sigma>" or "exponential:<mean_ms>".
+    """
+
+    def __init__(self, spec: str = "fixed:0"):
+        kind, *params = spec.split(":")
+        self.kind = kind
+        self.params = [float(p) for p in params]
+        if kind not in ("fixed", "uniform", "lognormal", "exponential"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def sample(self) -> float:
+        """Seconds to wait for one response."""
+        if self.kind == "fixed":
+            ms = self.params[0] if self.params else 0
+        elif self.kind == "uniform":
+            ms = random.uniform(self.params[0], self.params[1])
+        elif self.kind == "lognormal":
+            median, sigma = self.params[0], self.params[1] if len(self.params) > 1 else 0.5
+            ms = random.lognormvariate(0, sigma) * median
+        else:
+            ms = random.expovariate(1 / self.params[0])
+        return ms / 1000
+
+    async def wait(self):
+        delay = self.sample()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def _operation_outcome(status: int, text: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=status,
+        content={"resourceType": "OperationOutcome",
+                 "issue": [{"severity": "error", "code": "exception", "details": {"text": text}}]}
+    )
+
+
+def create_fhir_app(
+    latency: LatencyModel = None,
+    error_rate: float = 0.0,
+    page_size: int = 50,
+    counts: Optional[Dict[str, int]] = None,
+    token_lifetime: Optional[float] = None
+) -> FastAPI:
+    """
+    Mock FHIR R4 server serving synthetic, deterministic patient data.
+
+    With `token_lifetime` set, issued access tokens expire after that many
+    seconds and resource requests without a live token get a 401, which
+    exercises token refresh.
+    """
+    latency = latency or LatencyModel()
+    counts = {**DEFAULT_COUNTS, **(counts or {})}
+    app = FastAPI(title="Mock FHIR server")
+    app.state.tokens = {}
+    app.state.refreshes = 0
+    # Resources written through PUT/DELETE, overlaid on the generated data
+    # ((type, id) -> resource, or None once deleted), to exercise incremental sync
+    app.state.writes = {}
+
+    @functools.lru_cache(maxsize=4096)
+    def resources_for(kind: str, patient_id: str) -> List[dict]:
+        return make_resources(kind, patient_id, counts[kind])
+
+    def patient_id_for(given: str, family: str, birthdate: str) -> Optional[str]:
+        if family.lower() == "unknown":
+            return None
+        key = f"{given.lower()}|{family.lower()}|{birthdate}"
+        return f"pat-{hashlib.sha256(key.encode()).hexdigest()[:12]}"
+
+    def with_writes(resource_type: str, resources: List[dict], patient_id: str, category: Optional[str]) -> List[dict]:
+        writes = app.state.writes
+        if not writes:
+            return resources
+        merged = []
+        for resource in resources:
+            resource = writes.get((resource_type, resource["id"]), resource)
+            if resource is not None:
+                merged.append(resource)
+        known = {r["id"] for r in resources}
+        added = [
+            r for (kind, resource_id), r in writes.items()
+            if kind == resource_type and r is not None and resource_id not in known
+            and r.get("subject", {}).get("reference") == f"Patient/{patient_id}"
+            and (not category or any(c.get("code") == category
+                                     for cat in r.get("category", []) for c in cat.get("coding", [])))
+        ]
+        # Newest first, like the generated data
+        return added[::-1] + merged
+
+    def search(base_url: str, resource_type: str, params: Dict[str, str]) -> Response:
+        patient_id = params.get("patient", "")
+        if resource_type == "Patient":
+            patient_id = patient_id_for(params.get("given", ""), params.get("family", ""), params.get("birthdate", ""))
+            found = [make_patient(patient_id, params.get("given"), params.get("family"), params.get("birthdate"))] if patient_id else []
+            return _json_with_etag(make_bundle(found))
+        if resource_type == "Observation":
+            category = params.get("category")
+            kinds = [category] if category else ["vital-signs", "laboratory"]
+            resources = [r for kind in kinds if kind in counts for r in resources_for(kind, patient_id)]
+            if params.get("code"):
+                codes = set(params["code"].split(","))
+                resources = [r for r in resources
+                             if any(c.get("code") in codes for c in r["code"].get("coding", []))]
+        elif resource_type in counts:
+            resources = resources_for(resource_type, patient_id)
+        else:
+            return _operation_outcome(404, f"Resource type {resource_type} is not supported")
+        resources = with_writes(resource_type, resources, patient_id, params.get("category"))
+
+        for prefix, op in (("ge", lambda a, b: a >= b), ("le", lambda a, b: a <= b), ("gt", lambda a, b: a > b)):
+            for name, field in (("date", "effectiveDateTime"), ("_lastUpdated", "meta")):
+                value = params.get(name, "")
+                if value.startswith(prefix):
+                    bound = value[2:]
+                    resources = [
+                        r for r in resources
+                        if op((r.get("meta", {}).get("lastUpdated") if field == "meta" else r.get(field)) or "", bound)
+                    ]
+
+        if params.get("_sort") == "-date":
+            resources = sorted(
+                resources,
+                key=lambda r: r.get("effectiveDateTime") or r.get("period", {}).get("start") or "",
+                reverse=True
+            )
+        if params.get("_summary") == "count":
+            return _json_with_etag(make_bundle([], total=len(resources)))
+        count = int(params.get("_count", page_size))
+        offset = int(params.get("_offset", 0))
+        bundle = make_bundle(resources[offset:offset + count], total=len(resources))
+        if offset + count < len(resources):
+            next_params = {**params, "_count": count, "_offset": offset + count}
+            bundle["link"] = [{"relation": "next", "url": f"{base_url}/{resource_type}?{urlencode(next_params)}"}]
+        return _json_with_etag(bundle)
+
+    def _json_with_etag(body: dict) -> Response:
+        content = json.dumps(body).encode()
+        etag = f'W/"{hashlib.md5(content).hexdigest()}"'
+        return Response(content=content, media_type="application/fhir+json", headers={"ETag": etag})
+
+    @app.middleware("http")
+    async def simulate_upstream(request: Request, call_next):
+        await latency.wait()
+        if error_rate and not request.url.path.startswith("/auth") and random.random() < error_rate:
+            return _operation_outcome(503, "Simulated upstream failure")
+        if token_lifetime and not request.url.path.endswith(("/metadata", "/auth/authorize", "/auth/token")):
+            token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+            if app.state.tokens.get(token, 0) <= time.time():
+                return _operation_outcome(401, "Access token expired or invalid")
+        response = await call_next(request)
+        etag = response.headers.get("ETag")
+        if etag and request.headers.get("If-None-Match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return response
+
+    @app.get("/metadata")
+    async def metadata():
+        return {
+            "resourceType": "CapabilityStatement",
+            "status": "active",
+            "fhirVersion": "4.0.1",
+            "format": ["json"],
+            "rest": [{"mode": "server", "interaction": [{"code": "batch"}]}],
+        }
+
+    @app.get("/auth/authorize")
+    async def authorize(redirect_uri: str, state: str = ""):
+        return RedirectResponse(f"{redirect_uri}?{urlencode({'code': 'mock-code', 'state': state})}")
+
+    @app.post("/auth/token")
+    async def token(request: Request):
+        form = parse_qs((await request.body()).decode())
+        if form.get("grant_type") == ["refresh_token"]:
+            if not form.get("refresh_token", [""])[0].startswith("mock-refresh-token"):
+                return JSONResponse({"error": "invalid_grant"}, status_code=400)
+            app.state.refreshes += 1
+        lifetime = token_lifetime or 3600
+        access_token = f"mock-token-{random.getrandbits(32):08x}"
+        app.state.tokens[access_token] = time.time() + lifetime
+        return {
+            "access_token": access_token,
+            "token_type": "Bearer",
+            "expires_in": int(lifetime),
+            "refresh_token": f"mock-refresh-token-{random.getrandbits(32):08x}",
+            "scope": "launch/patient patient/*.read",
+        }
+
+    @app.get("/Patient/{patient_id}")
+    async def read_patient(patient_id: str):
+        return _json_with_etag(make_patient(patient_id))
+
+    @app.get("/{resource_type}")
+    async def search_resources(resource_type: str, request: Request):
+        # Built from the request URL so next links keep any mount prefix
+        base_url = str(request.url.replace(query="")).rsplit("/", 1)[0]
+        return search(base_url, resource_type, dict(request.query_params))
+
+    @app.put("/{resource_type}/{resource_id}")
+    async def update_resource(resource_type: str, resource_id: str, request: Request):
+        resource = {**await request.json(), "resourceType": resource_type, "id": resource_id}
+        updated = datetime.datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
+        resource["meta"] = {**resource.get("meta", {}), "lastUpdated": updated}
+        app.state.writes[(resource_type, resource_id)] = resource
+        return _json_with_etag(resource)
+
+    @app.delete("/{resource_type}/{resource_id}")
+    async def delete_resource(resource_type: str, resource_id: str):
+        app.state.writes[(resource_type, resource_id)] = None
+        return Response(status_code=204)
+
+    @app.post("/")
+    async def batch(request: Request):
+        bundle = await request.json()
+        base_url = str(request.url.replace(query="")).rstrip("/")
+        entries = []
+        for entry in bundle.get("entry", []):
+            url = urlparse(entry.get("request", {}).get("url", ""))
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            path = url.path.strip("/").split("/")
+            if path[0] == "Patient" and len(path) == 2:
+                result = _json_with_etag(make_patient(path[1]))
+            else:
+                result = search(base_url, path[0], params)
+            status = f"{result.status_code} {'OK' if result.status_code == 200 else 'Error'}"
+            entries.append({"resource": json.loads(result.body), "response": {"status": status}})
+        return {"resourceType": "Bundle", "type": "batch-response", "entry": entries}
+
+    return app
+
+
+def _esi_from_prompt(prompt: str) -> int:
+    heart_rate = re.search(r"Heart Rate:\s*(\d+)", prompt)
+    if heart_rate and int(heart_rate.group(1)) > 130:
+        return 2
+    if "chest pain" in prompt.lower():
+        return 2
+    return random.choice([3, 3, 4, 4, 5])
+
+
+def create_llm_app(
+    latency: LatencyModel = None,
+    error_rate: float = 0.0,
+    error_status: int = 503,
+    token_latency: LatencyModel = None
+) -> FastAPI:
+    """Mock OpenAI-compatible chat completions endpoint, with optional streaming."""
+    latency = latency or LatencyModel()
+    token_latency = token_latency or LatencyModel("fixed:5")
+    app = FastAPI(title="Mock LLM server")
+
+    @app.post("/v1/chat/completions")
+    @app.post("/api/v1/chat/completions")
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        await latency.wait()
+        if error_rate and random.random() < error_rate:
+            return JSONResponse(status_code=error_status, content={"error": {"message": "Simulated upstream failure"}})
+
+        prompt = payload.get("messages", [{}])[-1].get("content", "")
+        content = json.dumps({
+            "esi_score": _esi_from_prompt(prompt),
+            "explanation": "Mock assessment based on reported vitals and symptoms."
+        })
+        created = int(time.time())
+        model = payload.get("model", "mock-model")
+
+        if not payload.get("stream"):
+            return {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                          "total_tokens": (len(prompt) + len(content)) // 4},
+            }
+
+        async def events():
+            for start in range(0, len(content), 4):
+                await token_latency.wait()
+                chunk = {
+                    "id": "chatcmpl-mock",
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": content[start:start + 4]}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def serve_in_thread(app: FastAPI, port: int, host: str = "127.0.0.1"):
+    """Run an app with uvicorn on a daemon thread; returns the server once it accepts connections."""
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run local FHIR and LLM stand-ins")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--fhir-port", type=int, default=8081)
+    parser.add_argument("--llm-port", type=int, default=8082)
+    parser.add_argument("--fhir-latency", default="uniform:20:80", help="e.g. fixed:50, uniform:20:80, lognormal:300:0.6")
+    parser.add_argument("--fhir-error-rate", type=float, default=0.0)
+    parser.add_argument("--fhir-page-size", type=int, default=50)
+    parser.add_argument("--token-lifetime", type=float, help="Expire access tokens after this many seconds")
+    parser.add_argument("--llm-latency", default="lognormal:800:0.5")
+    parser.add_argument("--llm-token-latency", default="fixed:5")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-error-status", type=int, default=503)
+    args = parser.parse_args()
+
+    serve_in_thread(
+        create_fhir_app(LatencyModel(args.fhir_latency), args.fhir_error_rate, args.fhir_page_size,
+                        token_lifetime=args.token_lifetime),
+        args.fhir_port, args.host
+    )
+    print(f"Mock FHIR server on http://{args.host}:{args.fhir_port}")
+    print(f"Mock LLM server on http://{args.host}:{args.llm_port}/v1/chat/completions")
+    uvicorn.run(
+        create_llm_app(LatencyModel(args.llm_latency), args.llm_error_rate, args.llm_error_status,
+                       LatencyModel(args.llm_token_latency)),
+        host=args.host, port=args.llm_port, log_level="warning"
+    )
@@ -0,0 +1,123 @@
+"""
+Import-time profile and start-up budget check for the API.
+
+Each measurement imports the module in a fresh interpreter, so nothing is
+already cached in sys.modules:
+
+    python -m app.utils.startup_profile                 # top modules by import time
+    python -m app.utils.startup_profile --budget-ms 1500 --budget-mb 150
+
+With a budget the command exits non-zero when the median import time or
+the resident memory after import exceeds it, so CI can run it as a check.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+MEASURE = """
+import json, resource, sys, time
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"import_ms": elapsed * 1000, "rss_mb": after / 1024, "rss_delta_mb": (after - before) / 1024,
+                   "modules": len(sys.modules)}}))
+"""
+
+
+def measure(module: str) -> dict:
+    """Wall time and peak RSS of importing `module` in a clean interpreter."""
+    result = subprocess.run(
+        [sys.executable, "-c", MEASURE.format(module=module)],
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def import_times(module: str) -> List[dict]:
+    """Parse `python -X importtime` output into per-module self/cumulative times."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip())) // 2,
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+        })
+    return rows
+
+
+def by_package(rows: List[dict]) -> Dict[str, float]:
+    """Self time summed per top-level package, largest first."""
+    totals: Dict[str, float] = {}
+    for row in rows:
+        package = row["module"].split(".", 1)[0]
+        totals[package] = totals.get(package, 0) + row["self_ms"]
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+def main(args) -> int:
+    runs = [measure(args.module) for _ in range(args.repeat)]
+    import_ms = statistics.median(run["import_ms"] for run in runs)
+    rss_mb = max(run["rss_mb"] for run in runs)
+    rows = import_times(args.module)
+
+    report = {
+        "module": args.module,
+        "python": sys.version.split()[0],
+        "import_ms": round(import_ms, 1),
+        "rss_mb": round(rss_mb, 1),
+        "modules_loaded": runs[0]["modules"],
+        "packages_ms": {name: round(ms, 1) for name, ms in list(by_package(rows).items())[:args.top]},
+        "slowest": [
+            {**row, "self_ms": round(row["self_ms"], 1), "cumulative_ms": round(row["cumulative_ms"], 1)}
+            for row in sorted(rows, key=lambda r: r["cumulative_ms"], reverse=True)
+            if row["module"].startswith("app") or row["depth"] <= 1
+        ][:args.top],
+    }
+
+    failures = []
+    if args.budget_ms is not None and import_ms > args.budget_ms:
+        failures.append(f"import time {import_ms:.0f} ms exceeds budget {args.budget_ms:.0f} ms")
+    if args.budget_mb is not None and rss_mb > args.budget_mb:
+        failures.append(f"resident memory {rss_mb:.1f} MB exceeds budget {args.budget_mb:.1f} MB")
+    report["budget_failures"] = failures
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"import {args.module}: {report['import_ms']} ms (median of {args.repeat}), "
+              f"{report['rss_mb']} MB RSS, {report['modules_loaded']} modules")
+        print("\nSelf time by top-level package:")
+        for name, ms in report["packages_ms"].items():
+            print(f"  {name:<28}{ms:>9.1f} ms")
+        print("\nSlowest imports (cumulative):")
+        for row in report["slowest"]:
+            print(f"  {row['module']:<48}{row['cumulative_ms']:>9.1f} ms{row['self_ms']:>9.1f} ms self")
+        for failure in failures:
+            print(f"\nBUDGET EXCEEDED: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile API import time and check it against a budget")
+    parser.add_argument("--module", default="app.main", help="Module to import (default: app.main)")
+    parser.add_argument("--repeat", type=int, default=5, help="Clean imports to take the median over")
+    parser.add_argument("--top", type=int, default=15, help="Rows to show per table")
+    parser.add_argument("--budget-ms", type=float, help="Fail when the median import time exceeds this")
+    parser.add_argument("--budget-mb", type=float, help="Fail when peak RSS after import exceeds this")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    sys.exit(main(args))
@@ -0,0 +1,298 @@
+import datetime
+import hashlib
+import random
+from typing import Callable, Dict, List
+
+# Realistic shapes for every resource type FHIRService queries: codings,
+# components, dosage instructions, reactions, periods. Generation is seeded
+# by patient id so the same patient always gets the same history.
+
+VITAL_SIGNS = [
+    ("8867-4", "Heart rate", "/min", 60, 130),
+    ("9279-1", "Respiratory rate", "/min", 10, 32),
+    ("8310-5", "Body temperature", "Cel", 35.5, 40.5),
+    ("59408-5", "Oxygen saturation in Arterial blood by Pulse oximetry", "%", 85, 100),
+    ("29463-7", "Body weight", "kg", 40, 130),
+]
+BLOOD_PRESSURE = ("85354-9", "Blood pressure panel with all children optional")
+BP_COMPONENTS = [
+    ("8480-6", "Systolic blood pressure", 85, 190),
+    ("8462-4", "Diastolic blood pressure", 50, 120),
+]
+LABS = [
+    ("2345-7", "Glucose [Mass/volume] in Serum or Plasma", "mg/dL", 60, 300),
+    ("2160-0", "Creatinine [Mass/volume] in Serum or Plasma", "mg/dL", 0.5, 3.0),
+    ("6690-2", "Leukocytes [#/volume] in Blood by Automated count", "10*3/uL", 3, 20),
+    ("718-7", "Hemoglobin [Mass/volume] in Blood", "g/dL", 8, 18),
+    ("2823-3", "Potassium [Moles/volume] in Serum or Plasma", "mmol/L", 3.0, 6.0),
+]
+CONDITIONS = [
+    ("38341003", "Hypertension"),
+    ("44054006", "Diabetes mellitus type 2"),
+    ("195967001", "Asthma"),
+    ("13645005", "Chronic obstructive lung disease"),
+    ("49436004", "Atrial fibrillation"),
+    ("42343007", "Congestive heart failure"),
+]
+MEDICATIONS = [
+    ("314076", "lisinopril 10 MG Oral Tablet"),
+    ("860975", "metformin hydrochloride 500 MG Oral Tablet"),
+    ("745752", "albuterol 0.09 MG/ACTUAT Metered Dose Inhaler"),
+    ("855332", "warfarin sodium 5 MG Oral Tablet"),
+    ("197361", "amlodipine 5 MG Oral Tablet"),
+]
+ALLERGIES = [
+    ("7980", "Penicillin G", "medication"),
+    ("227493005", "Cashew nuts", "food"),
+    ("256277009", "Grass pollen", "environment"),
+]
+REACTIONS = [("271807003", "Skin rash"), ("39579001", "Anaphylaxis"), ("49727002", "Cough")]
+ENCOUNTER_TYPES = [
+    ("EMER", "Emergency room admission"),
+    ("AMB", "General examination of patient"),
+    ("IMP", "Hospital admission"),
+]
+
+def _coding(system: str, code: str, display: str) -> dict:
+    return {"coding": [{"system": system, "code": code, "display": display}], "text": display}
+
+
+def patient_rng(patient_id: str, salt: str = "") -> random.Random:
+    digest = hashlib.sha256(f"{patient_id}:{salt}".encode()).hexdigest()
+    return random.Random(int(digest[:16], 16))
+
+
+def _timestamp(rng: random.Random, index: int, now: datetime.datetime) -> str:
+    # Newest first, roughly one record every few hours going back in time
+    moment = now - datetime.timedelta(hours=index * rng.uniform(2, 12))
+    return moment.replace(microsecond=0).isoformat() + "Z"
+
+
+def make_patient(patient_id: str, first_name: str = None, last_name: str = None, birthdate: str = None) -> dict:
+    rng = patient_rng(patient_id, "Patient")
+    return {
+        "resourceType": "Patient",
+        "id": patient_id,
+        "meta": {"versionId": "1", "lastUpdated": "2024-01-01T00:00:00Z"},
+        "name": [{
+            "use": "official",
+            "family": last_name or rng.choice(["Smith", "Garcia", "Kim", "Nguyen", "Okafor"]),
+            "given": [first_name or rng.choice(["Alex", "Maria", "Jin", "Sam", "Ada"])],
+        }],
+        "gender": rng.choice(["male", "female"]),
+        "birthDate": birthdate or f"{rng.randint(1935, 2015)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "address": [{"use": "home", "line": [f"{rng.randint(1, 999)} Main St"], "city": "Atlanta",
+                     "state": "GA", "postalCode": "30332", "country": "US"}],
+        "telecom": [{"system": "phone", "value": "555-0100"}, {"system": "email", "value": "patient@example.org"}],
+    }
+
+
+def make_vital_sign(patient_id: str, index: int, rng: random.Random, now: datetime.datetime) -> dict:
+    when = _timestamp(rng, index, now)
+    resource = {
+        "resourceType": "Observation",
+        "id": f"{patient_id}-vs-{index}",
+        "meta": {"lastUpdated": when},
+        "status": "final",
+        "category": [_coding("http://terminology.hl7.org/CodeSystem/observation-category", "vital-signs", "Vital Signs")],
+        "subject": {"reference": f"Patient/{patient_id}"},
+        "effectiveDateTime": when,
+        "issued": when,
+    }
+    if index % (len(VITAL_SIGNS) + 1) == 0:
+        code, display = BLOOD_PRESSURE
+        resource["code"] = _coding("http://loinc.org", code, display)
+        resource["component"] = [
+            {
+                "code": _coding("http://loinc.org", c_code, c_display),
+                "valueQuantity": {"value": rng.randint(low, high), "unit": "mmHg",
+                                  "system": "http://unitsofmeasure.org", "code": "mm[Hg]"},
+            }
+            for c_code, c_display, low, high in BP_COMPONENTS
+        ]
+    else:
+        code, display, unit, low, high = VITAL_SIGNS[index % (len(VITAL_SIGNS) + 1) - 1]
+        resource["code"] = _coding("http://loinc.org", code, display)
+        resource["valueQuantity"] = {"value": round(rng.uniform(low, high), 1), "unit": unit,
+                                     "system": "http://unitsofmeasure.org", "code": unit}
+    return resource
+
+
+def make_lab(patient_id: str, index: int, rng: random.Random, now: datetime.datetime) -> dict:
+    when = _timestamp(rng, index, now)
+    code, display, unit, low, high = LABS[index % len(LABS)]
+    return {
+        "resourceType": "Observation",
+        "id": f"{patient_id}-lab-{index}",
+        "meta": {"lastUpdated": when},
+        "status": "final",
+        "category": [_coding("http://terminology.hl7.org/CodeSystem/observation-category", "laboratory", "Laboratory")],
+        "code": _coding("http://loinc.org", code, display),
+        "subject": {"reference": f"Patient/{patient_id}"},
+        "effectiveDateTime": when,
+        "issued": when,
+        "valueQuantity": {"value": round(rng.uniform(low, high), 2), "unit": unit,
+                          "system": "http://unitsofmeasure.org", "code": unit},
+    }
+
+
+def make_condition(patient_id: str, index: int, rng: random.Random, now: datetime.datetime) -> dict:
+    code, display = CONDITIONS[index % len(CONDITIONS)]
+    onset = _timestamp(rng, index * 200, now)
+    return {
+        "resourceType": "Condition",
+        "id": f"{patient_id}-cond-{index}",
+        "meta": {"lastUpdated": onset},
+        "clinicalStatus": _coding("http://terminology.hl7.org/CodeSystem/condition-clinical", "active", "Active"),
+        "verificationStatus": _coding("http://terminology.hl7.org/CodeSystem/condition-ver-status", "confirmed", "Confirmed"),
+        "severity": _coding("http://snomed.info/sct", "6736007", "Moderate"),
+        "code": _coding("http://snomed.info/sct", code, display),
+        "subject": {"reference": f"Patient/{patient_id}"},
+        "onsetDateTime": onset,
+        "recordedDate": onset,
+    }
+
+
+def make_medication(patient_id: str, index: int) -> dict:
+    code, display = MEDICATIONS[index % len(MEDICATIONS)]
+    return {
+        "resourceType": "Medication",
+        "id": f"{patient_id}-med-{index}",
+        "code": _coding("http://www.nlm.nih.gov/research/umls/rxnorm", code, display),
+    }
+
+
+def make_medication_request(patient_id: str, index: int, rng: random.Random, now: datetime.datetime) -> dict:
+    return {
+        "resourceType": "MedicationRequest",
+        "id": f"{patient_id}-medreq-{index}",
+        "meta": {"lastUpdated": _timestamp(rng, index * 50, now)},
+        "status": "active" if index % 4 else "stopped",
+        "intent": "order",
+        "medicationReference": {"reference": f"Medication/{patient_id}-med-{index}"},
+        "subject": {"reference": f"Patient/{patient_id}"},
+        "authoredOn": _timestamp(rng, index * 50, now),
+        "dosageInstruction": [{
+            "text": "Take one tablet by mouth daily",
+            "timing": {
+                "code": _coding("http://terminology.hl7.org/CodeSystem/v3-GTSAbbreviation", "QD", "Daily"),
+                "repeat": {"frequency": 1, "period": 1, "periodUnit": "d"},
+            },
+            "route": _coding("http://snomed.info/sct", "26643006", "Oral route"),
+            "method": _coding("http://snomed.info/sct", "421521009", "Swallow"),
+            "doseAndRate": [{"doseQuantity": {"value": rng.choice([1, 2]), "unit": "tablet"}}],
+        }],
+    }
+
+
+def make_allergy(patient_id: str, index: int, rng: random.Random, now: datetime.datetime) -> dict:
+    code, display, category = ALLERGIES[index % len(ALLERGIES)]
+    reaction_code, reaction_display = REACTIONS[index % len(REACTIONS)]
+    return {
+        "resourceType": "AllergyIntolerance",
+        "id": f"{patient_id}-allergy-{index}",
+        "meta": {"lastUpdated": _timestamp(rng, index * 500, now)},
+        "clinicalStatus": _coding("http://terminology.hl7.org/CodeSystem/allergyintolerance-clinical", "active", "Active"),
+        "type": "allergy",
+        "category": [category],
+        "criticality": rng.choice(["low", "high"]),
+        "code": _coding("http://snomed.info/sct", code, display),
+        "patient": {"reference": f"Patient/{patient_id}"},
+        "recordedDate": _timestamp(rng, index * 500, now),
+        "reaction": [{
+            "manifestation": [_coding("http://snomed.info/sct", reaction_code, reaction_display)],
+            "severity": rng.choice(["mild", "moderate", "severe"]),
+        }],
+    }
+
+
+def make_encounter(patient_id: str, index: int, rng: random.Random, now: datetime.datetime) -> dict:
+    code, display = ENCOUNTER_TYPES[index % len(ENCOUNTER_TYPES)]
+    start = _timestamp(rng, index * 300, now)
+    return {
+        "resourceType": "Encounter",
+        "id": f"{patient_id}-enc-{index}",
+        "meta": {"lastUpdated": start},
+        "status": "finished",
+        "class": {"system": "http://terminology.hl7.org/CodeSystem/v3-ActCode", "code": code},
+        "type": [{"text": display}],
+        "reasonCode": [{"text": rng.choice(["Chest pain", "Fever", "Follow-up", "Shortness of breath"])}],
+        "subject": {"reference": f"Patient/{patient_id}"},
+        "period": {"start": start, "end": start},
+    }
+
+
+def make_document_reference(patient_id: str, index: int, rng: random.Random, now: datetime.datetime) -> dict:
+    when = _timestamp(rng, index * 100, now)
+    return {
+        "resourceType": "DocumentReference",
+        "id": f"{patient_id}-doc-{index}",
+        "meta": {"lastUpdated": when},
+        "status": "current",
+        "category": [_coding("http://hl7.org/fhir/us/core/CodeSystem/us-core-documentreference-category",
+                             "clinical-note", "Clinical Note")],
+        "type": _coding("http://loinc.org", "34117-2", "History and physical note"),
+        "subject": {"reference": f"Patient/{patient_id}"},
+        "date": when,
+        "content": [{"attachment": {"contentType": "text/plain",
+                                    "data": "UGF0aWVudCBzZWVuIGluIEVEIGZvciBjaGVzdCBwYWluLg==" * rng.randint(1, 20)}}],
+    }
+
+
+def make_diagnostic_report(patient_id: str, index: int, rng: random.Random, now: datetime.datetime) -> dict:
+    when = _timestamp(rng, index * 100, now)
+    return {
+        "resourceType": "DiagnosticReport",
+        "id": f"{patient_id}-report-{index}",
+        "meta": {"lastUpdated": when},
+        "status": "final",
+        "category": [_coding("http://loinc.org", "LP29708-2", "Cardiology")],
+        "code": _coding("http://loinc.org", "11524-6", "EKG study"),
+        "subject": {"reference": f"Patient/{patient_id}"},
+        "effectiveDateTime": when,
+        "conclusion": "Normal sinus rhythm.",
+    }
+
+
+GENERATORS: Dict[str, Callable] = {
+    "vital-signs": make_vital_sign,
+    "laboratory": make_lab,
+    "Condition": make_condition,
+    "MedicationRequest": make_medication_request,
+    "AllergyIntolerance": make_allergy,
+    "Encounter": make_encounter,
+    "DocumentReference": make_document_reference,
+    "DiagnosticReport": make_diagnostic_report,
+}
+
+DEFAULT_COUNTS = {
+    "vital-signs": 120,
+    "laboratory": 60,
+    "Condition": 4,
+    "MedicationRequest": 5,
+    "AllergyIntolerance": 2,
+    "Encounter": 25,
+    "DocumentReference": 6,
+    "DiagnosticReport": 4,
+}
+
+def make_resources(kind: str, patient_id: str, count: int, now: datetime.datetime = None) -> List[dict]:
+    """Generate `count` resources of a kind (resource type, or Observation category)."""
+    now = now or datetime.datetime(2025, 1, 1)
+    rng = patient_rng(patient_id, kind)
+    resources = [GENERATORS[kind](patient_id, index, rng, now) for index in range(count)]
+    if kind == "MedicationRequest":
+        resources += [make_medication(patient_id, index) for index in range(count)]
+    return resources
+
+
+def make_bundle(resources: List[dict], total: int = None) -> dict:
+    return {
+        "resourceType": "Bundle",
+        "type": "searchset",
+        "total": len(resources) if total is None else total,
+        "entry": [
+            {"fullUrl": f"urn:uuid:{r['resourceType']}-{r['id']}", "resource": r}
+            for r in resources
+        ],
+    }
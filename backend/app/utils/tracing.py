@@ -0,0 +1,188 @@
+"""
+Lightweight in-process request tracing.
+
+The tracing middleware opens a Trace per request and stores it in a
+context variable, so spans opened anywhere below (FHIR calls, sections,
+scoring, serialization) attach to it, including inside tasks spawned with
+asyncio, which copy the context. Finished traces go to a bounded ring
+buffer browsable at /debug/traces; no external collector is involved.
+"""
+import contextvars
+import secrets
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, List, Optional
+from app.config.settings import settings
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("trace", default=None)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("span", default=None)
+
+class Span:
+    __slots__ = ("span_id", "parent_id", "name", "start", "duration", "attributes")
+
+    def __init__(self, name: str, parent_id: Optional[str], start: float, attributes: dict):
+        self.span_id = secrets.token_hex(4)
+        self.parent_id = parent_id
+        self.name = name
+        self.start = start
+        self.duration: Optional[float] = None
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self, trace_start: float) -> dict:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ms": round((self.start - trace_start) * 1000, 2),
+            "duration_ms": round(self.duration * 1000, 2) if self.duration is not None else None,
+            "attributes": self.attributes,
+        }
+
+
+class Trace:
+    def __init__(self, name: str):
+        self.trace_id = secrets.token_hex(8)
+        self.name = name
+        self.start = time.perf_counter()
+        self.started_at = time.time()
+        self.duration: Optional[float] = None
+        self.status: Optional[int] = None
+        self.spans: List[Span] = []
+        self.max_spans = 1000
+        self.dropped_spans = 0
+
+    def add(self, span: Span):
+        if len(self.spans) < self.max_spans:
+            self.spans.append(span)
+        else:
+            self.dropped_spans += 1
+
+    def phases(self) -> Dict[str, dict]:
+        """
+        Wall time per phase (the span name up to the first '.'). Overlapping
+        spans of one phase, e.g. concurrent sections, are merged rather than
+        summed, so a phase never exceeds the request's own duration.
+        """
+        intervals: Dict[str, list] = {}
+        for span in self.spans:
+            if span.duration is not None:
+                intervals.setdefault(span.name.split(".", 1)[0], []).append((span.start, span.start + span.duration))
+
+        phases: Dict[str, dict] = {}
+        for name, spans in intervals.items():
+            spans.sort()
+            covered, (lo, hi) = 0.0, spans[0]
+            for start, end in spans[1:]:
+                if start > hi:
+                    covered += hi - lo
+                    lo, hi = start, end
+                else:
+                    hi = max(hi, end)
+            phases[name] = {"duration": covered + hi - lo, "count": len(spans)}
+        return phases
+
+    def server_timing(self) -> str:
+        """Server-Timing header value: one entry per phase plus the total so far."""
+        entries = [
+            f'{name};dur={phase["duration"] * 1000:.1f};desc="{name} x{phase["count"]}"'
+            for name, phase in self.phases().items()
+        ]
+        entries.append(f"total;dur={(time.perf_counter() - self.start) * 1000:.1f}")
+        entries.append(f'trace;desc="{self.trace_id}"')
+        return ", ".join(entries)
+
+    def summary(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 2) if self.duration is not None else None,
+            "spans": len(self.spans),
+            "phases_ms": {name: round(p["duration"] * 1000, 2) for name, p in self.phases().items()},
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            **self.summary(),
+            "dropped_spans": self.dropped_spans,
+            "spans": [span.to_dict(self.start) for span in sorted(self.spans, key=lambda s: s.start)],
+        }
+
+
+class TraceBuffer:
+    """Ring buffer of the most recent finished traces."""
+
+    def __init__(self, max_traces: int):
+        self._traces: Deque[Trace] = deque(maxlen=max_traces)
+
+    def add(self, trace: Trace):
+        self._traces.append(trace)
+
+    def recent(self, limit: int = 50, min_ms: float = 0, name: Optional[str] = None) -> List[dict]:
+        traces = [
+            t for t in reversed(self._traces)
+            if (t.duration or 0) * 1000 >= min_ms and (not name or name in t.name)
+        ]
+        return [t.summary() for t in traces[:limit]]
+
+    def get(self, trace_id: str) -> Optional[Trace]:
+        for trace in self._traces:
+            if trace.trace_id == trace_id:
+                return trace
+        return None
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def start_trace(name: str) -> contextvars.Token:
+    return _current_trace.set(Trace(name))
+
+
+def end_trace(token: contextvars.Token):
+    _current_trace.reset(token)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Time a block as a child of the current span. A no-op outside a traced
+    request, so library code can be instrumented unconditionally.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    parent = _current_span.get()
+    current = Span(name, parent.span_id if parent else None, time.perf_counter(), attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=type(e).__name__)
+        raise
+    finally:
+        current.duration = time.perf_counter() - current.start
+        _current_span.reset(token)
+        trace.add(current)
+
+
+def record_span(name: str, start: float, duration: float, **attributes):
+    """Record an already-measured interval (e.g. busy time accumulated across awaits)."""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    parent = _current_span.get()
+    recorded = Span(name, parent.span_id if parent else None, start, attributes)
+    recorded.duration = duration
+    trace.add(recorded)
+
+
+trace_buffer = TraceBuffer(settings.TRACE_BUFFER_SIZE)
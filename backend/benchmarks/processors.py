@@ -0,0 +1,184 @@
+"""
+Microbenchmarks for the FHIRService response processors.
+
+Each processor is fed synthetic Bundle entries (app.utils.synthetic_fhir)
+at several sizes; the report gives time per entry (best of --repeat runs)
+and peak traced memory. With a baseline the run exits non-zero if any
+processor is slower or uses more memory per entry than the baseline by
+more than --tolerance percent. Cases below --min-entries are reported but
+not gated; at that size the per-entry figures are mostly timer noise.
+
+    cd backend
+    python -m benchmarks.processors --update-baseline      # record a baseline on this machine
+    python -m benchmarks.processors                        # compare against it
+
+Baselines are machine-specific, so benchmarks/baseline.json is not kept in
+the repository: record one on the machine (or CI runner class) that
+compares against it. Without a baseline the run only reports; CI should
+pass --require-baseline so a missing or lost baseline fails the job
+instead of silently skipping the gate.
+"""
+import argparse
+import asyncio
+import datetime
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+from app.services.fhir_service import FHIRService
+from app.utils.synthetic_fhir import DEFAULT_COUNTS, make_resources
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_SIZES = "10,1000,10000,100000"
+MIN_GATED_ENTRIES = 10000
+
+
+def make_entries(kinds: List[str], count: int) -> List[dict]:
+    """
+    About `count` Bundle entries of the given kinds, mixed evenly. Large
+    bundles are stitched together from many synthetic patients with typical
+    history sizes, so timestamps stay realistic (the encounter processor
+    drops anything older than ten years).
+    """
+    # The generators format naive timestamps with a "Z" suffix
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    resources = []
+    per_kind = max(1, count // len(kinds))
+    for kind in kinds:
+        # MedicationRequest also emits one included Medication per request
+        remaining = per_kind // 2 if kind == "MedicationRequest" else per_kind
+        chunk = 0
+        while remaining > 0:
+            size = min(DEFAULT_COUNTS[kind], remaining)
+            resources += make_resources(kind, f"bench-{chunk}", max(1, size), now)
+            remaining -= size
+            chunk += 1
+    return [{"fullUrl": f"urn:uuid:{r['id']}", "resource": r} for r in resources]
+
+
+async def _stream(entries: List[dict]):
+    for entry in entries:
+        yield entry
+
+
+def _processors(service: FHIRService) -> Dict[str, tuple]:
+    return {
+        "observations": (["vital-signs", "laboratory"], service._process_observations),
+        "medications": (["MedicationRequest"], service._process_medications),
+        "encounters": (["Encounter"], service._process_encounters),
+        "allergies": (["AllergyIntolerance"], service._process_allergies),
+        "conditions": (["Condition"], service._process_conditions),
+    }
+
+
+async def _run(process: Callable, entries: List[dict], repeat: int):
+    timings = []
+    # Like timeit, keep the collector from landing in a random timed run
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            await process(_stream(entries))
+            timings.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+
+    # Memory is traced in a separate run; tracemalloc distorts timings
+    tracemalloc.start()
+    await process(_stream(entries))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return timings, peak
+
+
+def measure(process: Callable, entries: List[dict], repeat: int) -> dict:
+    timings, peak = asyncio.run(_run(process, entries, repeat))
+
+    best = min(timings)
+    return {
+        "entries": len(entries),
+        "us_per_entry": round(best / len(entries) * 1e6, 3),
+        "total_ms": round(best * 1000, 3),
+        "peak_kb": round(peak / 1024, 1),
+        "peak_bytes_per_entry": round(peak / len(entries), 1),
+    }
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float,
+            min_entries: int = MIN_GATED_ENTRIES) -> List[str]:
+    """Regressions beyond `tolerance` percent in cases of at least `min_entries`, as human-readable lines."""
+    regressions = []
+    limit = 1 + tolerance / 100
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if not previous or current["entries"] < min_entries:
+            continue
+        for metric in ("us_per_entry", "peak_bytes_per_entry"):
+            if previous[metric] and current[metric] > previous[metric] * limit:
+                change = (current[metric] / previous[metric] - 1) * 100
+                regressions.append(f"{key} {metric}: {previous[metric]} -> {current[metric]} (+{change:.0f}%)")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark FHIRService response processors")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"Comma-separated entry counts (default: {DEFAULT_SIZES})")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case; the best is reported")
+    parser.add_argument("--only", help="Comma-separated processor names to run")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=25.0, help="Allowed regression in percent")
+    parser.add_argument("--min-entries", type=int, default=MIN_GATED_ENTRIES,
+                        help=f"Smallest case compared against the baseline (default: {MIN_GATED_ENTRIES})")
+    parser.add_argument("--update-baseline", action="store_true", help="Write results to the baseline file")
+    parser.add_argument("--require-baseline", action="store_true", help="Fail when there is no baseline to compare against")
+    parser.add_argument("--json", help="Also write results to this path")
+    args = parser.parse_args(argv)
+
+    service = FHIRService("http://bench.invalid/fhir")
+    processors = _processors(service)
+    selected = args.only.split(",") if args.only else list(processors)
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    results = {}
+    print(f"{'processor':<14}{'entries':>9}{'us/entry':>11}{'total ms':>11}{'peak KB':>11}{'B/entry':>10}")
+    for name in selected:
+        kinds, process = processors[name]
+        for size in sizes:
+            entries = make_entries(kinds, size)
+            result = measure(process, entries, args.repeat)
+            results[f"{name}/{size}"] = result
+            print(f"{name:<14}{result['entries']:>9}{result['us_per_entry']:>11}{result['total_ms']:>11}"
+                  f"{result['peak_kb']:>11}{result['peak_bytes_per_entry']:>10}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"python": sys.version.split()[0], "results": results}, f, indent=2)
+            f.write("\n")
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline to record one")
+        return 1 if args.require_baseline else 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.tolerance, args.min_entries)
+    if regressions:
+        print(f"\nRegressions beyond {args.tolerance:.0f}%:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"\nNo regressions beyond {args.tolerance:.0f}% against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
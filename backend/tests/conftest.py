@@ -0,0 +1,62 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+import httpx
+import pytest
+from app.services.fhir_service import FHIRService
+from app.utils.mock_servers import create_fhir_app
+
+
+class MockFHIR:
+    """The mock FHIR server, driven in-process: a client for it, the URLs it was asked for, and services bound to it"""
+
+    def __init__(self, app, client: httpx.AsyncClient):
+        self.app = app
+        self.client = client
+        self.requests: List[str] = []
+
+    def service(self, context: str = "test") -> FHIRService:
+        # A context of its own per mock, so the shared response cache holds nothing from other tests
+        return FHIRService("http://fhir", "token", client=self.client, cache_context=f"{context}|{id(self.app)}")
+
+
+@pytest.fixture
+def run_against_mock() -> Callable[..., None]:
+    """Run `scenario(fhir)` against a fresh mock FHIR server with the given resource counts."""
+    def run(scenario: Callable[[MockFHIR], Awaitable], counts: Optional[Dict[str, int]] = None, app=None):
+        app = app or create_fhir_app(counts=counts or {"vital-signs": 120})
+        fhir = None
+
+        @app.middleware("http")
+        async def record(request, call_next):
+            fhir.requests.append(str(request.url))
+            return await call_next(request)
+
+        async def main():
+            nonlocal fhir
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://fhir") as client:
+                fhir = MockFHIR(app, client)
+                await scenario(fhir)
+
+        asyncio.run(main())
+    return run
+
+
+@pytest.fixture
+def api_client():
+    """The API app with a logged-in session whose FHIR calls go to a fresh mock server"""
+    from fastapi.testclient import TestClient
+    from app.api.routes import patient as patient_routes
+    from app.main import app
+
+    fhir_app = create_fhir_app()
+    app.dependency_overrides[patient_routes.get_session] = lambda: {"id": "test-session"}
+    # Called per request, so the mock's client lives on the loop serving the request
+    app.dependency_overrides[patient_routes.get_fhir_service] = lambda: FHIRService(
+        "http://fhir", "token",
+        client=httpx.AsyncClient(transport=httpx.ASGITransport(app=fhir_app), base_url="http://fhir"),
+        cache_context=f"api|{id(fhir_app)}"
+    )
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.clear()
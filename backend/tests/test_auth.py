@@ -0,0 +1,110 @@
+import asyncio
+from urllib.parse import parse_qs, urlparse
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from app.api.routes import auth as auth_routes
+from app.auth import oauth
+from app.auth.session_store import MemorySessionStore, SQLiteSessionStore
+from app.config.settings import settings
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = MemorySessionStore()
+    monkeypatch.setattr(oauth, "session_store", store)
+    monkeypatch.setattr(auth_routes, "session_store", store)
+    monkeypatch.setattr(auth_routes.smart_auth, "_tracked", {})
+    return store
+
+
+@pytest.fixture
+def client(store, monkeypatch):
+    """The auth routes plus an endpoint echoing the resolved session, with a fake token endpoint"""
+    issued = iter(range(1, 1000))
+
+    async def exchange(code):
+        return {"access_token": f"token-{code}-{next(issued)}", "expires_in": 3600, "patient": code}
+
+    monkeypatch.setattr(auth_routes.smart_auth, "exchange_code_for_token", exchange)
+    app = FastAPI()
+    app.include_router(auth_routes.router, prefix="/auth")
+
+    @app.get("/whoami")
+    async def whoami(session: dict = Depends(auth_routes.get_session)):
+        return {"patient": session["patient"], "access_token": session["access_token"]}
+
+    return TestClient(app)
+
+
+def login_state(client) -> str:
+    response = client.get("/auth/login", follow_redirects=False)
+    return parse_qs(urlparse(response.headers["location"]).query)["state"][0]
+
+
+def login(client, code) -> str:
+    response = client.get("/auth/callback", params={"code": code, "state": login_state(client)})
+    assert response.status_code == 200
+    return response.json()["session_id"]
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_pop_returns_a_value_once(backend, tmp_path):
+    store = MemorySessionStore() if backend == "memory" else SQLiteSessionStore(str(tmp_path / "sessions.db"))
+
+    async def scenario():
+        await store.set("oauth_state", "s1", {"created_at": 1}, ttl=60)
+        first, second = await asyncio.gather(store.pop("oauth_state", "s1"), store.pop("oauth_state", "s1"))
+        assert [first, second].count(None) == 1
+        assert await store.get("oauth_state", "s1") is None
+        await store.close()
+
+    asyncio.run(scenario())
+
+
+def test_oauth_state_is_single_use(client):
+    state = login_state(client)
+    assert client.get("/auth/callback", params={"code": "a", "state": state}).status_code == 200
+    assert client.get("/auth/callback", params={"code": "a", "state": state}).status_code == 400
+    assert client.get("/auth/callback", params={"code": "a", "state": "forged"}).status_code == 400
+
+
+def test_sessions_are_isolated(client):
+    alice = login(client, "alice")
+    bob = login(client, "bob")
+    client.cookies.clear()
+    assert client.get("/whoami", headers={"X-Session-Id": alice}).json()["patient"] == "alice"
+    assert client.get("/whoami", headers={"X-Session-Id": bob}).json()["patient"] == "bob"
+    client.cookies.set(settings.SESSION_COOKIE_NAME, alice)
+    assert client.get("/whoami").json()["patient"] == "alice"
+
+
+def test_login_cookie_identifies_the_caller(client):
+    login(client, "alice")
+    assert client.get("/whoami").json()["patient"] == "alice"
+
+
+def test_request_without_a_session_is_rejected(client):
+    assert not settings.SESSION_LATEST_FALLBACK
+    login(client, "alice")
+    client.cookies.clear()
+    assert client.get("/whoami").status_code == 401
+
+
+def test_latest_fallback_is_opt_in(client, monkeypatch):
+    monkeypatch.setattr(settings, "SESSION_LATEST_FALLBACK", True)
+    login(client, "alice")
+    login(client, "bob")
+    client.cookies.clear()
+    assert client.get("/whoami").json()["patient"] == "bob"
+    # An explicit but unknown session never falls back to someone else's
+    assert client.get("/whoami", headers={"X-Session-Id": "unknown"}).status_code == 401
+
+
+def test_logout_ends_only_that_session(client):
+    alice = login(client, "alice")
+    bob = login(client, "bob")
+    client.cookies.clear()
+    assert client.post("/auth/logout", headers={"X-Session-Id": alice}).status_code == 200
+    assert client.get("/whoami", headers={"X-Session-Id": alice}).status_code == 401
+    assert client.get("/whoami", headers={"X-Session-Id": bob}).json()["patient"] == "bob"
@@ -0,0 +1,69 @@
+import pytest
+from fastapi import Response
+from app.api.routes import patient as patient_routes
+from app.config.settings import settings
+from app.utils.mock_servers import create_fhir_app
+
+PATIENT = "pat-batch"
+
+MALFORMED_REPLIES = {
+    "not JSON": Response("<html>bad gateway</html>", media_type="text/html"),
+    "not a Bundle": Response("[1, 2, 3]", media_type="application/fhir+json"),
+    "entries not objects": Response('{"resourceType": "Bundle", "entry": ["oops", 7]}', media_type="application/fhir+json"),
+    "entry not a list": Response('{"resourceType": "Bundle", "entry": {"a": 1}}', media_type="application/fhir+json"),
+}
+
+
+@pytest.fixture(autouse=True)
+def batch_on(monkeypatch):
+    monkeypatch.setattr(settings, "FHIR_BATCH_MODE", "on")
+
+
+def mock_with_batch_reply(reply: Response):
+    app = create_fhir_app()
+
+    @app.middleware("http")
+    async def malformed_batch(request, call_next):
+        if request.method == "POST" and request.url.path == "/":
+            return reply
+        return await call_next(request)
+
+    return app
+
+
+@pytest.mark.parametrize("kind", MALFORMED_REPLIES)
+def test_malformed_batch_reply_falls_back(kind, run_against_mock):
+    async def scenario(fhir):
+        service = fhir.service()
+        await service.prefetch_sections(PATIENT)
+        assert not service._prefetched
+        allergies = await service.get_allergies(PATIENT)
+        assert allergies
+
+    run_against_mock(scenario, app=mock_with_batch_reply(MALFORMED_REPLIES[kind]))
+
+
+def test_composite_sections_survive_a_malformed_batch(run_against_mock, monkeypatch):
+    monkeypatch.setattr(patient_routes.prefetcher, "enabled", False)
+
+    async def scenario(fhir):
+        service = fhir.service()
+        sections = {
+            "medications": lambda: service.get_medications(PATIENT),
+            "allergies": lambda: service.get_allergies(PATIENT),
+        }
+        results = await patient_routes.fan_out_sections({"id": "s1"}, service, PATIENT, sections)
+        assert all(result.ok for result in results.values())
+
+    run_against_mock(scenario, app=mock_with_batch_reply(MALFORMED_REPLIES["not JSON"]))
+
+
+def test_well_formed_batch_is_used(run_against_mock):
+    async def scenario(fhir):
+        service = fhir.service()
+        assert await service.prefetch_sections(PATIENT, sections=("allergies",))
+        fhir.requests.clear()
+        await service.get_allergies(PATIENT)
+        assert fhir.requests == []
+
+    run_against_mock(scenario)
@@ -0,0 +1,31 @@
+from fastapi.testclient import TestClient
+from app.config.settings import settings
+from app.main import app
+
+client = TestClient(app)
+
+
+def item(heart_rate: int) -> dict:
+    return {
+        "age": 50,
+        "gender": "female",
+        "symptoms": "chest pain",
+        "vitals": {"heartRate": str(heart_rate), "bloodPressureSystolic": "120", "respiratoryRate": "16"},
+        "conditions": []
+    }
+
+
+def test_rule_batches_are_not_held_to_the_llm_limit():
+    items = [item(60 + i % 100) for i in range(settings.LLM_BATCH_MAX_ITEMS * 5)]
+    response = client.post("/api/v1/llm/predict/batch", json={"items": items, "strategy": "rule"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["succeeded"] == len(items) and body["failed"] == 0
+    assert [result["index"] for result in body["results"]] == list(range(len(items)))
+
+
+def test_oversized_llm_batches_are_rejected():
+    items = [item(80)] * (settings.LLM_BATCH_MAX_ITEMS + 1)
+    for strategy in ("llm", "cascade"):
+        response = client.post("/api/v1/llm/predict/batch", json={"items": items, "strategy": strategy})
+        assert response.status_code == 422
@@ -0,0 +1,114 @@
+import pytest
+from fastapi import Response
+from app.services import fhir_service
+from app.services.delta_sync import DeltaSyncStore
+from app.utils.mock_servers import create_fhir_app
+
+PATIENT = "pat-delta"
+
+
+@pytest.fixture
+def delta(monkeypatch):
+    store = DeltaSyncStore(enabled=True, resource_types=["Observation"], full_resync=3600, max_snapshots=16)
+    monkeypatch.setattr(fhir_service, "delta_store", store)
+    return store
+
+
+async def vitals(fhir):
+    bundle = await fhir.service().get_observations(PATIENT, category="vital-signs")
+    return [entry["resource"] for entry in bundle["entry"]]
+
+
+def observation(value):
+    return {
+        "resourceType": "Observation",
+        "status": "final",
+        "subject": {"reference": f"Patient/{PATIENT}"},
+        "category": [{"coding": [{"code": "vital-signs"}]}],
+        "code": {"coding": [{"system": "http://loinc.org", "code": "8867-4", "display": "Heart rate"}]},
+        "effectiveDateTime": "2099-01-01T00:00:00Z",
+        "valueQuantity": {"value": value, "unit": "/min"}
+    }
+
+
+def test_repeat_lookup_fetches_only_changes(delta, run_against_mock):
+    async def scenario(fhir):
+        first = await vitals(fhir)
+        fhir.requests.clear()
+        assert await vitals(fhir) == first
+        assert all("_lastUpdated=ge" in url or "_summary=count" in url for url in fhir.requests)
+        assert delta.delta_syncs == 1
+
+    run_against_mock(scenario)
+
+
+def test_added_and_updated_resources_are_merged(delta, run_against_mock):
+    async def scenario(fhir):
+        before = await vitals(fhir)
+        await fhir.client.put("/Observation/new-1", json=observation(99))
+        added = await vitals(fhir)
+        assert len(added) == len(before) + 1
+        assert added[0]["id"] == "new-1" and added[0]["valueQuantity"]["value"] == 99
+
+        await fhir.client.put("/Observation/new-1", json=observation(42))
+        updated = await vitals(fhir)
+        assert len(updated) == len(added)
+        assert updated[0]["valueQuantity"]["value"] == 42
+        assert delta.full_syncs == 1
+
+    run_against_mock(scenario)
+
+
+def test_deleted_resource_triggers_a_full_resync(delta, run_against_mock):
+    async def scenario(fhir):
+        before = await vitals(fhir)
+        victim = before[3]["id"]
+        await fhir.client.delete(f"/Observation/{victim}")
+        after = await vitals(fhir)
+        assert victim not in {resource["id"] for resource in after}
+        assert len(after) == len(before) - 1
+        assert delta.resyncs == 1
+
+    run_against_mock(scenario)
+
+
+def test_entered_in_error_is_removed(delta, run_against_mock):
+    async def scenario(fhir):
+        await fhir.client.put("/Observation/new-1", json=observation(99))
+        before = await vitals(fhir)
+        await fhir.client.put("/Observation/new-1", json={**observation(99), "status": "entered-in-error"})
+        after = await vitals(fhir)
+        assert "new-1" not in {resource["id"] for resource in after}
+        assert len(after) == len(before) - 1
+
+    run_against_mock(scenario)
+
+
+def test_synced_results_match_a_live_fetch(delta, monkeypatch, run_against_mock):
+    async def scenario(fhir):
+        await vitals(fhir)
+        await fhir.client.put("/Observation/new-1", json=observation(99))
+        synced = await vitals(fhir)
+        monkeypatch.setattr(delta, "enabled", False)
+        assert synced == await vitals(fhir)
+
+    run_against_mock(scenario)
+
+
+def test_unusable_count_falls_back_to_a_full_fetch(delta, run_against_mock):
+    app = create_fhir_app(counts={"vital-signs": 120})
+
+    @app.middleware("http")
+    async def garble_counts(request, call_next):
+        if request.query_params.get("_summary") == "count":
+            return Response("<html>count unavailable</html>", media_type="text/html")
+        return await call_next(request)
+
+    async def scenario(fhir):
+        before = await vitals(fhir)
+        await fhir.client.delete(f"/Observation/{before[0]['id']}")
+        after = await vitals(fhir)
+        assert len(after) == len(before) - 1
+        assert delta.resyncs == 1
+
+    run_against_mock(scenario, app=app)
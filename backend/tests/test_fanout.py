@@ -0,0 +1,103 @@
+import asyncio
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from app.api.routes import patient as patient_routes
+from app.services.fanout import fan_out
+
+
+async def ok(value="data"):
+    await asyncio.sleep(0.01)
+    return value
+
+
+async def not_found():
+    raise HTTPException(status_code=404, detail="Gone")
+
+
+async def broken():
+    raise RuntimeError("parser blew up")
+
+
+async def hang():
+    await asyncio.sleep(60)
+
+
+def test_failures_stay_in_their_own_section():
+    results = asyncio.run(fan_out(
+        {"good": ok, "http": not_found, "crash": broken, "slow": hang},
+        timeout=0.1
+    ))
+    assert results["good"].ok and results["good"].data == "data"
+    assert results["http"].summary()["status_code"] == 404 and results["http"].detail == "Gone"
+    assert results["crash"].status == "error" and "parser blew up" in results["crash"].detail
+    assert results["slow"].status == "timeout"
+
+
+def test_concurrency_is_bounded():
+    running = peak = 0
+
+    async def tracked():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    results = asyncio.run(fan_out({f"s{i}": tracked for i in range(10)}, concurrency=3))
+    assert all(result.ok for result in results.values())
+    assert peak == 3
+
+
+class FakeService:
+    """Medical-history sections; the ones named in `failing` raise"""
+
+    def __init__(self, failing=()):
+        self.failing = failing
+
+    async def find_patient_id(self, first, last, dob):
+        return "p1"
+
+    async def prefetch_sections(self, patient_id, sections=None):
+        return False
+
+    async def _section(self, name):
+        if name in self.failing:
+            raise HTTPException(status_code=503, detail=f"{name} unavailable")
+        return {"demographics": {"name": "Ada", "age": 36}}.get(name, [name])
+
+    def __getattr__(self, attribute):
+        section = attribute.removeprefix("get_").removeprefix("patient_")
+        return lambda *args, **kwargs: self._section(section)
+
+
+@pytest.fixture
+def history(monkeypatch):
+    monkeypatch.setattr(patient_routes.prefetcher, "enabled", False)
+    app = FastAPI()
+    app.include_router(patient_routes.router, prefix="/patient")
+    app.dependency_overrides[patient_routes.get_session] = lambda: {"id": "s1"}
+
+    def fetch(failing=()):
+        app.dependency_overrides[patient_routes.get_fhir_service] = lambda: FakeService(failing)
+        return TestClient(app).get("/patient/Ada/Lovelace/1990-01-01/medical-history")
+
+    return fetch
+
+
+def test_medical_history_returns_partial_results(history):
+    response = history(failing=("medications", "allergies"))
+    assert response.status_code == 200
+    body = response.json()
+    assert body["name"] == "Ada" and body["conditions"] == ["conditions"]
+    assert body["medications"] is None
+    assert body["sections"]["medications"]["status"] == "error"
+    assert body["sections"]["medications"]["status_code"] == 503
+    assert body["sections"]["encounters"]["status"] == "ok"
+
+
+def test_medical_history_fails_only_when_every_section_fails(history):
+    sections = ("demographics", "conditions", "medications", "allergies", "clinical_notes", "encounters")
+    response = history(failing=sections)
+    assert response.status_code == 502
+    assert set(response.json()["detail"]["sections"]) == set(sections)
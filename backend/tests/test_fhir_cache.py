@@ -0,0 +1,119 @@
+import asyncio
+import pytest
+from app.services import fhir_service
+from app.services.fhir_cache import FHIRResponseCache, parse_ttls
+from app.services.singleflight import SingleFlight
+
+PATIENT = "pat-cache"
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = FHIRResponseCache(max_bytes=1024 * 1024, default_ttl=60)
+    monkeypatch.setattr(fhir_service, "fhir_cache", cache)
+    monkeypatch.setattr(fhir_service, "fhir_flights", SingleFlight())
+    return cache
+
+
+def test_concurrent_callers_share_one_call():
+    async def scenario():
+        flights = SingleFlight()
+        started = 0
+
+        async def fetch():
+            nonlocal started
+            started += 1
+            await asyncio.sleep(0.01)
+            return {"id": started}
+
+        results = await asyncio.gather(*(flights.do("key", fetch) for _ in range(10)))
+        assert started == 1 and results == [{"id": 1}] * 10
+        assert flights.stats() == {"calls": 1, "shared": 9, "in_flight": 0}
+        assert await flights.do("key", fetch) == {"id": 2}
+
+    asyncio.run(scenario())
+
+
+def test_shared_failure_reaches_every_caller():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream down")
+
+        results = await asyncio.gather(*(flights.do("key", fail) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_does_not_cancel_the_shared_call():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        impatient = asyncio.create_task(asyncio.wait_for(flights.do("key", fetch), 0.01))
+        patient = asyncio.create_task(flights.do("key", fetch))
+        with pytest.raises(asyncio.TimeoutError):
+            await impatient
+        assert await patient == "done"
+
+    asyncio.run(scenario())
+
+
+def test_lru_eviction_by_size():
+    cache = FHIRResponseCache(max_bytes=100, default_ttl=60)
+    for name in "abc":
+        cache.put((name, ""), f"http://fhir/Patient/{name}", name, nbytes=40)
+    assert cache.get(("a", "")) is None
+    assert cache.get(("b", "")) and cache.get(("c", ""))
+    assert cache.stats()["evictions"] == 1 and cache.total_bytes == 80
+
+
+def test_ttl_per_resource_type():
+    cache = FHIRResponseCache(max_bytes=100, default_ttl=60, ttls=parse_ttls("Patient=600, Observation=0"))
+    assert cache.ttl_for("http://fhir/Patient/1") == 600
+    assert cache.ttl_for("http://fhir/Observation?patient=1") == 0
+    assert cache.ttl_for("http://fhir/Condition?patient=1") == 60
+    # Nothing to revalidate with, so an immediately stale entry is not kept
+    cache.put(("o", ""), "http://fhir/Observation?patient=1", {}, nbytes=10)
+    assert cache.get(("o", "")) is None
+
+
+def test_repeat_reads_are_served_from_the_cache(cache, run_against_mock):
+    async def scenario(fhir):
+        service = fhir.service()
+        first = await asyncio.gather(*(service.get_patient(PATIENT) for _ in range(5)))
+        assert len(fhir.requests) == 1
+        assert await service.get_patient(PATIENT) == first[0]
+        assert len(fhir.requests) == 1
+        assert cache.hits == 1 and cache.misses == 1
+
+    run_against_mock(scenario)
+
+
+def test_stale_entry_is_revalidated_with_its_etag(cache, run_against_mock):
+    cache.ttls = {"Patient": 0}
+
+    async def scenario(fhir):
+        service = fhir.service()
+        first = await service.get_patient(PATIENT)
+        again = await service.get_patient(PATIENT)
+        assert again == first
+        assert len(fhir.requests) == 2
+        assert cache.revalidated == 1 and cache.misses == 1
+
+    run_against_mock(scenario)
+
+
+def test_auth_contexts_do_not_share_entries(cache, run_against_mock):
+    async def scenario(fhir):
+        await fhir.service("scope-a").get_patient(PATIENT)
+        await fhir.service("scope-b").get_patient(PATIENT)
+        assert len(fhir.requests) == 2 and cache.hits == 0
+
+    run_against_mock(scenario)
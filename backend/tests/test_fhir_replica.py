@@ -0,0 +1,113 @@
+import asyncio
+import pytest
+from app.services import fhir_service
+from app.services.fhir_replica import FHIRReplica, parse_search
+
+PATIENT = "pat-replica"
+TYPES = {"Observation", "Condition", "Encounter"}
+
+
+@pytest.fixture
+def replica(tmp_path, monkeypatch):
+    store = FHIRReplica(str(tmp_path / "replica.db"), list(TYPES), max_age=300)
+    monkeypatch.setattr(fhir_service, "fhir_replica", store)
+    yield store
+    asyncio.run(store.close())
+
+
+def entries(bundle):
+    return [entry["resource"] for entry in bundle["entry"]]
+
+
+def observation(resource_id, date):
+    return {"resource": {
+        "resourceType": "Observation",
+        "id": resource_id,
+        "subject": {"reference": f"Patient/{PATIENT}"},
+        "category": [{"coding": [{"code": "vital-signs"}]}],
+        "effectiveDateTime": date
+    }}
+
+
+def test_parse_search_defers_unknown_parameters():
+    url = f"http://fhir/Observation?patient={PATIENT}&category=vital-signs&_count=50&_sort=-date"
+    query = parse_search(url, TYPES)
+    assert query.scope == "category=vital-signs" and query.complete
+    assert parse_search(f"{url}&_lastUpdated=ge2024-01-01", TYPES) is None
+    assert parse_search(f"http://fhir/Patient?patient={PATIENT}", TYPES) is None
+    assert not parse_search(f"{url}&date=ge2024-01-01", TYPES).complete
+
+
+def test_repeat_search_is_answered_locally(replica, run_against_mock):
+    async def scenario(fhir):
+        first = entries(await fhir.service("a").get_observations(PATIENT, category="vital-signs"))
+        fetched = len(fhir.requests)
+        assert fetched > 1
+        second = entries(await fhir.service("a").get_observations(PATIENT, category="vital-signs"))
+        assert second == first
+        assert len(fhir.requests) == fetched
+        assert replica.hits == 1
+
+    run_against_mock(scenario)
+
+
+def test_narrower_searches_match_the_server(replica, run_against_mock):
+    async def scenario(fhir):
+        await fhir.service("a").get_observations(PATIENT, category="vital-signs")
+        fetched = len(fhir.requests)
+        local = entries(await fhir.service("a").get_observations(
+            PATIENT, category="vital-signs", code="8867-4", date_from="2024-01-01"
+        ))
+        assert len(fhir.requests) == fetched
+
+        replica.path = ""
+        live = entries(await fhir.service("live").get_observations(
+            PATIENT, category="vital-signs", code="8867-4", date_from="2024-01-01"
+        ))
+        assert local and local == live
+
+    run_against_mock(scenario)
+
+
+def test_contexts_do_not_share_copies(replica, run_against_mock):
+    async def scenario(fhir):
+        await fhir.service("a").get_observations(PATIENT, category="vital-signs")
+        fetched = len(fhir.requests)
+        await fhir.service("b").get_observations(PATIENT, category="vital-signs")
+        assert len(fhir.requests) > fetched
+        assert replica.hits == 0
+
+    run_against_mock(scenario)
+
+
+def test_stale_copies_go_to_the_server(replica, run_against_mock):
+    async def scenario(fhir):
+        replica.max_age = 0
+        await fhir.service("a").get_observations(PATIENT, category="vital-signs")
+        await asyncio.sleep(0.01)
+        await fhir.service("a").get_observations(PATIENT, category="vital-signs")
+        # Past the replica; the response cache in front of the server may still answer
+        assert replica.hits == 0 and replica.misses == 2
+
+    run_against_mock(scenario)
+
+
+def test_complete_fetch_removes_deleted_resources(replica):
+    async def scenario():
+        url = f"http://fhir/Observation?patient={PATIENT}&category=vital-signs&_count=50&_sort=-date"
+        await replica.store(url, "a", [observation("o1", "2024-02-01"), observation("o2", "2024-01-01")])
+        assert [e["resource"]["id"] for e in await replica.search(url, "a")] == ["o1", "o2"]
+        await replica.store(url, "a", [observation("o2", "2024-01-01")])
+        assert [e["resource"]["id"] for e in await replica.search(url, "a")] == ["o2"]
+
+    asyncio.run(scenario())
+
+
+def test_truncated_fetch_is_not_a_complete_copy(replica):
+    async def scenario():
+        url = f"http://fhir/Observation?patient={PATIENT}&category=vital-signs&_count=50&_sort=-date"
+        await replica.store(url, "a", [observation("o1", "2024-02-01")], complete=False)
+        assert not await replica.covers(url, "a")
+        assert await replica.search(url, "a") is None
+
+    asyncio.run(scenario())
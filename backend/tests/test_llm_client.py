@@ -0,0 +1,119 @@
+import asyncio
+import time
+import httpx
+import pytest
+from app.logic.llm_client import CircuitBreaker, CircuitOpenError, LLMClient, LLMUnavailableError
+
+
+def make_client(handler, breaker: CircuitBreaker) -> LLMClient:
+    client = LLMClient(
+        url="http://llm/chat/completions",
+        connect_timeout=1,
+        read_timeout=1,
+        max_retries=0,
+        backoff_base=0,
+        backoff_max=0,
+        max_in_flight=4,
+        max_queue=4,
+        queue_timeout=1,
+        breaker=breaker
+    )
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+def ok(request):
+    return httpx.Response(200, json={"choices": [{"message": {"content": "{}"}}]})
+
+
+def unavailable(request):
+    return httpx.Response(503, text="down")
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_half_open_allows_a_single_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    breaker.opened_at = time.monotonic() - 60
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_open_circuit_fails_fast():
+    async def run():
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        client = make_client(unavailable, breaker)
+        with pytest.raises(LLMUnavailableError):
+            await client.complete({}, {})
+        with pytest.raises(CircuitOpenError):
+            await client.complete({}, {})
+        await client.aclose()
+
+    asyncio.run(run())
+
+
+def test_probe_outcome_closes_or_reopens_the_circuit():
+    async def run():
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        client = make_client(unavailable, breaker)
+        with pytest.raises(LLMUnavailableError):
+            await client.complete({}, {})
+        assert breaker.opened_at is not None
+
+        client._client = httpx.AsyncClient(transport=httpx.MockTransport(ok))
+        await client.complete({}, {})
+        assert breaker.state == "closed"
+        await client.aclose()
+
+    asyncio.run(run())
+
+
+def test_cancelled_probe_releases_the_half_open_circuit():
+    async def run():
+        started = asyncio.Event()
+
+        async def hang(request):
+            started.set()
+            await asyncio.sleep(60)
+            return ok(request)
+
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        client = make_client(hang, breaker)
+        probe = asyncio.create_task(client.complete({}, {}))
+        await started.wait()
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        assert breaker.state == "half-open"
+        assert breaker.allow()
+        await client.aclose()
+
+    asyncio.run(run())
+
+
+def test_unexpected_probe_error_releases_the_half_open_circuit():
+    async def run():
+        def broken(request):
+            raise RuntimeError("boom")
+
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        client = make_client(broken, breaker)
+        with pytest.raises(RuntimeError):
+            await client.complete({}, {})
+        assert breaker.allow()
+        await client.aclose()
+
+    asyncio.run(run())
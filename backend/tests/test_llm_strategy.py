@@ -0,0 +1,56 @@
+import asyncio
+import json
+import httpx
+import pytest
+from app.logic import llm_client as llm_client_module
+from app.logic.llm_client import CircuitBreaker
+from app.logic.scoring_cache import ScoringCache
+from app.logic.strategies import llm_strategy
+from app.logic.strategies.llm_strategy import LLMScoringStrategy
+from app.schemas.triage import LLMRequest
+
+REQUEST = LLMRequest(age=60, gender="male", symptoms="chest pain", vitals={"heartRate": "140"}, conditions=[])
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Point the shared LLM client at a mock that streams the given completion text"""
+    monkeypatch.setattr(llm_strategy, "scoring_cache", ScoringCache(max_entries=64, ttl=60))
+    client = llm_client_module.llm_client
+    monkeypatch.setattr(client, "breaker", CircuitBreaker(failure_threshold=5, reset_timeout=60))
+
+    def serve(*chunks: str):
+        def handler(request):
+            lines = [f"data: {json.dumps({'choices': [{'delta': {'content': chunk}}]})}\n\n" for chunk in chunks]
+            return httpx.Response(200, content="".join(lines + ["data: [DONE]\n\n"]).encode())
+        monkeypatch.setattr(client, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    return serve
+
+
+def stream_events():
+    async def run():
+        return [event async for event in LLMScoringStrategy().stream(REQUEST)]
+    return asyncio.run(run())
+
+
+def scores(events):
+    return [payload["esi_score"] for event, payload in events if event in ("esi_score", "result")]
+
+
+def test_fenced_json_answer_is_parsed(upstream):
+    upstream("```json\n", '{"esi_score": 2, ', '"explanation": "Tachycardic chest pain"}', "\n```")
+    events = stream_events()
+    assert scores(events) == [2, 2]
+    assert events[-1][1]["explanation"] == "Tachycardic chest pain"
+
+
+def test_unparseable_answer_keeps_the_streamed_score(upstream):
+    upstream('{"esi_score": 1, "explanation": "Unresponsive" and then the model rambles')
+    events = stream_events()
+    assert scores(events) == [1, 1]
+
+
+def test_answer_without_a_score_falls_back_to_esi_3(upstream):
+    upstream("I cannot triage this patient.")
+    assert scores(stream_events()) == [3]
@@ -0,0 +1,35 @@
+import re
+
+
+def samples(client, name):
+    """(labels, value) pairs of one metric from the /metrics exposition"""
+    body = client.get("/metrics").text
+    return [
+        (dict(re.findall(r'(\w+)="([^"]*)"', labels)), float(value))
+        for labels, value in re.findall(rf"^{name}\{{(.*)\}} (\S+)$", body, re.MULTILINE)
+    ]
+
+
+def test_requests_are_labelled_by_route_template(api_client):
+    for patient_id in ("pat-metrics-1", "pat-metrics-2"):
+        assert api_client.get(f"/api/v1/patient/{patient_id}").status_code == 200
+
+    counts = [
+        (labels, value) for labels, value in samples(api_client, "triage_http_request_duration_seconds_count")
+        if labels["route"] == "/api/v1/patient/{patient_id}" and labels["status"] == "200"
+    ]
+    assert counts and counts[0][0]["method"] == "GET" and counts[0][1] >= 2
+    assert "pat-metrics-" not in api_client.get("/metrics").text
+
+
+def test_unknown_paths_share_one_label(api_client):
+    api_client.get("/no/such/path-12345")
+    routes = {labels["route"] for labels, _ in samples(api_client, "triage_http_request_duration_seconds_count")}
+    assert "unmatched" in routes
+    assert not any("path-12345" in route for route in routes)
+
+
+def test_fhir_calls_are_labelled_by_resource_type(api_client):
+    api_client.get("/api/v1/patient/pat-metrics-3")
+    types = {labels["resource_type"] for labels, _ in samples(api_client, "triage_fhir_request_duration_seconds_count")}
+    assert "Patient" in types
@@ -0,0 +1,148 @@
+import asyncio
+from app.services.prefetch import PREFETCH_SECTIONS, PrefetchScheduler
+
+
+class FakeService:
+    """Stands in for FHIRService: each section returns its name, or raises when listed in `failing`"""
+    batch_error = None
+    failing = ()
+    calls = None
+
+    def __init__(self, base_url="http://fhir", access_token="token", client=None, cache_context="", renew_token=None):
+        self.base_url = base_url
+        self.access_token = access_token
+        self.client = client
+        self.cache_context = cache_context
+        self.renew_token = renew_token
+
+    async def prefetch_sections(self, patient_id):
+        if self.batch_error:
+            raise self.batch_error
+        return True
+
+    def _section(self, name):
+        type(self).calls.append(name)
+        if name in self.failing:
+            raise RuntimeError(f"{name} failed")
+        return {"section": name}
+
+    async def get_patient_demographics(self, pid):
+        return self._section("demographics")
+
+    async def get_vital_signs(self, pid):
+        return self._section("vitals")
+
+    async def get_conditions(self, pid, clinical_status=None):
+        return self._section("conditions" if clinical_status else "all_conditions")
+
+    async def get_allergies(self, pid):
+        return self._section("allergies")
+
+    async def get_medications(self, pid):
+        return self._section("medications")
+
+    async def get_lab_results(self, pid):
+        return self._section("labs")
+
+    async def get_encounters(self, pid):
+        return self._section("encounters")
+
+    async def get_clinical_notes(self, pid):
+        return self._section("clinical_notes")
+
+
+def make_service(**attributes):
+    service_class = type("Service", (FakeService,), {"calls": [], **attributes})
+    return service_class()
+
+
+def make_scheduler() -> PrefetchScheduler:
+    return PrefetchScheduler(enabled=True, ttl=60, max_patients=8, concurrency=2)
+
+
+async def live(section):
+    return {"section": section, "live": True}
+
+
+def test_sections_are_served_from_the_snapshot():
+    async def run():
+        scheduler = make_scheduler()
+        service = make_service()
+        scheduler.schedule("s1", "p1", service)
+        for name, _ in PREFETCH_SECTIONS:
+            result = await asyncio.wait_for(scheduler.read("s1", "p1", name, lambda: live(name)), 1)
+            assert result == {"section": name}
+        assert sorted(type(service).calls) == sorted(name for name, _ in PREFETCH_SECTIONS)
+        assert scheduler.fallbacks == 0
+        scheduler.close()
+
+    asyncio.run(run())
+
+
+def test_failed_batch_prefetch_still_fetches_every_section():
+    async def run():
+        scheduler = make_scheduler()
+        service = make_service(batch_error=ValueError("not JSON"))
+        scheduler.schedule("s1", "p1", service)
+        result = await asyncio.wait_for(scheduler.read("s1", "p1", "allergies", lambda: live("allergies")), 1)
+        assert result == {"section": "allergies"}
+        scheduler.close()
+
+    asyncio.run(run())
+
+
+def test_failed_section_falls_back_to_a_live_fetch():
+    async def run():
+        scheduler = make_scheduler()
+        service = make_service(failing=("vitals",))
+        scheduler.schedule("s1", "p1", service)
+        result = await asyncio.wait_for(scheduler.read("s1", "p1", "vitals", lambda: live("vitals")), 1)
+        assert result == {"section": "vitals", "live": True}
+        assert scheduler.fallbacks == 1
+        scheduler.close()
+
+    asyncio.run(run())
+
+
+def test_reading_a_section_does_not_start_a_prefetch():
+    async def run():
+        scheduler = make_scheduler()
+        result = await scheduler.read("s1", "p1", "allergies", lambda: live("allergies"))
+        assert result == {"section": "allergies", "live": True}
+        assert scheduler.scheduled == 0
+        assert scheduler.stats()["snapshots"] == 0
+
+    asyncio.run(run())
+
+
+def test_snapshots_are_per_session():
+    async def run():
+        scheduler = make_scheduler()
+        scheduler.schedule("s1", "p1", make_service())
+        result = await scheduler.read("s2", "p1", "vitals", lambda: live("vitals"))
+        assert result == {"section": "vitals", "live": True}
+        scheduler.close()
+
+    asyncio.run(run())
+
+
+def test_cancelled_session_falls_back_to_live_fetches():
+    async def run():
+        scheduler = make_scheduler()
+        started = asyncio.Event()
+
+        async def hang(self, pid):
+            started.set()
+            await asyncio.sleep(60)
+
+        service = make_service(get_patient_demographics=hang)
+        snapshot = scheduler.schedule("s1", "p1", service)
+        reader = asyncio.create_task(scheduler.read("s1", "p1", "demographics", lambda: live("demographics")))
+        await started.wait()
+        scheduler.cancel_session("s1")
+        result = await asyncio.wait_for(reader, 1)
+        assert result == {"section": "demographics", "live": True}
+        assert all(future.done() for future in snapshot.sections.values())
+        assert scheduler.stats()["snapshots"] == 0
+
+    asyncio.run(run())
@@ -0,0 +1,31 @@
+import pytest
+from app.logic.rule_engine import rule_engine
+from app.schemas.triage import LLMRequest
+
+STABLE_VITALS = {"heartRate": "80", "bloodPressureSystolic": "120", "respiratoryRate": "16"}
+
+
+@pytest.mark.parametrize("symptoms", [
+    "chest pain",
+    "Crushing CHEST PRESSURE since this morning",
+    "worsening angina",
+    "short of breath on exertion",
+    "difficulty breathing",
+])
+def test_symptom_synonyms_share_a_rule(symptoms):
+    result = rule_engine.rules.evaluate(50, STABLE_VITALS, symptoms, [])
+    assert result["esi_score"] == 2
+
+
+def test_unrelated_symptoms_do_not_match():
+    assert rule_engine.rules.evaluate(30, STABLE_VITALS, "ankle sprain", [])["esi_score"] > 2
+
+
+def test_batch_matches_the_scalar_path():
+    texts = ["chest tightness", "trouble breathing", "headache", "dyspnea at rest"]
+    items = [LLMRequest(age=50, gender="female", symptoms=text, vitals=STABLE_VITALS, conditions=[]) for text in texts]
+    batch = rule_engine.rules.evaluate_batch(items)
+    assert [r["esi_score"] for r in batch] == [
+        rule_engine.rules.evaluate(50, STABLE_VITALS, text, [])["esi_score"] for text in texts
+    ]
+    assert [r["esi_score"] for r in batch][:2] == [2, 2]
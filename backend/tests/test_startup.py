@@ -0,0 +1,27 @@
+import json
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Generous enough for a slow CI runner; a heavy import pulled back in at
+# module level (NumPy, a client library) still shows up as a failure
+BUDGET_MS = 3000
+BUDGET_MB = 150
+
+
+def test_import_stays_within_the_startup_budget():
+    result = subprocess.run(
+        [sys.executable, "-m", "app.utils.startup_profile", "--repeat", "3", "--json",
+         "--budget-ms", str(BUDGET_MS), "--budget-mb", str(BUDGET_MB)],
+        cwd=BACKEND, capture_output=True, text=True
+    )
+    report = json.loads(result.stdout)
+    assert result.returncode == 0, report["budget_failures"]
+
+
+def test_import_has_no_side_effects(tmp_path):
+    env = {**os.environ, "PYTHONPATH": BACKEND}
+    subprocess.run([sys.executable, "-c", "import app.main"], cwd=tmp_path, env=env, check=True)
+    assert list(tmp_path.iterdir()) == []
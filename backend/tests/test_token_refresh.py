@@ -0,0 +1,101 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from app.auth import oauth
+from app.auth.oauth import SMARTAuth
+from app.auth.session_store import MemorySessionStore
+from app.services.fhir_service import FHIRService
+from app.utils.mock_servers import create_fhir_app
+
+SESSION = "session-1"
+
+
+@pytest.fixture(autouse=True)
+def store(monkeypatch):
+    store = MemorySessionStore()
+    monkeypatch.setattr(oauth, "session_store", store)
+    return store
+
+
+def mock_fhir():
+    return create_fhir_app(token_lifetime=60)
+
+
+async def login(fhir) -> SMARTAuth:
+    """A session holding a token the mock server has already expired, refreshed against the mock's token endpoint"""
+    auth = SMARTAuth()
+
+    async def refresh_access_token(refresh_token):
+        response = await fhir.client.post("/auth/token", data={"grant_type": "refresh_token", "refresh_token": refresh_token})
+        if response.status_code != 200:
+            raise HTTPException(status_code=400, detail=f"Token refresh failed: HTTP {response.status_code}")
+        return response.json()
+
+    auth.refresh_access_token = refresh_access_token
+    tokens = (await fhir.client.post("/auth/token", data={"grant_type": "authorization_code"})).json()
+    await auth.save_session(SESSION, tokens)
+    fhir.app.state.tokens[tokens["access_token"]] = 0
+    return auth
+
+
+def service_for(fhir, session: dict, renew_token) -> FHIRService:
+    return FHIRService("http://fhir", session["access_token"], client=fhir.client,
+                       cache_context=f"refresh|{id(fhir.app)}", renew_token=renew_token)
+
+
+def test_concurrent_401s_share_one_refresh(store, run_against_mock):
+    async def scenario(fhir):
+        auth = await login(fhir)
+        session = await store.get(oauth.SESSIONS, SESSION)
+
+        async def renew_token(rejected):
+            refreshed = await auth.refresh_session(SESSION, rejected)
+            return refreshed and refreshed.get("access_token")
+
+        services = [service_for(fhir, session, renew_token) for _ in range(6)]
+        patients = await asyncio.gather(*(s.get_patient(f"pat-{i}") for i, s in enumerate(services)))
+        assert [p["id"] for p in patients] == [f"pat-{i}" for i in range(6)]
+        assert fhir.app.state.refreshes == 1 and auth.refreshed == 1
+
+        renewed = (await store.get(oauth.SESSIONS, SESSION))["access_token"]
+        assert renewed != session["access_token"]
+        assert {s.access_token for s in services} == {renewed}
+
+    run_against_mock(scenario, app=mock_fhir())
+
+
+def test_a_rejected_retry_is_not_retried_again(store, run_against_mock):
+    async def scenario(fhir):
+        await login(fhir)
+        session = await store.get(oauth.SESSIONS, SESSION)
+        renewals = []
+
+        async def renew_token(rejected):
+            renewals.append(rejected)
+            return f"still-invalid-{len(renewals)}"
+
+        with pytest.raises(HTTPException) as failure:
+            await service_for(fhir, session, renew_token).get_patient("pat-1")
+        assert failure.value.status_code == 401
+        assert len(renewals) == 1
+        assert [url for url in fhir.requests if "/Patient/" in url] == ["http://fhir/Patient/pat-1"] * 2
+
+    run_against_mock(scenario, app=mock_fhir())
+
+
+def test_failed_refresh_surfaces_the_401(store, run_against_mock):
+    async def scenario(fhir):
+        auth = await login(fhir)
+        session = {**await store.get(oauth.SESSIONS, SESSION), "refresh_token": "revoked"}
+        await store.set(oauth.SESSIONS, SESSION, session, ttl=60)
+
+        async def renew_token(rejected):
+            refreshed = await auth.refresh_session(SESSION, rejected)
+            return refreshed and refreshed.get("access_token")
+
+        with pytest.raises(HTTPException) as failure:
+            await service_for(fhir, session, renew_token).get_patient("pat-1")
+        assert failure.value.status_code == 401
+        assert auth.refresh_failures == 1 and auth.stats()["tracked_sessions"] == 0
+
+    run_against_mock(scenario, app=mock_fhir())
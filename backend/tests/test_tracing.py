@@ -0,0 +1,45 @@
+import re
+from app.config.settings import settings
+from app.utils.tracing import Span, Trace, trace_buffer
+
+
+def server_timing(response) -> dict:
+    """Server-Timing entries by name, each a dict of its parameters"""
+    entries = {}
+    for entry in response.headers["Server-Timing"].split(", "):
+        name, *params = entry.split(";")
+        entries[name] = dict(param.split("=", 1) for param in params)
+    return entries
+
+
+def test_server_timing_breaks_down_the_request(api_client):
+    timing = server_timing(api_client.get("/api/v1/patient/pat-trace-1"))
+    assert timing["fhir"]["desc"] == '"fhir x1"'
+    assert 0 < float(timing["fhir"]["dur"]) <= float(timing["total"]["dur"])
+    assert re.fullmatch(r'"[0-9a-f]{16}"', timing["trace"]["desc"])
+
+
+def test_trace_is_kept_under_the_route_template(api_client, monkeypatch):
+    monkeypatch.setattr(settings, "TRACES_ENDPOINT", True)
+    response = api_client.get("/api/v1/patient/pat-trace-2")
+    trace_id = server_timing(response)["trace"]["desc"].strip('"')
+
+    trace = api_client.get(f"/debug/traces/{trace_id}").json()
+    assert trace["name"] == "GET /api/v1/patient/{patient_id}" and trace["status"] == 200
+    assert "pat-trace-2" not in trace_buffer.get(trace_id).name
+
+
+def test_untraced_requests_have_no_header(api_client, monkeypatch):
+    assert "Server-Timing" not in api_client.get("/metrics").headers
+    monkeypatch.setattr(settings, "TRACING_ENABLED", False)
+    assert "Server-Timing" not in api_client.get("/health").headers
+
+
+def test_overlapping_spans_of_a_phase_are_merged():
+    trace = Trace("GET /test")
+    for name, start, duration in (("fhir.Patient", 0.0, 1.0), ("fhir.Observation", 0.5, 1.0), ("fhir.Condition", 3.0, 0.5),
+                                  ("llm.score", 1.0, 0.25)):
+        span = Span(name, None, trace.start + start, {})
+        span.duration = duration
+        trace.add(span)
+    assert trace.phases() == {"fhir": {"duration": 2.0, "count": 3}, "llm": {"duration": 0.25, "count": 1}}
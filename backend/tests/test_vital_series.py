@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from app.services.vital_series import VitalSeries, lttb, rolling_stats, series_payload
+
+HOUR = 3600
+
+
+def make_series(n, seed=7):
+    rng = np.random.default_rng(seed)
+    timestamps = np.cumsum(rng.uniform(0.2, 3, n)) * HOUR
+    return VitalSeries("8867-4", "Heart rate", "/min", timestamps, rng.normal(80, 15, n))
+
+
+def brute_force(series, index, window_hours):
+    t = series.timestamps[index]
+    mask = (series.timestamps >= t - window_hours * HOUR) & (series.timestamps <= t)
+    window = series.values[mask]
+    return window.min(), window.max(), window.mean()
+
+
+@pytest.mark.parametrize("window_hours", [0.1, 6, 24, 1e6])
+def test_rolling_stats_match_each_points_own_window(window_hours):
+    series = make_series(400)
+    indices = lttb(series.timestamps, series.values, 50)
+    stats = rolling_stats(series, indices, window_hours)
+    for position, index in enumerate(indices):
+        expected = brute_force(series, index, window_hours)
+        assert (stats["min"][position], stats["max"][position]) == expected[:2]
+        assert stats["mean"][position] == pytest.approx(expected[2])
+
+
+def test_payload_rolling_stats_follow_the_returned_points():
+    series = make_series(1000)
+    payload = series_payload(series, max_points=100, window_hours=24)
+    assert payload["returned"] == 100
+    for key in ("rolling_min", "rolling_max", "rolling_mean"):
+        assert len(payload[key]) == len(payload["values"])
+    assert payload["rolling_min"][-1] == payload["features"]["window_min"]
+    assert payload["rolling_max"][-1] == payload["features"]["window_max"]
+    assert all(lo <= v <= hi for lo, v, hi in zip(payload["rolling_min"], payload["values"], payload["rolling_max"]))
+
+
+def test_empty_series():
+    series = VitalSeries("8867-4", "Heart rate", "/min", np.empty(0), np.empty(0))
+    payload = series_payload(series, max_points=100, window_hours=24)
+    assert payload["rolling_mean"] == [] and payload["features"] == {"count": 0}
@@ -1,6 +1,8 @@
 export const fetchMedicalHistory = async (firstName:string, lastName:string, dob:string) => {
     const response = await fetch(`http://localhost:8000/api/v1/patient/${firstName}/${lastName}/${dob}/medical-history`, {
         method: "GET",
+        // The API identifies the caller by the session cookie set at login
+        credentials: "include",
         headers: {
             "Content-Type": "application/json",
         },